@@ -0,0 +1,1051 @@
+# Bake engine, calculating keyframe values for all frames to be baked, before any keyframe gets created.
+#
+# Originally baking worked frame by frame like playback does: For every frame the rig got posed
+# (SetMg() on every joint), the relative rotations read back (GetRelRot()) and three keyframes
+# per joint added. Every frame this way involved a full round-trip through the scene.
+#
+# Now baking happens in two passes:
+#   1) Keyframe values of all frames get calculated in pure math. The relative rotation of a joint
+#      results from the calculated global matrices of the joint and its parent. For this the rig
+#      hierarchy gets analyzed once (see PrepareActorBake()): Joints are processed parents first,
+#      unmapped joints in between mapped ones contribute their (constant) local matrix and
+#      anything above the mapped joints (e.g. the root object) stays where it is during baking.
+#      Nothing in the scene gets changed during this pass, everything needed from the scene is gathered
+#      beforehand (see Prepare...Keyframes()), so multiple tags get calculated in parallel.
+#   2) Keyframes get written curve by curve in context of the main thread (see WriteKeyframes()).
+#      Optionally curves get simplified before writing (see ReduceKeyframes()).
+#
+# Keyframe values are returned as dictionaries with lists of values (c4d.Vector or float),
+# one per baked frame:
+#   - actors: rotations and hip position by object name (as the curve dictionaries in the Save dialog)
+#   - faces: strengths by Studio face pose name
+#   - props: rotation and position by object name
+#
+# Finally BakeTags() drives an entire bake (curves, Takes, keyframes) without any UI involved.
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+import c4d
+# NumPy is optional, it is only used to speed up keyframe reduction
+__USE_NUMPY__ = True
+try:
+    import numpy as np
+except:
+    __USE_NUMPY__ = False
+from rokoko_ids import *
+from rokoko_rig_tables import *
+from rokoko_utils import *
+from rokoko_clip import *
+from rokoko_listener import *
+
+
+# Converts a global matrix into the relative rotation of an object (as GetRelRot() would return
+# after SetMg()). hpbLast is the rotation of the previous frame, in order to avoid flips.
+def MatrixToRelRot(mgParent, mg, mFrozenInv, order, hpbLast):
+    mRel = (mFrozenInv * (~mgParent * mg)).GetNormalized()
+    hpb = c4d.utils.MatrixToHPB(mRel, order)
+    if hpbLast is not None:
+        hpb = c4d.utils.GetOptimalAngle(hpbLast, hpb, order)
+    return hpb
+
+
+# Returns the number of ancestors of an object.
+def GetHierarchyDepth(obj):
+    depth = 0
+    obj = obj.GetUp()
+    while obj is not None:
+        depth += 1
+        obj = obj.GetUp()
+    return depth
+
+
+# Analyzes the rig of an actor tag for baking.
+# Returns a list with one entry per mapped joint, parents before children:
+#   (object name, joint index, pretransformed T-Pose matrix,
+#    index of entry of closest mapped parent (or -1), matrix between both (or constant parent matrix),
+#    inverse frozen matrix, rotation order, current relative rotation)
+def PrepareActorBake(tPose):
+    # Mapped joints, parents first
+    joints = sorted(tPose.items(), key=lambda item: GetHierarchyDepth(item[1][0]))
+    objsMapped = [obj for _, (obj, _, _, _) in joints] # a list, C4D objects are compared by == (not hashed)
+
+    entries = []
+    for nameInStudio, (obj, _, nameObj, mRotOffsetRef) in joints:
+        # Find closest mapped parent, collecting local matrices of unmapped joints in between
+        mChain = c4d.Matrix()
+        objParent = obj.GetUp()
+        while objParent is not None and objParent not in objsMapped:
+            mChain = objParent.GetMl() * mChain
+            objParent = objParent.GetUp()
+        if objParent is None:
+            # No mapped parent, parent stays where it is during baking
+            idxParent = -1
+            mChain = obj.GetUpMg()
+        else:
+            idxParent = objsMapped.index(objParent)
+        idxJoint = STUDIO_NAMES_TO_GUESS[nameInStudio][0]
+        entries.append((nameObj, idxJoint, mRotOffsetRef, idxParent, mChain, ~obj.GetFrozenMln(), obj.GetRotationOrder(), obj.GetRelRot()))
+    return entries
+
+
+# Gathers everything needed from the scene to calculate the keyframe values of an actor tag.
+# Needs to be called in context of the main thread, the result is then used by CalcActorKeyframes().
+def PrepareActorKeyframes(tag, tPose):
+    objRoot = tag.GetObject()
+
+    # In case there is no dedicated root object (but Rokoko tag is assigned directly to hip joint),
+    # use identity matrix as root matrix
+    objHip = tag[ID_TAG_BASE_RIG_LINKS + 0]
+    if objHip != objRoot:
+        mgRoot = objRoot.GetMg()
+    else:
+        mgRoot = c4d.Matrix()
+    mgRootTPose = tag[ID_TAG_ROOT_MATRIX]
+    mgRootTPoseInv = ~mgRootTPose
+
+    # The root does not move during baking, so all constant parts of the transformation can be combined.
+    # (See ExecuteActor() in rokoko_tag for the individual steps)
+    mRoot = mgRoot * mgRootTPoseInv * MR_Y180 # actually ~MR_Y180, but ~MR_Y180 == MR_Y180
+
+    nameHip = None
+    if 'hip' in tPose:
+        (_, _, nameHip, _) = tPose['hip']
+    return { 'idxActor' : tag[ID_TAG_ACTOR_INDEX],
+             'mRoot' : mRoot,
+             'mgRootTPoseInv' : mgRootTPoseInv,
+             'entries' : PrepareActorBake(tPose),
+             'nameHip' : nameHip,
+             'yTPoseHip' : tag[ID_TAG_ACTOR_HIP_HEIGHT],
+             'projectScale' : GetProjectScale(),
+           }
+
+
+# Calculates rotation and hip position keyframe values of an actor for the given frames.
+# setup: see PrepareActorKeyframes(), frames: list of frame indeces in dataQueue
+# Nothing in the scene is accessed, so this may run in a worker thread.
+# Returns two dictionaries (rotations, positions) with lists of vectors by object name.
+def CalcActorKeyframes(setup, dataQueue, frames):
+    valuesRot = {}
+    valuesPos = {}
+    idxActor = setup['idxActor']
+    if idxActor == -1 or len(frames) <= 0: # bake only if data is valid
+        return valuesRot, valuesPos
+    mRoot = setup['mRoot']
+    mgRootTPoseInv = setup['mgRootTPoseInv']
+    entries = setup['entries']
+    indices = [idxJoint for _, idxJoint, _, _, _, _, _, _ in entries]
+    offsetsNumPy = MatricesToAxesNumPy([mRotOffsetRef for _, _, mRotOffsetRef, _, _, _, _, _ in entries])
+
+    # For clips (with NumPy) Studio rotations get converted and multiplied with the T-Pose matrices
+    # chunk by chunk (BAKE_CHUNK_FRAMES frames in one go), so memory does not grow with the length of the clip
+    useClip = offsetsNumPy is not None and isinstance(dataQueue, ClipData)
+    matricesChunk = None
+
+    ### Rotation
+    hpbsLast = [hpb for _, _, _, _, _, _, _, hpb in entries]
+    valuesPerEntry = [[] for _ in entries]
+    mgs = [None] * len(entries)
+    for idxInFrames, idxFrame in enumerate(frames):
+        data = GetFrameFromQueue(dataQueue, idxFrame)
+        if useClip:
+            idxInChunk = idxInFrames % BAKE_CHUNK_FRAMES
+            if idxInChunk == 0:
+                framesChunk = frames[idxInFrames:idxInFrames + BAKE_CHUNK_FRAMES]
+                matricesChunk = dataQueue.GetActorRotationMatrices(idxActor, framesChunk, indices, offsetsNumPy).tolist()
+            matricesStudio = matricesChunk[idxInChunk]
+        elif offsetsNumPy is not None:
+            matricesStudio = QuaternionsTimesMatricesNumPy(data.GetJointRotations(idxActor), indices, offsetsNumPy)
+        else:
+            matricesStudio = data.GetJointRotationMatrices(idxActor)
+
+        for idxEntry, (_, idxJoint, mRotOffsetRef, idxParent, mChain, mFrozenInv, order, _) in enumerate(entries):
+            # Global matrix of the joint (only rotation is of interest)
+            if offsetsNumPy is not None:
+                mg = mRoot * MatrixFromAxes(matricesStudio[idxEntry])
+            else:
+                mg = mRoot * (MatrixFromAxes(matricesStudio[idxJoint]) * mRotOffsetRef)
+            mgs[idxEntry] = mg
+
+            # Global matrix of the parent
+            if idxParent == -1:
+                mgParent = mChain
+            else:
+                mgParent = mgs[idxParent] * mChain
+
+            # Keyframes are always relative rotations
+            hpb = MatrixToRelRot(mgParent, mg, mFrozenInv, order, hpbsLast[idxEntry])
+            hpbsLast[idxEntry] = hpb
+            valuesPerEntry[idxEntry].append(hpb)
+
+    for (nameObj, _, _, _, _, _, _, _), values in zip(entries, valuesPerEntry):
+        valuesRot[nameObj] = values
+
+    ### Hip Position
+    if setup['nameHip'] is not None:
+        yTPoseHip = setup['yTPoseHip']
+        projectScale = setup['projectScale']
+        values = []
+        offLast = None
+        numMissing = 0 # leading frames without hip position
+        for idxFrame in frames:
+            data = GetFrameFromQueue(dataQueue, idxFrame)
+            posStudio = data.GetJointPosition(idxActor, 0) # current position of hip in Studio
+            if posStudio is None:
+                # Frames without hip position keep the last position (as in playback)
+                if offLast is None:
+                    numMissing += 1
+                else:
+                    values.append(offLast)
+                continue
+            hipHeightStudio = data.GetHipHeight(idxActor) # hip height of current actor in Studio
+            xStudio, yStudio, zStudio = posStudio
+
+            # Scale hip height by ratio of current actor's hip height and Studio's T-Pose base hip height
+            scale = yTPoseHip / hipHeightStudio
+
+            # Calculate hip's y position in C4D
+            y = yTPoseHip * (1 + (yStudio - hipHeightStudio))
+
+            # Merge into relative offset in C4D
+            # -x/z due to different orientation of character in C4D
+            off = c4d.Vector(-xStudio * scale,
+                             y,
+                             -zStudio * scale)
+
+            # Reverse offset and rotation which may have been caused by T-Pose's root object
+            off = mgRootTPoseInv * off
+
+            # Scale position with "Project Scale" parameter
+            offLast = off * projectScale # position relative to root object
+            if numMissing > 0:
+                values.extend([offLast] * numMissing)
+                numMissing = 0
+            values.append(offLast)
+        if offLast is not None: # no hip keyframes at all, if there's no hip position in any frame
+            valuesPos[setup['nameHip']] = values
+    return valuesRot, valuesPos
+
+
+# Gathers everything needed to calculate the keyframe values of a face tag (main thread).
+def PrepareFaceKeyframes(tag, facePoses):
+    return { 'idxActor' : tag[ID_TAG_ACTOR_INDEX],
+             'namesPoses' : list(facePoses.keys()),
+           }
+
+
+# Calculates face pose strength keyframe values of a face for the given frames.
+# Returns two dictionaries (rotations, always empty, and strengths by Studio face pose name).
+def CalcFaceKeyframes(setup, dataQueue, frames):
+    valuesRot = {}
+    valuesPos = {}
+    idxActor = setup['idxActor']
+    if idxActor == -1 or len(frames) <= 0: # bake only if data is valid
+        return valuesRot, valuesPos
+    for nameInStudio in setup['namesPoses']:
+        valuesPos[nameInStudio] = []
+    for idxFrame in frames:
+        data = GetFrameFromQueue(dataQueue, idxFrame)
+        for nameInStudio, values in valuesPos.items():
+            values.append(data.GetFacePose(idxActor, FACE_POSE_NAMES[nameInStudio][0]) / 100.0)
+    return valuesRot, valuesPos
+
+
+# Gathers everything needed from the scene to calculate the keyframe values of a prop tag (main thread).
+def PreparePropKeyframes(tag):
+    objProp = tag.GetObject()
+
+    # The parent of the prop does not move during baking
+    return { 'idxProp' : tag[ID_TAG_ACTOR_INDEX],
+             'nameObj' : objProp.GetName(),
+             'mgParent' : objProp.GetUpMg(),
+             'mFrozenInv' : ~objProp.GetFrozenMln(),
+             'order' : objProp.GetRotationOrder(),
+             'hpb' : objProp.GetRelRot(),
+             'projectScale' : GetProjectScale(),
+           }
+
+
+# Calculates rotation and position keyframe values of a prop for the given frames.
+# Returns two dictionaries (rotations, positions) with lists of vectors by object name.
+def CalcPropKeyframes(setup, dataQueue, frames):
+    valuesRot = {}
+    valuesPos = {}
+    idxProp = setup['idxProp']
+    if idxProp == -1 or len(frames) <= 0: # bake only if data is valid
+        return valuesRot, valuesPos
+    nameObjProp = setup['nameObj']
+    mgParent = setup['mgParent']
+    mFrozenInv = setup['mFrozenInv']
+    order = setup['order']
+    hpbLast = setup['hpb']
+    projectScale = setup['projectScale']
+
+    rotations = []
+    positions = []
+    for idxFrame in frames:
+        data = GetFrameFromQueue(dataQueue, idxFrame)
+
+        ### Rotation
+
+        # Convert Studio rotation into a C4D transformation matrix
+        x, y, z, w = data.GetPropRotation(idxProp)
+        mPropStudio = QuaternionToMatrix(x, y, z, w)
+
+        # While sharing a similarly oriented coordinate system,
+        # in C4D characters (and thus also props) face forward in the opposite direction.
+        # Rotate Studio data by 180 degree around Y
+        mFinalRot = MR_Y180 * mPropStudio # absolute rotation of prop object in C4D
+
+        # Keyframes are always relative rotations
+        hpbLast = MatrixToRelRot(mgParent, mFinalRot, mFrozenInv, order, hpbLast)
+        rotations.append(hpbLast)
+
+        ### Position
+
+        # Convert absolute global position in Studio into a C4D offset vector
+        xStudio, yStudio, zStudio = data.GetPropPosition(idxProp)
+        off = c4d.Vector(-xStudio * 100.0,
+                         yStudio * 100.0,
+                         -zStudio * 100.0)
+
+        # Scale position with "Project Scale" parameter
+        positions.append(off * projectScale)
+
+    valuesRot[nameObjProp] = rotations
+    valuesPos[nameObjProp] = positions
+    return valuesRot, valuesPos
+
+
+# Keyframe reduction
+#
+# Curves get simplified with the Ramer-Douglas-Peucker algorithm:
+# Starting with first and last keyframe only, the keyframe deviating the most from the linear
+# interpolation between its neighbours gets added, until no keyframe deviates more than the tolerance.
+# Remaining keyframes get linear interpolation, so the deviation of the baked curve from the
+# motion data stays within the tolerance (measured as difference in value at the time of each dropped keyframe).
+
+# Returns index and deviation of the value deviating the most from the line between first and last value.
+def GetMaxDeviation(seconds, values, idxFirst, idxLast):
+    t0 = seconds[idxFirst]
+    v0 = values[idxFirst]
+    slope = (values[idxLast] - v0) / (seconds[idxLast] - t0) if seconds[idxLast] != t0 else 0.0
+    if __USE_NUMPY__:
+        deviations = np.abs(values[idxFirst + 1:idxLast] - (v0 + slope * (seconds[idxFirst + 1:idxLast] - t0)))
+        idxMax = int(np.argmax(deviations))
+        return idxFirst + 1 + idxMax, float(deviations[idxMax])
+    idxMax = idxFirst + 1
+    deviationMax = -1.0
+    for idx in range(idxFirst + 1, idxLast):
+        deviation = abs(values[idx] - (v0 + slope * (seconds[idx] - t0)))
+        if deviation > deviationMax:
+            idxMax = idx
+            deviationMax = deviation
+    return idxMax, deviationMax
+
+
+# Returns the indeces of the keyframes to keep.
+# seconds: times of keyframes (in seconds), values: values of one curve
+def ReduceKeyframes(seconds, values, tolerance):
+    numKeys = len(values)
+    if numKeys <= 2 or tolerance <= 0.0:
+        return list(range(numKeys))
+    if __USE_NUMPY__:
+        seconds = np.asarray(seconds, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+
+    keep = [False] * numKeys
+    keep[0] = True
+    keep[-1] = True
+    # Explicit stack instead of recursion (long takes would exceed Python's recursion limit)
+    segments = [(0, numKeys - 1)]
+    while len(segments) > 0:
+        idxFirst, idxLast = segments.pop()
+        if idxLast - idxFirst < 2:
+            continue
+        idxMax, deviationMax = GetMaxDeviation(seconds, values, idxFirst, idxLast)
+        if deviationMax > tolerance:
+            keep[idxMax] = True
+            segments.append((idxFirst, idxMax))
+            segments.append((idxMax, idxLast))
+    return [idx for idx in range(numKeys) if keep[idx]]
+
+
+# Writes keyframes into a curve in a single pass.
+# Undo for the keys is not needed, the caller adds an undo for the entire object (or the new Take).
+# If a tolerance is given, the curve gets reduced first (seconds are the times in seconds).
+# Returns the number of keyframes written.
+def WriteKeyframes(name, curve, times, values, tolerance=0.0, seconds=None):
+    if tolerance > 0.0:
+        indices = ReduceKeyframes(seconds, values, tolerance)
+        times = [times[idx] for idx in indices]
+        values = [values[idx] for idx in indices]
+    for idxKey, (timeKey, value) in enumerate(zip(times, values)):
+        resAddKey = curve.AddKey(timeKey, False)
+        if resAddKey is None:
+            print('ERROR: Failed to add keyframe', name)
+            return idxKey # keyframes written so far
+        key = resAddKey['key']
+        key.SetValue(curve, value)
+        if tolerance > 0.0:
+            key.SetInterpolation(curve, c4d.CINTERPOLATION_LINEAR)
+    return len(values)
+
+
+# Writes keyframes of a vector into its three component curves.
+# As Takes seem to have an issue with applying keyframes for a Vector at once,
+# the keyframes are added to the curves component wise (and also get reduced component wise).
+# Returns the number of keyframes written.
+def WriteVectorKeyframes(name, curveComponents, times, vectors, tolerance=0.0, seconds=None):
+    numKeys = 0
+    for idxComponent in range(3):
+        values = [v[idxComponent] for v in vectors]
+        numKeys += WriteKeyframes(name, curveComponents[idxComponent], times, values, tolerance, seconds)
+    return numKeys
+
+# Baking without UI
+#
+# Everything needed to bake tags (curves, Take overrides, keyframes) is done by the functions below,
+# which get all their parameters explicitly. The Save dialog only collects the parameters from its
+# widgets, rokoko_bake_batch uses the very same functions to bake clips unattended (e.g. via c4dpy).
+
+# Finds or creates animation curves for a given DescId referencing a Vector.
+# This is used for rotational or position keyframes.
+# And it's only used in the case of baking into a new Take.
+#
+# All components of the Vector are handled separately.
+#
+# There is a second version of this function below, which is used in the
+# case of baking without a Take (which will result in baking into the current Take).
+def PrepareCurvesInTake(takeData, take, obj, overrides, curves, descId, mgTPose, wipe):
+    # Depending on DescID either need to store the offset or
+    # its relative rotation as default value.
+    if mgTPose is not None:
+        if descId[0].id == c4d.ID_BASEOBJECT_REL_ROTATION:
+            vDefault = c4d.utils.MatrixToHPB(~obj.GetUpMg() * MR_Y180 * mgTPose)
+        else:
+            vDefault = (~obj.GetUpMg() * MR_Y180 * mgTPose).off
+    else:
+        vDefault = obj.GetMl().off
+
+    vectorComponents = [c4d.VECTOR_X, c4d.VECTOR_Y, c4d.VECTOR_Z]
+    descIdComponents = [None, None, None]
+    overrideComponents = [None, None, None]
+    curveComponents = [None, None, None]
+
+    # All components of a Vector are handled separately.
+    for idxComponent in range(3):
+        # DescID of vector component
+        descIdComponents[idxComponent] = c4d.DescID(descId[0], c4d.DescLevel(vectorComponents[idxComponent], c4d.DTYPE_REAL, 0))
+
+        # Find or create the override
+        overrideComponents[idxComponent] = take.FindOrAddOverrideParam(takeData, obj, descIdComponents[idxComponent], vDefault[idxComponent], None, False)
+        if overrideComponents[idxComponent] is None:
+            print('ERROR: Failed to override:', descId[0].id, idxComponent)
+            break
+        overrideComponents[idxComponent].UpdateSceneNode(takeData, descIdComponents[idxComponent])
+
+        # Try to find an existing CTrack
+        ctrack = overrideComponents[idxComponent].FindCTrack(descIdComponents[idxComponent])
+        if ctrack is None:
+            # Create and insert a new CTrack
+            ctrack = c4d.CTrack(obj, descIdComponents[idxComponent])
+            overrideComponents[idxComponent].InsertTrackSorted(ctrack)
+
+        # We are not actually interested in the track, but need the curve it contains
+        curveComponents[idxComponent] = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
+
+        # Optionally wipe all previous keyframes
+        if wipe:
+            curveComponents[idxComponent].FlushKeys()
+
+    # Store overrides and curves in dictionaries
+    nameObj = obj.GetName()
+    overrides[nameObj] = overrideComponents
+    curves[nameObj] = curveComponents
+
+
+# Finds or creates animation curves for a given DescId referencing a Vector.
+# This is used for rotational or position keyframes.
+# And it's only used in the case of NOT baking into a Take.
+#
+# All components of the Vector are handled separately.
+#
+# There is a second version of this function above, which is used in the
+# case of baking into a new Take.
+def PrepareCurves(obj, curves, descId, wipe):
+    vectorComponents = [c4d.VECTOR_X, c4d.VECTOR_Y, c4d.VECTOR_Z]
+    descIdComponents = [None, None, None]
+    curveComponents = [None, None, None]
+
+    # All components of a Vector are handled separately.
+    for idxComponent in range(3):
+        # DescID of vector component
+        descIdComponents[idxComponent] = c4d.DescID(descId[0], c4d.DescLevel(vectorComponents[idxComponent], c4d.DTYPE_REAL, 0))
+
+        # Try to find an existing CTrack
+        ctrack = obj.FindCTrack(descIdComponents[idxComponent])
+        if ctrack is None:
+            # Create and insert a new CTrack
+            ctrack = c4d.CTrack(obj, descIdComponents[idxComponent])
+            obj.InsertTrackSorted(ctrack)
+
+        # We are not actually interested in the track, but need the curve it contains
+        curveComponents[idxComponent] = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
+
+        # Optionally wipe all previous keyframes
+        if wipe:
+            curveComponents[idxComponent].FlushKeys()
+
+    # Store curves in dictionary
+    nameObj = obj.GetName()
+    curves[nameObj] = curveComponents
+
+
+# Finds or creates an animation curve for a given DescId referencing a numerical value.
+# This is used for face morph keyframes, as these only have a single float value.
+# And it's only used in the case of baking into a new Take.
+#
+# There is a second version of this function below, which is used in the
+# case of baking without a Take (which will result in baking into the current Take).
+def PrepareMorphCurvesInTake(takeData, take, tagPoseMorph, overrides, curves, descIdMorph, nameInStudio, wipe):
+    valDefault = 0.0
+
+    # Find or create the override
+    override = take.FindOrAddOverrideParam(takeData, tagPoseMorph, descIdMorph, valDefault, None, False)
+    if override is None:
+        print('ERROR: Failed to override pose:', descIdMorph[0].id)
+        return
+    override.UpdateSceneNode(takeData, descIdMorph)
+
+    # Try to find an existing CTrack
+    ctrack = override.FindCTrack(descIdMorph)
+    if ctrack is None:
+        # Create and insert a new CTrack
+        ctrack = c4d.CTrack(tagPoseMorph, descIdMorph)
+        override.InsertTrackSorted(ctrack)
+
+    # We are not actually interested in the track, but need the curve it contains
+    curve = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
+
+    # Optionally wipe all previous keyframes
+    if wipe:
+        curve.FlushKeys()
+
+    # Store override and curve in dictionaries
+    overrides[nameInStudio] = override
+    curves[nameInStudio] = curve
+
+
+# Finds or creates an animation curve for a given DescId.
+# This is used for face morph keyframes, as these only have a single float value.
+# And it's only used in the case of NOT baking into a Take.
+#
+# There is a second version of this function above, which is used in the
+# case of baking into a new Take.
+def PrepareMorphCurves(tagPoseMorph, curves, descIdMorph, nameInStudio, wipe):
+    # Try to find an existing CTrack
+    ctrack = tagPoseMorph.FindCTrack(descIdMorph)
+    if ctrack is None:
+        # Create and insert a new CTrack
+        ctrack = c4d.CTrack(tagPoseMorph, descIdMorph)
+        tagPoseMorph.InsertTrackSorted(ctrack)
+
+    # We are not actually interested in the track, but need the curve it contains
+    curve = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
+
+    # Optionally wipe all previous keyframes
+    if wipe:
+        curve.FlushKeys()
+
+    # Store curve in dictionary
+    curves[nameInStudio] = curve
+
+
+# Creates a "T-Pose dictionary".
+# For all joints set in tag's mapping table,
+# store object reference, object name and T-Pose matrices (normal and pretransformed).
+# Entries are referred to by their Studio names.
+def PrepareTPosePerTag(tag):
+    tPoseTag = {}
+
+    for nameInStudio, (idx, _, _, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.items():
+        obj = tag[ID_TAG_BASE_RIG_LINKS + idx]
+
+        # Skip empty mapping table entries
+        if obj is None:
+            continue
+
+        # Store information in dictionary
+        nameObj = obj.GetName()
+        mgBodyPartTPose = tag[ID_TAG_BASE_RIG_MATRICES + idx]
+        mgBodyPartTPosePretransformed = tag[ID_TAG_BASE_RIG_MATRICES_PRETRANSFORMED + idx]
+        tPoseTag[nameInStudio] = (obj, mgBodyPartTPose, nameObj, mgBodyPartTPosePretransformed)
+    return tPoseTag
+
+
+# Creates a "face morph dictionary".
+# During baking morphs are addressed by their DescID.
+# Only morphs in tag's mapping table are stored in the dictionary.
+def PrepareFacePosesPerTag(tag):
+    facePoses = {}
+    obj = tag.GetObject()
+    tagPoseMorph = obj.GetTag(c4d.Tposemorph)
+
+    for nameInStudio, (idxPose, _, _, _, _, _) in FACE_POSE_NAMES.items():
+        namePoseC4D = tag[ID_TAG_BASE_FACE_POSES + idxPose]
+
+        # Skip empty mapping table entries
+        if namePoseC4D is None or len(namePoseC4D) <= 0:
+            continue
+
+        # Get DescID of this morph
+        idxMorph = tag[ID_TAG_BASE_MORPH_INDECES + idxPose]
+        descIdMorph = tagPoseMorph.GetMorphID(idxMorph)
+        # The returned DescID is not properly suited to set the morph strength...
+        descIdMorph = c4d.DescID(c4d.DescLevel(descIdMorph[0].id, c4d.DTYPE_SUBCONTAINER, 0), c4d.DescLevel(descIdMorph[1].id, c4d.DTYPE_REAL, 0))
+
+        # Store in dict
+        facePoses[nameInStudio] = descIdMorph
+    return facePoses
+
+
+# Maximum number of worker threads calculating keyframe values of tags in parallel
+MAX_BAKE_WORKERS = 8
+
+# Number of clip frames converted in one go per actor (see CalcActorKeyframes())
+BAKE_CHUNK_FRAMES = 256
+
+# Calculates the frames to be baked and the times of their keyframes.
+# idxFirstFrameTag, idxLastFrameTag: range of frames in dataQueue used by the tag (baking loops within this range)
+# timing: 0 = Studio time, 1 = by frame
+# skipFrames: < 10 = only bake every nth frame, >= 10 = keyframes per second (500 = document frame rate)
+# length: 0 = bake all frames, 1 = stop at the end of the document
+# Returns two lists (frame indeces in dataQueue, keyframe times) and the index of the last baked frame.
+def GetBakeFrames(dataQueue, idxFirstFrame, idxLastFrame, idxFirstFrameTag, idxLastFrameTag, timing, skipFrames, length, fps, timeStart, timeMax):
+    # Frame reduction parameters allow to specify in two ways:
+    # Parameter (combo box) value < 10: Only bake every nth frame
+    # Parameter (combo box) value >= 10: Basically specifying keyframes per second (C4D's document time)
+    skipByIndex = skipFrames < 10
+    skipByTime = skipFrames >= 10
+    if skipFrames == 500:
+        skipFrames = fps
+    if skipByTime:
+        skipFrames = 1.0 / float(skipFrames)
+
+    # Number of motion data frames to bake (including frames to be skipped)
+    numFrames = idxLastFrame - idxFirstFrame + 1
+
+    # Frames dropped from the live data queue (see rokoko_live_queue) do not get baked,
+    # instead of repeating the oldest frame still available
+    idxFrameAvailable = 0
+    if isinstance(dataQueue, LiveQueue):
+        idxFrameAvailable = dataQueue.GetFirstIndex()
+
+    lenTagClip = idxLastFrameTag - idxFirstFrameTag + 1
+    idxFirstFrameEffective = idxFirstFrameTag + idxFirstFrame % lenTagClip
+    tsLast = GetFrameFromQueue(dataQueue, idxFirstFrameEffective).GetTimestamp()
+    timeLast = timeStart
+
+    frames = []
+    times = []
+    idxLastKey = 0
+    for idxFrame in range(numFrames):
+        # Calculate the effective frame index and get the motion data frame (see rokoko_clip)
+        idxFrameEffective = idxFirstFrameEffective + idxFrame % lenTagClip
+        if idxFrameEffective < idxFrameAvailable:
+            continue
+
+        # Calculate time of new keyframe in C4D
+        if timing == 0: # Studio time
+            data = GetFrameFromQueue(dataQueue, idxFrameEffective)
+            ts = data.GetTimestamp()
+            tsDiff = ts - tsLast # Studio time since last motion data frame
+
+            # Care for timestamp wrap around.
+            # Happens, when Rokoko Studio is playing back a scene in a loop.
+            if tsDiff < 0.0:
+                tsDiff = 1.0 / data.GetFps()
+
+            # Optionally reduce keyframes by skipping motion data frames (here "keyframes per second")
+            if skipByTime and tsDiff < skipFrames and len(frames) > 0:
+                continue
+
+            # C4D time for keyframe(s)
+            timeKey = timeLast + c4d.BaseTime(tsDiff)
+
+            tsLast = ts
+            timeLast = timeKey
+        else: # Timing "by frame"
+            # No clculations, keyframe time simply results from index
+            timeKey = timeStart + c4d.BaseTime(idxFrame, fps)
+
+        # Optionally stop baking at the end of C4D's current project
+        if length == 1 and timeKey > timeMax:
+            break
+
+        # Optionally reduce keyframes by skipping motion data frames (here "every nth frame")
+        if skipByIndex and (idxFrame % skipFrames) != 0:
+            continue
+
+        frames.append(idxFrameEffective)
+        times.append(timeKey)
+        idxLastKey = max(idxLastKey, idxFrame)
+    return frames, times, idxLastKey
+
+
+# Gathers everything needed from the scene to calculate the keyframe values of a tag (main thread).
+# Returns the function calculating the keyframe values along with its setup (see Calc...Keyframes()).
+def PrepareTagKeyframes(tag, tPose):
+    if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
+        return CalcActorKeyframes, PrepareActorKeyframes(tag, tPose)
+    elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
+        return CalcFaceKeyframes, PrepareFaceKeyframes(tag, tPose)
+    elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_PROP:
+        return CalcPropKeyframes, PreparePropKeyframes(tag)
+    print('KEYFRAMES RIG TYPE MISSING', tag[ID_TAG_RIG_TYPE])
+    return None, None
+
+
+# Calculates all keyframes of a single tag (the math phase of a bake):
+# 1) Determine the motion data frames to be baked and the times of their keyframes (see GetBakeFrames()),
+#    skipping frames without the tag's actor or prop (see FilterBakeFrames())
+# 2) Calculate all keyframe values (roughly the equivalent to Execute() in tag)
+# Only motion data and the setup gathered by PrepareTagKeyframes() are used, so tags get calculated
+# in parallel on worker threads.
+# Returns keyframe times, index of the last baked frame and the keyframe values (rotations, positions).
+def CalcTagKeyframes(funcCalc, setup, dataQueue, paramsFrames):
+    frames, times, idxLastKey = GetBakeFrames(dataQueue, *paramsFrames)
+    if funcCalc is None or len(frames) <= 0:
+        return times, idxLastKey, {}, {}
+    frames, times = FilterBakeFrames(setup, dataQueue, frames, times)
+    valuesRot, valuesPos = funcCalc(setup, dataQueue, frames)
+    return times, idxLastKey, valuesRot, valuesPos
+
+
+# Returns the frames (and keyframe times) containing the actor (or prop) of a tag, other frames get skipped.
+# Actors and props may come and go during a live recording, clips contain the same ones in all frames.
+def FilterBakeFrames(setup, dataQueue, frames, times):
+    idx = setup.get('idxProp')
+    isProp = idx is not None
+    if not isProp:
+        idx = setup['idxActor']
+
+    def IsValid(idxFrame):
+        data = GetFrameFromQueue(dataQueue, idxFrame)
+        return idx < (data.GetNumProps() if isProp else data.GetNumActors())
+
+    if isinstance(dataQueue, ClipData):
+        if IsValid(frames[0]):
+            return frames, times
+        return [], []
+
+    framesValid = []
+    timesValid = []
+    for idxFrame, timeKey in zip(frames, times):
+        if IsValid(idxFrame):
+            framesValid.append(idxFrame)
+            timesValid.append(timeKey)
+    return framesValid, timesValid
+
+
+# Writes all keyframes of a single tag curve by curve (optionally reducing them).
+# Needs to be called in context of the main thread.
+# Tolerance is specified in degrees for rotations, in units for positions and in percent for face poses.
+# Returns the number of keyframes written and the number of keyframes before reduction.
+def WriteTagKeyframes(tag, times, valuesRot, valuesPos, curvesRot, curvesPos, tolerance):
+    numKeysWritten = 0
+    numKeysTotal = 0
+    c4d.StatusSetText('Baking Rokoko Motion to Keyframes (writing {0})...'.format(tag.GetObject().GetName()))
+
+    seconds = [timeKey.Get() for timeKey in times]
+    toleranceRot = c4d.utils.DegToRad(tolerance)
+    tolerancePos = tolerance
+    if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
+        tolerancePos = tolerance / 100.0
+
+    numCurves = len(valuesRot) + len(valuesPos)
+    idxCurve = 0
+    for valuesPerCurve, curves, toleranceCurve in ((valuesRot, curvesRot, toleranceRot), (valuesPos, curvesPos, tolerancePos)):
+        for name, values in valuesPerCurve.items():
+            c4d.StatusSetBar(int(100.0 * float(idxCurve) / float(numCurves)))
+            idxCurve += 1
+            if isinstance(curves[name], list):
+                numKeysWritten += WriteVectorKeyframes(name, curves[name], times, values, toleranceCurve, seconds)
+                numKeysTotal += 3 * len(values)
+            else:
+                numKeysWritten += WriteKeyframes(name, curves[name], times, values, toleranceCurve, seconds)
+                numKeysTotal += len(values)
+    return numKeysWritten, numKeysTotal
+
+
+# Returns the range of frames (first and last index) in a data queue a tag bakes from.
+# Clips may be trimmed in the tag, the live data queue is always used completely.
+def GetTagFrameRange(tag, dataQueue, overridden):
+    if overridden or tag[ID_TAG_DATA_SET] == GetConnectedDataSetId():
+        return 0, len(dataQueue) - 1
+    return tag[ID_TAG_DATA_SET_FIRST_FRAME], tag[ID_TAG_DATA_SET_LAST_FRAME]
+
+
+# Bakes the motion data of Rokoko tags into keyframes without any UI involved
+# (used by the Save dialog and by rokoko_bake_batch for unattended baking).
+#
+# tags: Rokoko tags to bake (tags without valid data are skipped)
+# idxFirstFrame, idxLastFrame: range of motion data frames to bake (idxLastFrame = -1 bakes up to the last frame)
+# timing, skipFrames, length: see GetBakeFrames()
+# createTake: bake into a new Take named nameTake (optionally activated afterwards),
+#             otherwise the keyframes are baked into the current Take
+# wipe: remove existing keyframes from the curves before baking
+# includeDataSets: also bake tags playing a clip (otherwise only tags using the live connection)
+# atCurrent: first keyframe at current document time (otherwise at frame 0)
+# autoForward: afterwards set the document time behind the last keyframe
+# tolerance: keyframe reduction tolerance (degrees, units, percent), 0.0 disables reduction
+# dataQueue: if given, all tags bake this motion data (e.g. a clip read via ReadClip()) instead of their data set
+#
+# Returns a dictionary with statistics of the bake or None in case of an error.
+def BakeTags(tags, idxFirstFrame=0, idxLastFrame=-1, timing=0, skipFrames=1, length=0,
+             createTake=True, nameTake='Rokoko Bake', activateTake=False, wipe=True, includeDataSets=True,
+             atCurrent=False, autoForward=False, tolerance=0.0, dataQueue=None):
+    timeBakeStart = time.perf_counter()
+    thdListener = GetListenerThread()
+    idConnected = GetConnectedDataSetId()
+    overridden = dataQueue is not None
+
+    # Collect the tags to bake along with their motion data
+    tagsToBake = []
+    for tag in tags:
+        idDataSet = tag[ID_TAG_DATA_SET]
+        if overridden:
+            # Tags need a rig (or face) mapping to be baked
+            if not tag[ID_TAG_RIG_TYPE] & (RIG_TYPE_ACTOR | RIG_TYPE_ACTOR_FACE | RIG_TYPE_PROP):
+                continue
+            dataQueueTag = dataQueue
+        else:
+            # Skip tags with invalid data or depending on caller's options
+            if (not includeDataSets and idDataSet != idConnected) or not tag[ID_TAG_VALID_DATA]:
+                continue
+            if thdListener is None or idDataSet not in thdListener._dataQueues:
+                print('ERROR: Bake: No motion data for tag on', tag.GetObject().GetName())
+                continue
+            dataQueueTag = thdListener._dataQueues[idDataSet]
+        idxFirstFrameTag, idxLastFrameTag = GetTagFrameRange(tag, dataQueueTag, overridden)
+        if idxLastFrameTag < idxFirstFrameTag:
+            continue
+        tagsToBake.append((tag, dataQueueTag, idxFirstFrameTag, idxLastFrameTag))
+
+    # Unless specified, bake up to the end of the longest motion data
+    if idxLastFrame < 0:
+        for _, _, idxFirstFrameTag, idxLastFrameTag in tagsToBake:
+            idxLastFrame = max(idxLastFrame, idxLastFrameTag - idxFirstFrameTag)
+
+    stats = { 'tags' : 0,
+              'keysWritten' : 0,
+              'keysTotal' : 0,
+              'idxLastKey' : 0,
+              'duration' : 0.0,
+            }
+    if len(tagsToBake) <= 0 or idxLastFrame < idxFirstFrame:
+        stats['duration'] = time.perf_counter() - timeBakeStart
+        return stats
+
+    # Determine C4D document time of first frame to be baked.
+    doc = c4d.documents.GetActiveDocument()
+    fps = doc.GetFps()
+    if atCurrent:
+        timeStart = doc.GetTime()
+    else:
+        timeStart = c4d.BaseTime(0.0)
+
+    # Number of motion data frames to be baked
+    numDataFrames = idxLastFrame - idxFirstFrame + 1
+
+    # Determine time of last frame to be baked and optionally extend the project end time in C4D
+    timeMax = doc.GetMaxTime()
+    timeStudioMax = c4d.BaseTime(0.016667 * numDataFrames)
+    if length == 0 and (timeStart + timeStudioMax) > timeMax:
+        doc.SetMaxTime(timeStart + timeStudioMax)
+
+    # Prepare descIds for positions and rotations.
+    # Unfortunately the Takes system does seem to have issues with more complex data types,
+    # thus the vectors are handled component-wise.
+    descIdRot = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0))
+    descIdRotComponents = [None, None, None]
+    descIdRotComponents[0] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_X, c4d.DTYPE_REAL, 0))
+    descIdRotComponents[1] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Y, c4d.DTYPE_REAL, 0))
+    descIdRotComponents[2] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Z, c4d.DTYPE_REAL, 0))
+    descIdPos = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0))
+    descIdPosComponents = [None, None, None]
+    descIdPosComponents[0] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_X, c4d.DTYPE_REAL, 0))
+    descIdPosComponents[1] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Y, c4d.DTYPE_REAL, 0))
+    descIdPosComponents[2] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Z, c4d.DTYPE_REAL, 0))
+
+    # Try to display the progress in C4D's status bar.
+    # This currently works very unreliably (most times not at all).
+    # See: https://plugincafe.maxon.net/topic/12726/how-to-enforce-statusbar-redraws
+    c4d.StatusClear()
+    c4d.StatusSetText('Baking Rokoko Motion to Keyframes...')
+    c4d.StatusSetBar(0)
+
+    doc.StartUndo()
+
+    # Undo, Take selection and pool get cleaned up, even if preparing or calculating keyframes of a tag raised an exception
+    takeOld = None
+    pool = None
+    baked = False
+    try:
+        # Optionally create a new Take for the keyframes to be baked into
+        if createTake:
+            takeData = doc.GetTakeData()
+            if takeData is None:
+                print('ERROR: Failed to retrieve the take data.')
+                return None
+            take = takeData.AddTake(nameTake, None, None)
+            if take is None:
+                print('ERROR: Failed to add a new take.')
+                return None
+
+            doc.AddUndo(c4d.UNDOTYPE_NEW, take)
+
+            # Have Main Take active during baking (store current selection to be able to restore it later on)
+            takeOld = takeData.GetCurrentTake()
+            takeData.SetCurrentTake(takeData.GetMainTake())
+
+        # Have all actors in their original position (before any playback started)
+        if thdListener is not None:
+            thdListener.RestoreCurrentPositions()
+
+        # Gather everything needed from the scene for all tags (main thread)
+        tPoses = []
+        jobs = []
+        for tag, dataQueueTag, idxFirstFrameTag, idxLastFrameTag in tagsToBake:
+            # Prepare T-Pose dictionaries
+            if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
+                tPose = PrepareTPosePerTag(tag)
+            elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
+                tPose = PrepareFacePosesPerTag(tag)
+            else:
+                tPose = None
+            tPoses.append(tPose)
+            funcCalc, setup = PrepareTagKeyframes(tag, tPose)
+            paramsFrames = (idxFirstFrame, idxLastFrame, idxFirstFrameTag, idxLastFrameTag, timing, skipFrames, length, fps, timeStart, timeMax)
+            jobs.append((funcCalc, setup, dataQueueTag, paramsFrames))
+
+        # Keyframe values of all tags get calculated in parallel on a pool of worker threads,
+        # keyframes are written in context of the main thread, tag by tag as results become available.
+        # Note: A thread pool is used instead of a process pool, as new processes can not be spawned
+        #       from within C4D's embedded Python. The pool pays off, where NumPy (clip conversion)
+        #       and file access (spilled live frames) release the GIL.
+        c4d.StatusSetText('Baking Rokoko Motion to Keyframes (calculating {0} tags)...'.format(len(jobs)))
+        numWorkers = max(1, min(MAX_BAKE_WORKERS, os.cpu_count() or 1, len(jobs)))
+        if numWorkers > 1:
+            pool = ThreadPoolExecutor(max_workers=numWorkers)
+            results = [pool.submit(CalcTagKeyframes, *job) for job in jobs]
+        else:
+            results = jobs
+
+        # Iterate all tags in order to write their keyframes
+        for (tag, _, _, _), tPose, result in zip(tagsToBake, tPoses, results):
+            if pool is not None:
+                times, idxLastKey, valuesRot, valuesPos = result.result()
+            else:
+                times, idxLastKey, valuesRot, valuesPos = CalcTagKeyframes(*result)
+            stats['idxLastKey'] = max(stats['idxLastKey'], idxLastKey)
+
+            if createTake:
+                # All curves and overrides needed during baking will be stored in these dictionaries
+                overridesRot = {}
+                curvesRot = {}
+                overridesPos = {}
+                curvesPos = {}
+
+                # Depending on type of tag prepare curves and overrides
+                if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
+                    for nameInStudio, (obj, mgTPose, nameObj, _) in tPose.items():
+                        PrepareCurvesInTake(takeData, take, obj, overridesRot, curvesRot, descIdRot, mgTPose, wipe)
+                        if nameInStudio == 'hip':
+                            PrepareCurvesInTake(takeData, take, obj, overridesPos, curvesPos, descIdPos, mgTPose, wipe)
+                elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
+                    obj = tag.GetObject()
+                    tagPoseMorph = obj.GetTag(c4d.Tposemorph)
+                    for nameInStudio, descIdMorph in tPose.items():
+                        PrepareMorphCurvesInTake(takeData, take, tagPoseMorph, overridesPos, curvesPos, descIdMorph, nameInStudio, wipe)
+                else:
+                    obj = tag.GetObject()
+                    PrepareCurvesInTake(takeData, take, obj, overridesRot, curvesRot, descIdRot, None, wipe)
+                    PrepareCurvesInTake(takeData, take, obj, overridesPos, curvesPos, descIdPos, None, wipe)
+
+                # Create actual keyframes
+                numKeysWritten, numKeysTotal = WriteTagKeyframes(tag, times, valuesRot, valuesPos, curvesRot, curvesPos, tolerance)
+
+                # Take overrides need to be updated (again depending on type of tag)
+                if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
+                    for nameInStudio, (obj, _, nameObj, _) in tPose.items():
+                        for idxComponent in range(3):
+                            overridesRot[nameObj][idxComponent].UpdateSceneNode(takeData, descIdRotComponents[idxComponent])
+                            if nameInStudio == 'hip':
+                                overridesPos[nameObj][idxComponent].UpdateSceneNode(takeData, descIdPosComponents[idxComponent])
+                elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
+                    for nameInStudio, descIdMorph in tPose.items():
+                        overridesPos[nameInStudio].UpdateSceneNode(takeData, descIdMorph)
+                else:
+                    obj = tag.GetObject()
+                    nameObj = obj.GetName()
+                    for idxComponent in range(3):
+                        overridesRot[nameObj][idxComponent].UpdateSceneNode(takeData, descIdRotComponents[idxComponent])
+                        overridesPos[nameObj][idxComponent].UpdateSceneNode(takeData, descIdPosComponents[idxComponent])
+            else:
+                # Create an undo for the host object (this includes all children in case of actor rigs)
+                # In the Take branch the Take system manages undo for us.
+                root = tag.GetObject()
+                doc.AddUndo(c4d.UNDOTYPE_CHANGE, root)
+
+                # All curves and overrides needed during baking will be stored in these dictionaries
+                curvesRot = {}
+                curvesPos = {}
+
+                # Depending on type of tag prepare curves and overrides
+                if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
+                    for nameInStudio, (obj, _, nameObj, _) in tPose.items():
+                        PrepareCurves(obj, curvesRot, descIdRot, wipe)
+                        if nameInStudio == 'hip':
+                            PrepareCurves(obj, curvesPos, descIdPos, wipe)
+                elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
+                    tagPoseMorph = root.GetTag(c4d.Tposemorph)
+                    for nameInStudio, descIdMorph in tPose.items():
+                        PrepareMorphCurves(tagPoseMorph, curvesPos, descIdMorph, nameInStudio, wipe)
+                else:
+                    PrepareCurves(root, curvesRot, descIdRot, wipe)
+                    PrepareCurves(root, curvesPos, descIdPos, wipe)
+
+                # Create actual keyframes
+                numKeysWritten, numKeysTotal = WriteTagKeyframes(tag, times, valuesRot, valuesPos, curvesRot, curvesPos, tolerance)
+
+            stats['tags'] += 1
+            stats['keysWritten'] += numKeysWritten
+            stats['keysTotal'] += numKeysTotal
+        baked = True
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+        # If a new Take was created, optionally select the new one
+        if takeOld is not None:
+            if activateTake and baked:
+                takeData.SetCurrentTake(take)
+            else:
+                takeData.SetCurrentTake(takeOld) # restore previous Take selection
+
+        # Optionally forward document time ("one motion data frame" after the last created keyframe)
+        if autoForward and baked:
+            doc.SetTime(timeStart + c4d.BaseTime(0.016667 * (stats['idxLastKey'] + 1)))
+
+        doc.EndUndo()
+
+        # Restore states of all involved objects
+        if thdListener is not None:
+            thdListener.RestoreCurrentPositions()
+        c4d.EventAdd()
+
+        # Reset C4D's status bar
+        c4d.StatusClear()
+
+    stats['duration'] = time.perf_counter() - timeBakeStart
+    return stats
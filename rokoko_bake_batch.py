@@ -0,0 +1,120 @@
+# Unattended baking of motion data clips into C4D scenes (e.g. overnight on a render node).
+#
+# Run via C4D's Python interpreter without any UI:
+#   c4dpy rokoko_bake_batch.py jobs.txt [options]
+#
+# Every line of the jobs file describes one bake job (empty lines and lines starting with # are ignored):
+#   clip, scene[, output]
+# clip: motion data file (.rec) as stored by Rokoko Studio Live
+# scene: C4D scene containing Rokoko tags with configured rigs
+# output: file the baked scene gets saved to (default: scene filename with suffix _baked)
+# Relative paths are relative to the folder of the jobs file.
+#
+# For every job the scene gets loaded, all Rokoko tags bake the clip (see BakeTags() in rokoko_bake)
+# and the scene gets saved. Actor, face and prop indeces configured in the tags refer to the clip.
+# Statistics get printed per job. The exit code is the number of failed jobs.
+import sys, os, argparse
+import c4d
+
+basedir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, basedir)
+
+from rokoko_ids import *
+from rokoko_utils import *
+from rokoko_clip import *
+from rokoko_bake import *
+
+# Returns a list of (clip, scene, output) tuples read from a jobs file.
+def ReadJobs(filenameJobs):
+    pathJobs = os.path.dirname(os.path.abspath(filenameJobs))
+    jobs = []
+    with open(filenameJobs, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if len(line) <= 0 or line.startswith('#'):
+                continue
+            fields = [field.strip() for field in line.split(',')]
+            if len(fields) < 2:
+                print('ERROR: Bake batch: Invalid job: {0}'.format(line))
+                continue
+            filenameClip = os.path.join(pathJobs, fields[0])
+            filenameScene = os.path.join(pathJobs, fields[1])
+            if len(fields) > 2 and len(fields[2]) > 0:
+                filenameOutput = os.path.join(pathJobs, fields[2])
+            else:
+                filenameOutput = '{0}_baked{1}'.format(*os.path.splitext(filenameScene))
+            jobs.append((filenameClip, filenameScene, filenameOutput))
+    return jobs
+
+
+# Bakes a single clip into a scene and saves the result.
+# Returns the statistics of the bake or None in case of an error.
+def BakeJob(filenameClip, filenameScene, filenameOutput, args):
+    clip = ReadClip(filenameClip)
+    if clip is None:
+        print('ERROR: Bake batch: Failed to read clip: {0}'.format(filenameClip))
+        return None
+
+    doc = c4d.documents.LoadDocument(filenameScene, c4d.SCENEFILTER_OBJECTS | c4d.SCENEFILTER_MATERIALS)
+    if doc is None:
+        print('ERROR: Bake batch: Failed to load scene: {0}'.format(filenameScene))
+        return None
+    c4d.documents.InsertBaseDocument(doc)
+    c4d.documents.SetActiveDocument(doc)
+
+    try:
+        tags = GetTagList()
+        if len(tags) <= 0:
+            print('ERROR: Bake batch: No Rokoko tags in scene: {0}'.format(filenameScene))
+            return None
+
+        nameTake = os.path.splitext(os.path.basename(filenameClip))[0]
+        stats = BakeTags(tags, idxFirstFrame=args.first, idxLastFrame=args.last, timing=args.timing,
+                         skipFrames=args.skip, length=args.length, createTake=not args.no_take, nameTake=nameTake,
+                         activateTake=args.activate_take, wipe=not args.keep_animation, tolerance=args.tolerance,
+                         dataQueue=clip)
+        if stats is None:
+            return None
+
+        if not c4d.documents.SaveDocument(doc, filenameOutput, c4d.SAVEDOCUMENTFLAGS_NONE, c4d.FORMAT_C4DEXPORT):
+            print('ERROR: Bake batch: Failed to save scene: {0}'.format(filenameOutput))
+            return None
+    finally:
+        c4d.documents.KillDocument(doc)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bake Rokoko motion data clips into C4D scenes.')
+    parser.add_argument('jobs', help='jobs file, one "clip, scene[, output]" per line')
+    parser.add_argument('--first', type=int, default=0, help='index of first frame to bake')
+    parser.add_argument('--last', type=int, default=-1, help='index of last frame to bake (default: end of clip)')
+    parser.add_argument('--timing', type=int, default=0, choices=[0, 1], help='0: Studio time, 1: by frame')
+    parser.add_argument('--skip', type=int, default=1, help='< 10: bake every nth frame, >= 10: keyframes per second')
+    parser.add_argument('--length', type=int, default=0, choices=[0, 1], help='0: bake all frames, 1: stop at end of document')
+    parser.add_argument('--tolerance', type=float, default=0.0, help='keyframe reduction tolerance (degree, units, percent)')
+    parser.add_argument('--no-take', action='store_true', help='bake into current Take instead of a new one')
+    parser.add_argument('--activate-take', action='store_true', help='activate the new Take in the saved scene')
+    parser.add_argument('--keep-animation', action='store_true', help='do not wipe existing keyframes')
+    args = parser.parse_args()
+
+    jobs = ReadJobs(args.jobs)
+    numFailed = 0
+    for idxJob, (filenameClip, filenameScene, filenameOutput) in enumerate(jobs):
+        print('Bake batch: Job {0}/{1}: {2} -> {3}'.format(idxJob + 1, len(jobs), filenameClip, filenameScene))
+        try:
+            stats = BakeJob(filenameClip, filenameScene, filenameOutput, args)
+        except Exception as e:
+            print('ERROR: Bake batch: Job failed: {0}: {1}'.format(filenameClip, e))
+            stats = None # a single broken clip or scene must not end the entire batch
+        if stats is None:
+            numFailed += 1
+            continue
+        print('Bake batch: Saved {0}: {1} tags, {2} of {3} keyframes written in {4:.1f}s'.format(filenameOutput, stats['tags'], stats['keysWritten'], stats['keysTotal'], stats['duration']))
+
+    print('Bake batch: {0} of {1} jobs succeeded'.format(len(jobs) - numFailed, len(jobs)))
+    return numFailed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
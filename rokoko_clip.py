@@ -0,0 +1,913 @@
+# Clips (motion data read from a file) are stored in a columnar form inside the listener thread.
+#
+# Decoding a clip via JSON results in a list of nested dictionaries, one per frame, with
+# hundreds of Python floats and dictionary nodes per actor and frame. Instead of keeping these
+# around during playback, all motion values of a clip get copied into flat float arrays once
+# during loading:
+#   - per frame: Studio timestamp and fps
+#   - per actor: joint rotations (frames x joints x 4), joint positions (frames x joints x 3),
+#                hip height (frames) and face pose strengths (frames x poses)
+#   - per prop: rotation (frames x 4) and position (frames x 3)
+# Memory consumption and load time this way depend on the number of floats in the clip only.
+#
+# Joints are addressed by their index in STUDIO_NAMES_TO_GUESS, face poses by their index
+# in FACE_POSE_NAMES (same indeces as used for the mapping tables in the tag).
+#
+# Tags and baking code access single frames via ClipFrame objects. Frames in the live data queue
+# are stored as LiveFrame objects providing the same interface (and plain decoded frames get wrapped
+# into DictFrame objects). So consumers do not need to care, where a frame is coming from.
+#
+# Originally every received live frame got decoded into a complete tree of dictionaries, even if
+# the scene consumed only a few actors (or nothing at all, if the player dropped the frame). Now a
+# LiveFrame keeps the decompressed JSON text. Only the subtrees actually requested (body, face or
+# dimensions of a single actor, the props) get decoded, on first access. Their positions in the text
+# are found by a single scan for the subtree keys, which gets checked against a LiveFrameLayout
+# (order of subtree keys, taken from a fully decoded frame, whenever the scene changes). If the
+# text does not match the layout, the frame simply gets decoded as a whole.
+#
+# If NumPy is available, the arrays can additionally be accessed as NumPy views (without copying).
+#
+# Once decoded, a clip gets stored in a binary cache file next to the motion data file
+# (same filename with additional suffix CLIP_CACHE_SUFFIX). The cache file contains the above arrays
+# in a fixed layout and gets memory mapped on subsequent loads, so loading a clip a second time
+# does not involve any decompression or decoding and data gets paged in lazily.
+# The cache file stores path, size and modification time of the motion data file and gets
+# rebuilt automatically, if these do not match anymore.
+import os, re, sys, array, mmap, json, struct
+__USE_NUMPY__ = True
+try:
+    import numpy as np
+except:
+    __USE_NUMPY__ = False
+from rokoko_rig_tables import *
+from rokoko_utils import *
+from rokoko_clip_index import *
+
+# Matches the keys of all subtrees of a live frame, which get decoded on demand (see LiveFrame)
+REGEX_LIVE_FRAME_SUBTREES = re.compile(r'"(actors|props|body|face|dimensions)"\s*:\s*')
+
+# Match the values needed for every live frame (telemetry and data change detection)
+REGEX_LIVE_FRAME_FPS = re.compile(r'"fps"\s*:\s*"?(-?[0-9.eE+-]+)')
+REGEX_LIVE_FRAME_TIMESTAMP = re.compile(r'"timestamp"\s*:\s*(-?[0-9.eE+-]+)')
+
+# Subtrees of an actor, which get decoded on demand
+LIVE_FRAME_ACTOR_SUBTREES = ('body', 'face', 'dimensions')
+
+g_decoderJSON = json.JSONDecoder()
+
+# Number of values stored per joint, face and prop
+NUM_JOINTS = len(STUDIO_NAMES_TO_GUESS)
+NUM_FACE_POSES = len(FACE_POSE_NAMES)
+
+# Studio names of joints and face poses in order of their indeces
+JOINT_NAMES = [None] * NUM_JOINTS
+for nameInStudio, (idxJoint, _, _, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.items():
+    JOINT_NAMES[idxJoint] = nameInStudio
+FACE_POSE_NAMES_BY_INDEX = [None] * NUM_FACE_POSES
+for nameInStudio, (idxPose, _, _, _, _, _) in FACE_POSE_NAMES.items():
+    FACE_POSE_NAMES_BY_INDEX[idxPose - 1] = nameInStudio # face pose indeces start at one
+
+# Values used, if a frame lacks some data (e.g. no face data in a clip, recorded without face capture)
+ROTATION_IDENTITY = (0.0, 0.0, 0.0, 1.0)
+POSITION_ZERO = (0.0, 0.0, 0.0)
+POSITION_MISSING = (float('nan'),) * 3 # joint without position data (e.g. only rotations streamed), skipped when played
+
+# Binary clip cache
+CLIP_CACHE_SUFFIX = '.c4dcache'
+CLIP_CACHE_MAGIC = b'RKCLIP01'
+CLIP_CACHE_VERSION = 3
+CLIP_CACHE_ALIGNMENT = 8
+
+
+# Columnar storage of all motion data frames of a clip.
+class ClipData():
+    _numFrames = 0
+
+    # Per frame data
+    _timestamps = None # array of doubles
+    _fps = None # array of doubles
+
+    # Entity information (names, colors, meta data) as found in first frame
+    _actorsInfo = None
+    _propsInfo = None
+
+    # Per actor data (lists with one array per actor)
+    _rotations = None # frames x joints x (x, y, z, w)
+    _positions = None # frames x joints x (x, y, z), NaN for joints without position (see POSITION_MISSING)
+    _hipHeights = None # frames
+    _faces = None # frames x poses
+
+    # Per prop data (lists with one array per prop)
+    _propRotations = None # frames x (x, y, z, w)
+    _propPositions = None # frames x (x, y, z)
+
+    # NumPy views of above arrays, created on demand
+    _npViews = None
+
+    # Memory mapped cache file (only if clip got loaded from cache)
+    _mmap = None
+
+
+    # Optionally the clip can be initialized with a list of motion data frames
+    # (as decoded from JSON).
+    def __init__(self, frames=None):
+        self._numFrames = 0
+        self._timestamps = array.array('d')
+        self._fps = array.array('d')
+        self._actorsInfo = None
+        self._propsInfo = None
+        self._rotations = []
+        self._positions = []
+        self._hipHeights = []
+        self._faces = []
+        self._propRotations = []
+        self._propPositions = []
+        self._npViews = {}
+        self._mmap = None
+        if frames is not None:
+            for frame in frames:
+                self.AddFrame(frame)
+
+
+    # Number of frames in the clip.
+    # This allows clips to be treated like the frame lists in the listener's data queues.
+    def __len__(self):
+        return self._numFrames
+
+
+    # The entities of a clip get determined by its first frame.
+    def InitEntities(self, dataScene):
+        self._actorsInfo = []
+        for actor in dataScene['actors']:
+            self._actorsInfo.append({ 'name' : actor['name'], 'color' : actor['color'], 'meta' : actor['meta'] })
+            self._rotations.append(array.array('f'))
+            self._positions.append(array.array('f'))
+            self._hipHeights.append(array.array('f'))
+            self._faces.append(array.array('f'))
+        self._propsInfo = []
+        for prop in dataScene['props']:
+            self._propsInfo.append({ 'name' : prop['name'], 'color' : prop['color'] })
+            self._propRotations.append(array.array('f'))
+            self._propPositions.append(array.array('f'))
+
+
+    # Append a motion data frame (as decoded from JSON) to the clip.
+    # Entities missing in the frame keep the values of the previous frame.
+    def AddFrame(self, frame):
+        self._npViews = {} # arrays can not grow, while views on them exist
+        dataScene = frame['scene']
+        if self._actorsInfo is None:
+            self.InitEntities(dataScene)
+
+        self._timestamps.append(float(dataScene['timestamp']))
+        self._fps.append(float(frame['fps']))
+
+        # Actors
+        actors = dataScene['actors']
+        for idxActor in range(len(self._actorsInfo)):
+            actor = actors[idxActor] if idxActor < len(actors) else None
+            self.AddActorValues(idxActor, actor)
+
+        # Props
+        props = dataScene['props']
+        for idxProp in range(len(self._propsInfo)):
+            if idxProp < len(props):
+                prop = props[idxProp]
+                r = prop['rotation']
+                p = prop['position']
+                self._propRotations[idxProp].extend((r['x'], r['y'], r['z'], r['w']))
+                self._propPositions[idxProp].extend((p['x'], p['y'], p['z']))
+            else:
+                self.RepeatLastValues(self._propRotations[idxProp], 4, ROTATION_IDENTITY)
+                self.RepeatLastValues(self._propPositions[idxProp], 3, POSITION_ZERO)
+
+        self._numFrames += 1
+
+
+    # Appends the values of an actor for one frame.
+    def AddActorValues(self, idxActor, actor):
+        rotations = self._rotations[idxActor]
+        positions = self._positions[idxActor]
+        if actor is None:
+            self.RepeatLastValues(rotations, NUM_JOINTS * 4, ROTATION_IDENTITY * NUM_JOINTS)
+            self.RepeatLastValues(positions, NUM_JOINTS * 3, POSITION_MISSING * NUM_JOINTS)
+            self.RepeatLastValues(self._hipHeights[idxActor], 1, (0.0,))
+            self.RepeatLastValues(self._faces[idxActor], NUM_FACE_POSES, (0.0,) * NUM_FACE_POSES)
+            return
+
+        # Body
+        dataBody = actor.get('body', {})
+        valuesRot = []
+        valuesPos = []
+        for idxJoint, nameInStudio in enumerate(JOINT_NAMES):
+            dataBodyPart = dataBody.get(nameInStudio)
+            if dataBodyPart is None:
+                if self._numFrames > 0:
+                    idxValue = (self._numFrames - 1) * NUM_JOINTS + idxJoint
+                    valuesRot.extend(rotations[idxValue * 4:idxValue * 4 + 4])
+                    valuesPos.extend(positions[idxValue * 3:idxValue * 3 + 3])
+                else:
+                    valuesRot.extend(ROTATION_IDENTITY)
+                    valuesPos.extend(POSITION_MISSING)
+                continue
+            r = dataBodyPart['rotation']
+            valuesRot.extend((r['x'], r['y'], r['z'], r['w']))
+            p = dataBodyPart.get('position')
+            if p is not None:
+                valuesPos.extend((p['x'], p['y'], p['z']))
+            else:
+                valuesPos.extend(POSITION_MISSING)
+        rotations.extend(valuesRot)
+        positions.extend(valuesPos)
+
+        # Dimensions
+        self._hipHeights[idxActor].append(float(actor['dimensions']['hipHeight']))
+
+        # Face
+        dataFace = actor.get('face')
+        if dataFace is None:
+            self.RepeatLastValues(self._faces[idxActor], NUM_FACE_POSES, (0.0,) * NUM_FACE_POSES)
+        else:
+            self._faces[idxActor].extend([float(dataFace.get(nameInStudio, 0.0)) for nameInStudio in FACE_POSE_NAMES_BY_INDEX])
+
+
+    # Appends the values of the previous frame (or default values for the first frame) to an array.
+    def RepeatLastValues(self, values, stride, valuesDefault):
+        if self._numFrames > 0:
+            values.extend(values[-stride:])
+        else:
+            values.extend(valuesDefault)
+
+
+    # Returns a list of all arrays of the clip with their name and entity index
+    # (entity index is -1 for per frame data).
+    # The order of this list defines the layout of the cache file.
+    def GetSections(self):
+        sections = [('_timestamps', -1, self._timestamps), ('_fps', -1, self._fps)]
+        for idxActor in range(self.GetNumActors()):
+            sections.append(('_rotations', idxActor, self._rotations[idxActor]))
+            sections.append(('_positions', idxActor, self._positions[idxActor]))
+            sections.append(('_hipHeights', idxActor, self._hipHeights[idxActor]))
+            sections.append(('_faces', idxActor, self._faces[idxActor]))
+        for idxProp in range(self.GetNumProps()):
+            sections.append(('_propRotations', idxProp, self._propRotations[idxProp]))
+            sections.append(('_propPositions', idxProp, self._propPositions[idxProp]))
+        return sections
+
+
+    # Initializes the clip from a memory mapped cache file.
+    # The arrays of the clip are replaced with memoryviews into the mapped file.
+    def InitFromCache(self, mm, header, offsetData):
+        self._mmap = mm
+        self._numFrames = header['numFrames']
+        self.InitEntities({ 'actors' : header['actors'], 'props' : header['props'] })
+        view = memoryview(mm)
+        for name, idxEntity, offset, count, typecode in header['sections']:
+            start = offsetData + offset
+            values = view[start:start + count * array.array(typecode).itemsize].cast(typecode)
+            if idxEntity == -1:
+                setattr(self, name, values)
+            else:
+                getattr(self, name)[idxEntity] = values
+
+
+    # Returns a frame object for the given frame index.
+    def GetFrame(self, idxFrame):
+        if idxFrame < 0:
+            idxFrame += self._numFrames
+        return ClipFrame(self, idxFrame)
+
+
+    # Returns number of actors in the clip.
+    def GetNumActors(self):
+        if self._actorsInfo is None:
+            return 0
+        return len(self._actorsInfo)
+
+
+    # Returns number of props in the clip.
+    def GetNumProps(self):
+        if self._propsInfo is None:
+            return 0
+        return len(self._propsInfo)
+
+
+    # Returns a dictionary with name, color and meta data of an actor.
+    def GetActorInfo(self, idxActor):
+        return self._actorsInfo[idxActor]
+
+
+    # Returns a dictionary with name and color of a prop.
+    def GetPropInfo(self, idxProp):
+        return self._propsInfo[idxProp]
+
+
+    # Returns the timestamp of a frame.
+    def GetTimestamp(self, idxFrame):
+        return self._timestamps[idxFrame]
+
+
+    # Returns the fps of a frame.
+    def GetFps(self, idxFrame):
+        return self._fps[idxFrame]
+
+
+    # Returns a NumPy view of one of the arrays in the shape (frames, ...).
+    # Returns None, if NumPy is not available.
+    def GetNumPyView(self, name, idxEntity, shape):
+        if not __USE_NUMPY__:
+            return None
+        key = (name, idxEntity)
+        view = self._npViews.get(key)
+        if view is None:
+            values = getattr(self, name)[idxEntity]
+            view = np.frombuffer(values, dtype=np.float32).reshape((self._numFrames,) + shape)
+            self._npViews[key] = view
+        return view
+
+
+    # Joint rotations of an actor, shape (frames, joints, 4), or None without NumPy.
+    def GetActorRotations(self, idxActor):
+        return self.GetNumPyView('_rotations', idxActor, (NUM_JOINTS, 4))
+
+
+    # Joint rotations of an actor converted into matrix axes (see QuaternionsToMatrixAxesNumPy()),
+    # for a list of frame indeces, shape (frames, joints, 3, 3).
+    # All given frames get converted in a single NumPy operation, e.g. a chunk of frames while baking a clip.
+    # Optionally only the joints in list indices get converted and multiplied with
+    # constant matrices (see QuaternionsTimesMatricesNumPy()), shape (frames, indices, 3, 3).
+    # Returns None without NumPy.
+    def GetActorRotationMatrices(self, idxActor, frames, indices=None, axesRight=None):
+        rotations = self.GetActorRotations(idxActor)
+        if rotations is None:
+            return None
+        rotations = rotations[frames]
+        if indices is not None:
+            rotations = rotations[:, indices]
+        axes = QuaternionsToMatrixAxesNumPy(rotations)
+        if axesRight is not None:
+            axes = np.matmul(axesRight, axes)
+        return axes
+
+
+    # Joint positions of an actor, shape (frames, joints, 3), or None without NumPy.
+    def GetActorPositions(self, idxActor):
+        return self.GetNumPyView('_positions', idxActor, (NUM_JOINTS, 3))
+
+
+    # Face pose strengths of an actor, shape (frames, poses), or None without NumPy.
+    def GetActorFaces(self, idxActor):
+        return self.GetNumPyView('_faces', idxActor, (NUM_FACE_POSES,))
+
+
+    # Rotations of a prop, shape (frames, 4), or None without NumPy.
+    def GetPropRotations(self, idxProp):
+        return self.GetNumPyView('_propRotations', idxProp, (4,))
+
+
+    # Positions of a prop, shape (frames, 3), or None without NumPy.
+    def GetPropPositions(self, idxProp):
+        return self.GetNumPyView('_propPositions', idxProp, (3,))
+
+
+# A single frame of a clip.
+# Only references the clip, values are read from the clip's arrays on access.
+class ClipFrame():
+    _clip = None
+    _idxFrame = 0
+
+    def __init__(self, clip, idxFrame):
+        self._clip = clip
+        self._idxFrame = idxFrame
+
+
+    def GetNumActors(self):
+        return self._clip.GetNumActors()
+
+
+    def GetNumProps(self):
+        return self._clip.GetNumProps()
+
+
+    def GetTimestamp(self):
+        return self._clip._timestamps[self._idxFrame]
+
+
+    def GetFps(self):
+        return self._clip._fps[self._idxFrame]
+
+
+    # Returns rotation quaternion (x, y, z, w) of a joint as received from Studio.
+    def GetJointRotation(self, idxActor, idxJoint):
+        idxValue = (self._idxFrame * NUM_JOINTS + idxJoint) * 4
+        return tuple(self._clip._rotations[idxActor][idxValue:idxValue + 4])
+
+
+    # Returns rotation quaternions of all joints of an actor
+    # (NumPy array (joints, 4) or, without NumPy, a flat array of components).
+    def GetJointRotations(self, idxActor):
+        rotations = self._clip.GetActorRotations(idxActor)
+        if rotations is not None:
+            return rotations[self._idxFrame]
+        idxValue = self._idxFrame * NUM_JOINTS * 4
+        return self._clip._rotations[idxActor][idxValue:idxValue + NUM_JOINTS * 4]
+
+
+    # Returns the rotations of all joints of an actor converted into matrix axes
+    # (list indexed by joint index, see MatrixFromAxes()).
+    def GetJointRotationMatrices(self, idxActor):
+        return QuaternionsToMatrixAxes(self.GetJointRotations(idxActor))
+
+
+    # Returns position (x, y, z) of a joint as received from Studio.
+    # Returns None, if the frame has no position for the joint.
+    def GetJointPosition(self, idxActor, idxJoint):
+        idxValue = (self._idxFrame * NUM_JOINTS + idxJoint) * 3
+        x, y, z = self._clip._positions[idxActor][idxValue:idxValue + 3]
+        if x != x: # NaN, see POSITION_MISSING
+            return None
+        return x, y, z
+
+
+    def GetHipHeight(self, idxActor):
+        return self._clip._hipHeights[idxActor][self._idxFrame]
+
+
+    # Returns the strength of a face pose (Studio range 0 to 100).
+    # idxPose is the index in FACE_POSE_NAMES (starting at one).
+    def GetFacePose(self, idxActor, idxPose):
+        return self._clip._faces[idxActor][self._idxFrame * NUM_FACE_POSES + idxPose - 1]
+
+
+    def GetPropRotation(self, idxProp):
+        idxValue = self._idxFrame * 4
+        return tuple(self._clip._propRotations[idxProp][idxValue:idxValue + 4])
+
+
+    def GetPropPosition(self, idxProp):
+        idxValue = self._idxFrame * 3
+        return tuple(self._clip._propPositions[idxProp][idxValue:idxValue + 3])
+
+
+# A single frame of the live data queue (stored as decoded from JSON),
+# providing the same interface as ClipFrame.
+class DictFrame():
+    _data = None
+    _dataScene = None
+
+    def __init__(self, data):
+        self._data = data
+        self._dataScene = data['scene']
+
+
+    def GetNumActors(self):
+        return len(self._dataScene['actors'])
+
+
+    def GetNumProps(self):
+        return len(self._dataScene['props'])
+
+
+    def GetTimestamp(self):
+        return self._dataScene['timestamp']
+
+
+    def GetFps(self):
+        return float(self._data['fps'])
+
+
+    def GetJointRotation(self, idxActor, idxJoint):
+        r = self._dataScene['actors'][idxActor]['body'][JOINT_NAMES[idxJoint]]['rotation']
+        return r['x'], r['y'], r['z'], r['w']
+
+
+    # Returns a flat list with rotation quaternion components of all joints of an actor.
+    # Joints missing in the frame get an identity rotation.
+    def GetJointRotations(self, idxActor):
+        dataBody = self._dataScene['actors'][idxActor]['body']
+        values = []
+        for nameInStudio in JOINT_NAMES:
+            dataBodyPart = dataBody.get(nameInStudio)
+            if dataBodyPart is None:
+                values.extend(ROTATION_IDENTITY)
+                continue
+            r = dataBodyPart['rotation']
+            values.extend((r['x'], r['y'], r['z'], r['w']))
+        return values
+
+
+    def GetJointRotationMatrices(self, idxActor):
+        return QuaternionsToMatrixAxes(self.GetJointRotations(idxActor))
+
+
+    def GetJointPosition(self, idxActor, idxJoint):
+        dataBodyPart = self._dataScene['actors'][idxActor]['body'].get(JOINT_NAMES[idxJoint])
+        if dataBodyPart is None or 'position' not in dataBodyPart:
+            return None
+        p = dataBodyPart['position']
+        return p['x'], p['y'], p['z']
+
+
+    def GetHipHeight(self, idxActor):
+        return self._dataScene['actors'][idxActor]['dimensions']['hipHeight']
+
+
+    def GetFacePose(self, idxActor, idxPose):
+        return float(self._dataScene['actors'][idxActor]['face'][FACE_POSE_NAMES_BY_INDEX[idxPose - 1]])
+
+
+    def GetPropRotation(self, idxProp):
+        r = self._dataScene['props'][idxProp]['rotation']
+        return r['x'], r['y'], r['z'], r['w']
+
+
+    def GetPropPosition(self, idxProp):
+        p = self._dataScene['props'][idxProp]['position']
+        return p['x'], p['y'], p['z']
+
+
+# Order of the subtree keys in the JSON text of live frames of a scene.
+# Studio sends all frames of a scene with the same structure, so the layout only needs to be
+# derived from a fully decoded frame, when the scene changes (see DecodeStage() in rokoko_listener).
+class LiveFrameLayout():
+    _keys = None # tuple of subtree keys in order of appearance in the JSON text
+    _actors = None # per actor a dictionary subtree key : index into _keys
+    _idxProps = None # index of props into _keys
+
+    def __init__(self, data):
+        keys = []
+        self._actors = []
+        for key, value in data['scene'].items():
+            if key == 'actors':
+                keys.append(key)
+                for dataActor in value:
+                    subtrees = {}
+                    for keyActor in dataActor:
+                        if keyActor in LIVE_FRAME_ACTOR_SUBTREES:
+                            subtrees[keyActor] = len(keys)
+                            keys.append(keyActor)
+                    self._actors.append(subtrees)
+            elif key == 'props':
+                self._idxProps = len(keys)
+                keys.append(key)
+        self._keys = tuple(keys)
+
+
+    def GetNumActors(self):
+        return len(self._actors)
+
+
+    # Returns the index into the subtree keys for a subtree of an actor (or the props with idxActor being None).
+    # Returns None, if the subtree is not contained in the layout.
+    def GetSubtreeIndex(self, idxActor, key):
+        if idxActor is None:
+            return self._idxProps
+        if idxActor < 0 or idxActor >= len(self._actors):
+            return None
+        return self._actors[idxActor].get(key)
+
+
+    # Returns True, if the subtree keys found in a frame match the layout.
+    def Matches(self, keys):
+        return keys == self._keys
+
+
+# A single frame of the live data queue (stored as received JSON text),
+# providing the same interface as ClipFrame.
+# Subtrees get decoded on first access and are kept for subsequent accesses.
+class LiveFrame():
+    _text = None # decompressed JSON text
+    _fps = 0.0
+    _timestamp = 0.0
+    _layout = None # LiveFrameLayout of the scene or None (frame gets decoded as a whole)
+    _offsets = None # start offset of every subtree in _text (in order of the layout), found on first access
+    _subtrees = None # decoded subtrees, (actor index or None for props, subtree key) : subtree
+    _data = None # completely decoded frame (only if needed)
+
+    # Raises ValueError, if text does not look like a motion data frame.
+    def __init__(self, text, layout=None, data=None):
+        matchFps = REGEX_LIVE_FRAME_FPS.search(text)
+        matchTimestamp = REGEX_LIVE_FRAME_TIMESTAMP.search(text)
+        if matchFps is None or matchTimestamp is None:
+            raise ValueError('No motion data frame')
+        self._text = text
+        self._fps = float(matchFps.group(1))
+        self._timestamp = float(matchTimestamp.group(1))
+        self._layout = layout
+        self._subtrees = {}
+        self._data = data
+
+
+    # Returns the JSON text of the frame (e.g. for saving or spilling it without encoding).
+    def GetText(self):
+        return self._text
+
+
+    def GetLayout(self):
+        return self._layout
+
+
+    # Returns the completely decoded frame.
+    def GetData(self):
+        data = self._data
+        if data is None:
+            data = json.loads(self._text)
+            self._data = data
+        return data
+
+
+    # Returns the offsets of all subtrees in the JSON text or None, if the text does not match the layout.
+    def GetOffsets(self):
+        if self._offsets is not None:
+            return self._offsets
+        if self._layout is None or self._data is not None:
+            return None
+        keys = []
+        offsets = []
+        for match in REGEX_LIVE_FRAME_SUBTREES.finditer(self._text):
+            keys.append(match.group(1))
+            offsets.append(match.end())
+        if not self._layout.Matches(tuple(keys)):
+            self._layout = None # structure differs from the scene's, decode as a whole
+            return None
+        self._offsets = offsets
+        return offsets
+
+
+    # Returns a subtree of an actor (or the props with idxActor being None).
+    def GetSubtree(self, idxActor, key):
+        keySubtree = (idxActor, key)
+        subtree = self._subtrees.get(keySubtree)
+        if subtree is not None:
+            return subtree
+        offsets = self.GetOffsets()
+        idxSubtree = None
+        if offsets is not None:
+            idxSubtree = self._layout.GetSubtreeIndex(idxActor, key)
+        if idxSubtree is not None:
+            subtree, _ = g_decoderJSON.raw_decode(self._text, offsets[idxSubtree])
+        elif idxActor is None:
+            subtree = self.GetData()['scene']['props']
+        else:
+            subtree = self.GetData()['scene']['actors'][idxActor][key]
+        self._subtrees[keySubtree] = subtree
+        return subtree
+
+
+    def GetNumActors(self):
+        if self.GetOffsets() is not None:
+            return self._layout.GetNumActors()
+        return len(self.GetData()['scene']['actors'])
+
+
+    def GetNumProps(self):
+        return len(self.GetSubtree(None, 'props'))
+
+
+    def GetTimestamp(self):
+        return self._timestamp
+
+
+    def GetFps(self):
+        return self._fps
+
+
+    def GetJointRotation(self, idxActor, idxJoint):
+        r = self.GetSubtree(idxActor, 'body')[JOINT_NAMES[idxJoint]]['rotation']
+        return r['x'], r['y'], r['z'], r['w']
+
+
+    # Returns a flat list with rotation quaternion components of all joints of an actor.
+    # Joints missing in the frame get an identity rotation.
+    def GetJointRotations(self, idxActor):
+        dataBody = self.GetSubtree(idxActor, 'body')
+        values = []
+        for nameInStudio in JOINT_NAMES:
+            dataBodyPart = dataBody.get(nameInStudio)
+            if dataBodyPart is None:
+                values.extend(ROTATION_IDENTITY)
+                continue
+            r = dataBodyPart['rotation']
+            values.extend((r['x'], r['y'], r['z'], r['w']))
+        return values
+
+
+    def GetJointRotationMatrices(self, idxActor):
+        return QuaternionsToMatrixAxes(self.GetJointRotations(idxActor))
+
+
+    def GetJointPosition(self, idxActor, idxJoint):
+        dataBodyPart = self.GetSubtree(idxActor, 'body').get(JOINT_NAMES[idxJoint])
+        if dataBodyPart is None or 'position' not in dataBodyPart:
+            return None
+        p = dataBodyPart['position']
+        return p['x'], p['y'], p['z']
+
+
+    def GetHipHeight(self, idxActor):
+        return self.GetSubtree(idxActor, 'dimensions')['hipHeight']
+
+
+    def GetFacePose(self, idxActor, idxPose):
+        return float(self.GetSubtree(idxActor, 'face')[FACE_POSE_NAMES_BY_INDEX[idxPose - 1]])
+
+
+    def GetPropRotation(self, idxProp):
+        r = self.GetSubtree(None, 'props')[idxProp]['rotation']
+        return r['x'], r['y'], r['z'], r['w']
+
+
+    def GetPropPosition(self, idxProp):
+        p = self.GetSubtree(None, 'props')[idxProp]['position']
+        return p['x'], p['y'], p['z']
+
+
+# Returns the filename of the cache file belonging to a motion data file.
+def GetClipCacheFilename(filename):
+    return filename + CLIP_CACHE_SUFFIX
+
+
+# Returns the information identifying a motion data file (path, size and modification time).
+def GetClipFileSignature(filename):
+    stat = os.stat(filename)
+    return os.path.normcase(os.path.abspath(filename)), stat.st_size, stat.st_mtime_ns
+
+
+# Stores a clip in a binary cache file next to its motion data file.
+# The cache file gets written to a temporary file first, so a failed write never leaves
+# a broken cache file behind.
+def WriteClipCache(clip, filename):
+    filenameCache = GetClipCacheFilename(filename)
+    path, size, mtime = GetClipFileSignature(filename)
+
+    # Determine layout of all arrays in the cache file
+    sections = []
+    offset = 0
+    for name, idxEntity, values in clip.GetSections():
+        sections.append((name, idxEntity, offset, len(values), values.typecode))
+        offset += len(values) * values.itemsize
+        offset += -offset % CLIP_CACHE_ALIGNMENT
+    header = { 'version' : CLIP_CACHE_VERSION,
+               'path' : path,
+               'size' : size,
+               'mtime' : mtime,
+               'byteorder' : sys.byteorder,
+               'numFrames' : len(clip),
+               'fps' : clip.GetFps(0) if len(clip) > 0 else 0.0,
+               'actors' : clip._actorsInfo if clip._actorsInfo is not None else [],
+               'props' : clip._propsInfo if clip._propsInfo is not None else [],
+               'sections' : sections,
+             }
+    dataHeader = json.dumps(header).encode('utf-8')
+    dataHeader += b' ' * (-len(dataHeader) % CLIP_CACHE_ALIGNMENT)
+
+    # Write header and arrays
+    filenameTemp = filenameCache + '.tmp'
+    try:
+        with open(filenameTemp, mode='wb') as f:
+            f.write(CLIP_CACHE_MAGIC)
+            f.write(struct.pack('<Q', len(dataHeader)))
+            f.write(dataHeader)
+            for name, idxEntity, values in clip.GetSections():
+                dataValues = values.tobytes()
+                f.write(dataValues)
+                f.write(b'\0' * (-len(dataValues) % CLIP_CACHE_ALIGNMENT))
+        os.replace(filenameTemp, filenameCache)
+    except OSError:
+        print('ERROR: Failed to write clip cache {0}.'.format(filenameCache))
+        if os.path.exists(filenameTemp):
+            os.remove(filenameTemp)
+        return False
+    return True
+
+
+# Reads the header of a cache file.
+# Returns header dictionary and offset of the array data in cache file.
+# Returns None, None if there is no cache file or it doesn't belong to the current
+# version of the motion data file.
+def ReadClipCacheHeader(filename, f):
+    magic = f.read(len(CLIP_CACHE_MAGIC))
+    if magic != CLIP_CACHE_MAGIC:
+        return None, None
+    lenHeader = struct.unpack('<Q', f.read(8))[0]
+    header = json.loads(f.read(lenHeader))
+    if header['version'] != CLIP_CACHE_VERSION or header['byteorder'] != sys.byteorder:
+        return None, None
+    path, size, mtime = GetClipFileSignature(filename)
+    if header['path'] != path or header['size'] != size or header['mtime'] != mtime:
+        return None, None
+    return header, len(CLIP_CACHE_MAGIC) + 8 + lenHeader
+
+
+# Returns a clip memory mapped from its cache file.
+# Returns None, if there is no valid cache file.
+def LoadClipCache(filename):
+    filenameCache = GetClipCacheFilename(filename)
+    if not os.path.exists(filenameCache):
+        return None
+    try:
+        with open(filenameCache, mode='rb') as f:
+            header, offsetData = ReadClipCacheHeader(filename, f)
+            if header is None:
+                return None # stale cache, will be overwritten
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, KeyError, struct.error):
+        print('ERROR: Failed to read clip cache {0}.'.format(filenameCache))
+        return None
+    clip = ClipData()
+    clip.InitFromCache(mm, header, offsetData)
+    return clip
+
+
+# Returns a clip summary (see rokoko_clip_index) from a valid cache file.
+# Returns None, if there is no valid cache file.
+def ReadClipCacheSummary(filename):
+    filenameCache = GetClipCacheFilename(filename)
+    if not os.path.exists(filenameCache):
+        return None
+    try:
+        with open(filenameCache, mode='rb') as f:
+            header, _ = ReadClipCacheHeader(filename, f)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    if header is None:
+        return None
+    return ClipSummary({ 'actors' : header['actors'], 'props' : header['props'] }, header['numFrames'], header['fps'])
+
+
+# Returns a clip summary (entity information, number of frames, fps and duration, see rokoko_clip_index)
+# without loading the clip.
+# The summary is taken from the clip index, if the clip got analyzed before.
+# Otherwise the cache file is used, if available. As a last resort only the first frame of
+# the motion data file gets decoded and the remaining frames are merely counted.
+# Newly analyzed clips are stored in the clip index (call SaveClipIndex() to persist).
+# Returns None on error or for an empty clip.
+def ReadClipSummary(filename):
+    index = GetClipIndex()
+    try:
+        summary = index.Lookup(filename)
+    except OSError as e:
+        print('ERROR: Failed to read clip {0}: {1}'.format(filename, e))
+        return None
+    if summary is not None:
+        return summary
+
+    summary = ReadClipCacheSummary(filename)
+    if summary is None:
+        try:
+            frameFirst, numFrames = ReadDataSetSummary(filename)
+        except (OSError, ValueError) as e:
+            print('ERROR: Failed to read clip {0}: {1}'.format(filename, e))
+            return None
+        if frameFirst is None:
+            return None
+        summary = ClipSummary(frameFirst['scene'], numFrames, frameFirst['fps'])
+
+    try:
+        index.Store(filename, summary)
+    except OSError:
+        pass # clip simply won't be found in index next time
+    return summary
+
+
+# Removes the cache file of a motion data file (if any).
+def RemoveClipCache(filename):
+    filenameCache = GetClipCacheFilename(filename)
+    if not os.path.exists(filenameCache):
+        return
+    try:
+        os.remove(filenameCache)
+    except OSError:
+        print('ERROR: Failed to remove clip cache {0}.'.format(filenameCache))
+
+
+# Reads a clip from a motion data file.
+# If available the memory mapped cache file is used, otherwise the motion data file gets
+# decoded and the cache file is (re)created.
+def ReadClip(filename):
+    if not os.path.exists(filename):
+        return None
+
+    clip = LoadClipCache(filename)
+    if clip is not None:
+        return clip
+
+    # Frames get stored in the columnar clip as they are decoded, the decoded frame list is never built
+    try:
+        clip = ClipData(IterDataSetFrames(filename))
+    except (OSError, ValueError) as e:
+        print('ERROR: Failed to read clip {0}: {1}'.format(filename, e))
+        return None
+    WriteClipCache(clip, filename)
+    return clip
+
+
+# Returns a frame object for a frame in a data queue.
+# Data queue may either be a clip or the live data queue (LiveFrames or decoded frames).
+def GetFrameFromQueue(queue, idxFrame):
+    if isinstance(queue, ClipData):
+        return queue.GetFrame(idxFrame)
+    frame = queue[idxFrame]
+    if isinstance(frame, LiveFrame):
+        return frame
+    return DictFrame(frame)
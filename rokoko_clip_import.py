@@ -0,0 +1,98 @@
+# A ClipImporter analyzes a bunch of motion data files (e.g. all clips found in a folder) in the background.
+#
+# Analyzing a clip (see ReadClipSummary() in rokoko_clip) is independent per file, so files get
+# analyzed on a pool of worker threads, while C4D's UI stays responsive.
+# Worker threads only read files, they never touch C4D's document or preferences.
+# Instead the results are collected by the importer and announced to the Manager dialog via
+# SpecialEventAdd(), which then merges them into the clip library in context of the main thread.
+#
+# Note: A thread pool is used instead of a process pool, as new processes can not be spawned
+#       from within C4D's embedded Python. LZ4 decompression and file reading release the GIL,
+#       so the pool still scales with the number of cores for the larger part of the work.
+import os
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+import c4d
+from rokoko_ids import *
+from rokoko_clip import *
+
+# Maximum number of worker threads used to analyze clips
+MAX_CLIP_IMPORT_WORKERS = 8
+
+class ClipImporter():
+    _filenames = None # files to be analyzed
+    _local = False # files are imported into project (True) or global (False) clip library
+    _lock = None # serializes access to results and counters
+    _results = None # list of (filename, clip summary) not yet fetched by main thread
+    _numDone = 0 # number of files analyzed (successfully or not)
+    _cancelled = False
+    _pool = None
+
+    def __init__(self, filenames, local):
+        self._filenames = filenames
+        self._local = local
+        self._lock = Lock()
+        self._results = []
+
+
+    # Starts analyzing the files on the worker pool.
+    def Start(self):
+        numWorkers = max(1, min(MAX_CLIP_IMPORT_WORKERS, os.cpu_count() or 1, len(self._filenames)))
+        self._pool = ThreadPoolExecutor(max_workers=numWorkers)
+        for filename in self._filenames:
+            self._pool.submit(self.AnalyzeFile, filename)
+        self._pool.shutdown(wait=False) # pool finishes queued files in the background (or skips them, if cancelled)
+
+
+    # Cancels the import.
+    # Files not yet started are skipped, results of files currently analyzed are discarded.
+    def Cancel(self):
+        with self._lock:
+            self._cancelled = True
+            self._results = []
+
+
+    # Worker function, analyzing a single file.
+    def AnalyzeFile(self, filename):
+        if self._cancelled:
+            return
+        try:
+            summary = ReadClipSummary(filename)
+        except Exception:
+            summary = None # e.g. corrupt compressed stream or no motion data, count as failed
+        with self._lock:
+            if self._cancelled:
+                return
+            self._numDone += 1
+            if summary is None:
+                print('ERROR: Add data set: Failed to analyze file: {0}'.format(filename))
+            else:
+                self._results.append((filename, summary))
+
+        # Notify Manager dialog about new results
+        c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_CLIP_IMPORT_PROGRESS)
+
+
+    # Returns all results collected since last call.
+    def FetchResults(self):
+        with self._lock:
+            results = self._results
+            self._results = []
+        return results
+
+
+    # Returns a tuple (number of files analyzed, total number of files).
+    def GetProgress(self):
+        return self._numDone, len(self._filenames)
+
+
+    def IsLocal(self):
+        return self._local
+
+
+    def IsCancelled(self):
+        return self._cancelled
+
+
+    def IsDone(self):
+        return self._cancelled or self._numDone >= len(self._filenames)
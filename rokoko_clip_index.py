@@ -0,0 +1,156 @@
+# The clip index persistently stores meta data of all motion data files ever analyzed.
+#
+# Analyzing a clip (number of frames, fps, actors and props with their devices) requires to
+# decompress the motion data file, which takes a while for large clips. Instead the results
+# are stored in an index file in C4D's preferences folder, so re-analyzing a clip (e.g. when
+# changing a clip between global and project library or importing a clip archive a second time)
+# does not need to touch the motion data file at all.
+#
+# Index entries are keyed by a fingerprint of the file's content (see GetClipFingerprint()),
+# so entries stay valid, if a clip gets copied or moved (e.g. into a project folder).
+# As calculating the fingerprint still involves reading parts of the file, additionally
+# path, size and modification time of every file are mapped to its fingerprint. As long as
+# these do not change, a lookup only needs to stat the file.
+#
+# A clip summary (as stored in the index) is a dictionary:
+#   'scene': entity information as in a motion data frame (actors: name, color, meta; props: name, color)
+#   'numFrames', 'fps', 'duration' (in seconds)
+import os, json, hashlib
+from threading import Lock
+import c4d
+
+CLIP_INDEX_FILENAME = 'rokoko_clip_index.json'
+CLIP_INDEX_VERSION = 1
+
+# Size of the blocks read from start and end of a file to calculate its fingerprint
+SIZE_BLOCK_FINGERPRINT = 64 * 1024
+
+
+# Creates a clip summary.
+# Only the entity information is taken from the motion data frame, motion data is dropped.
+def ClipSummary(dataScene, numFrames, fps):
+    actors = [{ 'name' : actor['name'], 'color' : actor['color'], 'meta' : actor['meta'] } for actor in dataScene['actors']]
+    props = [{ 'name' : prop['name'], 'color' : prop['color'] } for prop in dataScene['props']]
+    duration = 0.0
+    if fps > 0.0:
+        duration = numFrames / fps
+    return { 'scene' : { 'actors' : actors, 'props' : props },
+             'numFrames' : numFrames,
+             'fps' : fps,
+             'duration' : duration,
+           }
+
+
+# Returns a fingerprint of a file's content.
+# For speed only size, start and end of the file are hashed. Recordings differ in their first
+# frames (timestamps, actor names,...) already, so this is sufficient to identify clips.
+def GetClipFingerprint(filename):
+    sha = hashlib.sha1()
+    size = os.path.getsize(filename)
+    sha.update(str(size).encode('utf-8'))
+    with open(filename, mode='rb') as f:
+        sha.update(f.read(SIZE_BLOCK_FINGERPRINT))
+        if size > 2 * SIZE_BLOCK_FINGERPRINT:
+            f.seek(-SIZE_BLOCK_FINGERPRINT, os.SEEK_END)
+            sha.update(f.read(SIZE_BLOCK_FINGERPRINT))
+    return sha.hexdigest()
+
+
+class ClipIndex():
+    _filename = None # index file
+    _lock = None # index is used by clip import worker threads as well
+    _clips = None # fingerprint -> clip summary
+    _paths = None # path -> [size, mtime, fingerprint]
+    _dirty = False # index changed since last save
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._lock = Lock()
+        self._clips = {}
+        self._paths = {}
+        self.Load()
+
+
+    # Reads the index file (if any).
+    def Load(self):
+        if not os.path.exists(self._filename):
+            return
+        try:
+            with open(self._filename, mode='r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print('ERROR: Failed to read clip index {0}.'.format(self._filename))
+            return
+        if data.get('version') != CLIP_INDEX_VERSION:
+            return
+        self._clips = data['clips']
+        self._paths = data['paths']
+
+
+    # Writes the index file, if there were any changes.
+    def Save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({ 'version' : CLIP_INDEX_VERSION, 'clips' : self._clips, 'paths' : self._paths })
+            self._dirty = False
+        filenameTemp = self._filename + '.tmp'
+        try:
+            with open(filenameTemp, mode='w') as f:
+                f.write(data)
+            os.replace(filenameTemp, self._filename)
+        except OSError:
+            print('ERROR: Failed to write clip index {0}.'.format(self._filename))
+
+
+    # Returns the key of a file in the clip index.
+    def GetPathKey(self, filename):
+        return os.path.normcase(os.path.abspath(filename))
+
+
+    # Returns the clip summary of a motion data file or None, if the file is not in the index.
+    def Lookup(self, filename):
+        pathKey = self.GetPathKey(filename)
+        stat = os.stat(filename)
+        with self._lock:
+            entryPath = self._paths.get(pathKey)
+            if entryPath is not None and entryPath[0] == stat.st_size and entryPath[1] == stat.st_mtime_ns:
+                return self._clips.get(entryPath[2])
+
+        # File unknown under this path or changed, try to find its content
+        fingerprint = GetClipFingerprint(filename)
+        with self._lock:
+            summary = self._clips.get(fingerprint)
+            if summary is not None:
+                self._paths[pathKey] = [stat.st_size, stat.st_mtime_ns, fingerprint]
+                self._dirty = True
+            return summary
+
+
+    # Stores the clip summary of a motion data file in the index.
+    def Store(self, filename, summary):
+        pathKey = self.GetPathKey(filename)
+        stat = os.stat(filename)
+        fingerprint = GetClipFingerprint(filename)
+        with self._lock:
+            self._clips[fingerprint] = summary
+            self._paths[pathKey] = [stat.st_size, stat.st_mtime_ns, fingerprint]
+            self._dirty = True
+
+
+g_clipIndex = None
+g_lockClipIndex = Lock()
+
+# Returns the clip index (loaded on first use).
+def GetClipIndex():
+    global g_clipIndex
+    with g_lockClipIndex:
+        if g_clipIndex is None:
+            g_clipIndex = ClipIndex(os.path.join(c4d.storage.GeGetC4DPath(c4d.C4D_PATH_PREFS), CLIP_INDEX_FILENAME))
+        return g_clipIndex
+
+
+# Writes pending changes of the clip index to disk.
+def SaveClipIndex():
+    if g_clipIndex is not None:
+        g_clipIndex.Save()
@@ -11,19 +11,10 @@
 import os, shutil, json
 import urllib.request
 import c4d
-# Import lz4 module for the correct platform
-__USE_LZ4__ = True
-try:
-    currentOS = c4d.GeGetCurrentOS()
-    if currentOS == c4d.OPERATINGSYSTEM_WIN:
-        import packages.win.lz4.frame as lz4f
-    elif currentOS == c4d.OPERATINGSYSTEM_OSX:
-        import lz4.frame as lz4f
-except:
-    __USE_LZ4__ = False
 from rokoko_ids import *
 from rokoko_utils import *
 from rokoko_listener import *
+from rokoko_clip_import import *
 from rokoko_dialog_utils import *
 from rokoko_dialog_about import *
 from rokoko_dialog_save_recording import *
@@ -55,6 +46,9 @@ class DialogRokokoManager(c4d.gui.GeDialog):
     # Save Recording and Baking dialog
     _dlgChild = None
 
+    # Background import of all clips in a folder (see rokoko_clip_import)
+    _clipImporter = None
+
     # CustomGUI handles
     _quickTab = None # Quick tab to switch between dialog groups
     _bitmapButtonPlayPause = None # Player's Play/Pause button (needed to toggle its state)
@@ -232,6 +226,9 @@ class DialogRokokoManager(c4d.gui.GeDialog):
             if self.GroupBegin(ID_DLGMNGR_GROUP_CONNECTION_DATA, flags=c4d.BFH_SCALEFIT | c4d.BFV_TOP, title='', cols=1): # Connection data
                 self.GroupBorderSpace(38, 0, 0, 0)
 
+                # Statistics of the live connection, updated in CoreMessageTelemetryUpdate()
+                self.AddStaticText(ID_DLGMNGR_CONNECTION_TELEMETRY, c4d.BFH_SCALEFIT, initw=0, name='')
+
                 if self.GroupBegin(ID_DLGMNGR_GROUP_CONNECTION_DATA_DETAILS, flags=c4d.BFH_SCALEFIT | c4d.BFV_SCALEFIT, title='', cols=2): # Connection details
                     self.GroupBorderSpace(10, 0, 0, 0)
                     # filled in UpdateLayoutGroupConnectedDataSet()
@@ -271,6 +268,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
 
         # Set FPS in row of connection # TODO: not correct with multiple connections
         self.SetString(ID_DLGMNGR_CONNECTION_FPS, '(FPS: ' + str(fps) + ')')
+        self.CoreMessageTelemetryUpdate()
 
         # Relayout data content group
         self.LayoutFlushGroup(ID_DLGMNGR_GROUP_CONNECTION_DATA_DETAILS)
@@ -635,6 +633,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
                     # Playback rate
                     self.AddStaticText(0, c4d.BFH_RIGHT|c4d.BFH_SCALE, initw=0, name='Playback rate:')
                     self.AddComboBox(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, c4d.BFH_RIGHT, initw=0)
+                    self.AddChild(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, PLAYBACK_RATE_AUTO, 'Auto')
                     self.AddChild(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, 1, '1:1 (~60FPS)')
                     self.AddChild(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, 2, '1:2 (~30FPS)')
                     self.AddChild(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, 3, '1:3 (~20FPS)')
@@ -922,8 +921,8 @@ class DialogRokokoManager(c4d.gui.GeDialog):
         playbackRate = GetPref(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED)
         # TODO: Cleanup pref init
         if playbackRate is None:
-            SetPref(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, 2)
-            playbackRate = 2
+            SetPref(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, PLAYBACK_RATE_AUTO)
+            playbackRate = PLAYBACK_RATE_AUTO
         self.SetInt32(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED, playbackRate)
 
         # Animate document checkbox
@@ -1052,6 +1051,70 @@ class DialogRokokoManager(c4d.gui.GeDialog):
         self.SetInt32(ID_DLGMNGR_PLAYER_BUFFERING_IN_MENU, self._cntBuffering % 5, min=0, max=4, min2=0, max2=4)
 
 
+    # Reaction to PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_TELEMETRY_UPDATE.
+    # Send by the listener thread once per second.
+    # Shows the statistics of the live connection (see rokoko_telemetry) in a single row.
+    # Without live connection the statistics of the offline player's clock are shown instead (see rokoko_player_clock).
+    def CoreMessageTelemetryUpdate(self):
+        if GetConnectedDataSet() is None:
+            stats = g_thdListener.GetPlayerClockStats()
+            if stats is None:
+                self.SetString(ID_DLGMNGR_CONNECTION_TELEMETRY, '')
+                return
+            text = 'Player Drift: {0:.1f}/{1:.1f} ms'.format(*stats['drift'])
+            text += '  Dropped: {0}  Held: {1}'.format(stats['dropped'], stats['held'])
+            self.SetString(ID_DLGMNGR_CONNECTION_TELEMETRY, text)
+            return
+        stats = g_thdListener.GetTelemetry()
+        if stats is None:
+            self.SetString(ID_DLGMNGR_CONNECTION_TELEMETRY, '')
+            return
+        text = 'Rate: {0:.1f} Hz'.format(stats['rate'])
+        text += '  Gaps: {0} ({1} frames)'.format(stats['gaps'], stats['missing'])
+        text += '  Decode: {0:.1f}/{1:.1f} ms'.format(*stats['decode'])
+        text += '  Dispatch: {0:.1f}/{1:.1f} ms'.format(*stats['dispatch'])
+        text += '  Draw: {0:.1f}/{1:.1f} ms'.format(*stats['draw'])
+        text += '  Latency: {0:.1f}/{1:.1f} ms'.format(*stats['latency'])
+        if 'droppedReceive' in stats:
+            text += '  Dropped: {0}  Backlog: {1}/{2}'.format(stats['droppedReceive'] + stats['droppedDecode'], stats['backlogDecode'], stats['backlogDispatch'])
+        self.SetString(ID_DLGMNGR_CONNECTION_TELEMETRY, text)
+
+
+    # Reaction to PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_CLIP_IMPORT_PROGRESS.
+    # Send by the clip importer's worker threads, whenever a file got analyzed.
+    # Data sets are created and stored in the clip library here, in context of the main thread.
+    # Import can be cancelled by pressing ESC.
+    def CoreMessageClipImportProgress(self):
+        importer = self._clipImporter
+        if importer is None:
+            return
+
+        # Check for user cancelling the import
+        bcKey = c4d.BaseContainer()
+        if c4d.gui.GetInputState(c4d.BFM_INPUT_KEYBOARD, c4d.KEY_ESC, bcKey) and bcKey[c4d.BFM_INPUT_VALUE]:
+            importer.Cancel()
+            print('Import of clips cancelled.')
+
+        # Store results in respective library
+        local = importer.IsLocal()
+        for filename, summary in importer.FetchResults():
+            bcDataSet = self.CreateDataSet(filename, local, summary)
+            AddDataSetBC(bcDataSet)
+
+        # Update progress
+        numDone, numFiles = importer.GetProgress()
+        if not importer.IsDone():
+            c4d.StatusSetText('Importing clips {0}/{1} (ESC to cancel)...'.format(numDone, numFiles))
+            c4d.StatusSetBar(int(100.0 * float(numDone) / float(numFiles)))
+            return
+
+        # Import finished
+        self._clipImporter = None
+        SaveClipIndex()
+        c4d.StatusClear()
+        self.DataSetsChanged(local)
+
+
     # Reaction to PLUGIN_ID_COREMESSAGE_MANAGER_CURRENT_FRAME_NUMBER.
     # During playback, player sends this event every few frames so Player can update
     # scrub bar position and length.
@@ -1126,6 +1189,10 @@ class DialogRokokoManager(c4d.gui.GeDialog):
                 self.CoreMessagePlayerStatusChange()
             elif subId == CM_SUBID_MANAGER_BUFFER_PULSE:
                 self.CoreMessageBufferPulse()
+            elif subId == CM_SUBID_MANAGER_CLIP_IMPORT_PROGRESS:
+                self.CoreMessageClipImportProgress()
+            elif subId == CM_SUBID_MANAGER_TELEMETRY_UPDATE:
+                self.CoreMessageTelemetryUpdate()
             return True
 
         elif id == PLUGIN_ID_COREMESSAGE_MANAGER_CURRENT_FRAME_NUMBER:
@@ -1161,6 +1228,12 @@ class DialogRokokoManager(c4d.gui.GeDialog):
                 # User decided to keep Manager dialog open
                 return True # Dialog will NOT be closed
 
+        # Clips still being imported will no longer be stored in clip library
+        if self._clipImporter is not None:
+            self._clipImporter.Cancel()
+            self._clipImporter = None
+            c4d.StatusClear()
+
         # Close manager dialog
         return False
 
@@ -1502,6 +1575,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
                     if move:
                         if DO_FILE_ACTION:
                             shutil.move(filename, filenameDst)
+                            RemoveClipCache(filename) # cache is bound to the file's path, will be recreated on next use
                     else:
                         if DO_FILE_ACTION:
                             shutil.copyfile(filename, filenameDst)
@@ -1544,6 +1618,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
             # If tag used the old data set, use new data set (if moving)
             if move and tag[ID_TAG_DATA_SET] == idDataSet:
                 tag[ID_TAG_DATA_SET] = bcDataSetNew.GetId()
+                g_thdListener.UpdateTagConsumer(tag.GetNodeData(), tag)
 
         # Update both clip library tabs
         self.UpdateLayoutGroupDataSet(local=True)
@@ -1574,31 +1649,25 @@ class DialogRokokoManager(c4d.gui.GeDialog):
     # Analyzes a motion data file and returns a new data set container,
     # properly referencing the file and meta data set.
     # Returns None on error.
-    # Note: File gets loaded, decompressed and decoded.
-    #       So depending on file size, this can take a second or two.
+    # Note: Unless the clip is found in the clip index (see rokoko_clip_index) or there is a valid
+    #       clip cache (see rokoko_clip), file gets decompressed, but only its first frame gets decoded.
     def AnalyzeFile(self, filename, local, nameDataSet=None):
         # Check file existence
         if not os.path.exists(filename):
             print('ERROR: Clip not found: {0}'.format(filename))
             return None
 
-        # Read LZ4 compressed data from file
-        dataLZ4 = None
-        with open(filename, mode='rb') as f:
-            dataLZ4 = f.read()
-            f.close()
-        if dataLZ4 is None:
+        # Only entity information and frame count are needed, the clip does not get loaded
+        summary = ReadClipSummary(filename)
+        SaveClipIndex()
+        if summary is None:
             return None
 
-        # Decompress data
-        if __USE_LZ4__:
-            dataStudio = lz4f.decompress(dataLZ4, return_bytearray=True, return_bytes_read=False)
-        else:
-            dataStudio = dataLZ4
+        return self.CreateDataSet(filename, local, summary, nameDataSet)
 
-        # Decode JSON into dictionary
-        data = json.loads(dataStudio)
 
+    # Creates a new data set container for an analyzed motion data file (see ReadClipSummary()).
+    def CreateDataSet(self, filename, local, summary, nameDataSet=None):
         # If no data set name provided, create one from file name
         if nameDataSet is None:
             nameDataSet = filename[filename.rfind(os.sep)+1:]
@@ -1611,10 +1680,10 @@ class DialogRokokoManager(c4d.gui.GeDialog):
             filename = filename.replace(pathDocument, '.')
 
         # Create a new data set
-        bcDataSet = BaseContainerDataSet(nameDataSet, filename, isLocal=local)
+        bcDataSet = BaseContainerDataSet(nameDataSet, filename, isLocal=local, numFrames=summary['numFrames'])
 
-        # Analyze first frame of motion data and store meta data in data set.
-        StoreAvailableEntitiesInDataSet(data[0]['scene'], bcDataSet)
+        # Store meta data from first frame of motion data in data set.
+        StoreAvailableEntitiesInDataSet(summary['scene'], bcDataSet, summary['fps'])
 
         return bcDataSet
 
@@ -1632,6 +1701,11 @@ class DialogRokokoManager(c4d.gui.GeDialog):
         filenames = [] # list of filenames to be added as clips
         pathDocument = c4d.documents.GetActiveDocument().GetDocumentPath()
         if folder:
+            # Only one folder import at a time
+            if self._clipImporter is not None:
+                c4d.gui.MessageDialog('Clips are still being imported.', c4d.GEMB_ICONEXCLAMATION)
+                return True
+
             # Ask user to choose a folder
             pathFolder = c4d.storage.LoadDialog(type=c4d.FILESELECTTYPE_ANYTHING, title='Load All Clips From Folder...', flags=c4d.FILESELECT_DIRECTORY, force_suffix='rec', def_path=pathDocument, def_file='')
             if pathFolder is None or len(pathFolder) < 2:
@@ -1651,6 +1725,17 @@ class DialogRokokoManager(c4d.gui.GeDialog):
             # File found
             filenames.append(filename)
 
+        # Files in a folder get analyzed in background, results are stored in
+        # library in CoreMessageClipImportProgress()
+        if folder:
+            if len(filenames) == 0:
+                return True
+            self._clipImporter = ClipImporter(filenames, local)
+            c4d.StatusSetText('Importing clips 0/{0} (ESC to cancel)...'.format(len(filenames)))
+            c4d.StatusSetBar(0)
+            self._clipImporter.Start()
+            return True
+
         # Iterate all files found
         for idxFilename, filename in enumerate(filenames):
             # Get a new data set container for the given file
@@ -1662,7 +1747,13 @@ class DialogRokokoManager(c4d.gui.GeDialog):
             # Store clip data set in respective library
             AddDataSetBC(bcDataSet)
 
+        self.DataSetsChanged(local)
+
+
+    # Announces a change of a clip library.
+    def DataSetsChanged(self, local):
         # Announce clip library change to tags (to update combo boxes)
+        self._tags = GetTagList()
         for tag in self._tags:
             tag.Message(c4d.MSG_MENUPREPARE)
 
@@ -1706,6 +1797,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
             # If tag used the old data set, use changed data set's ID
             if tag[ID_TAG_DATA_SET] == idDataSet:
                 tag[ID_TAG_DATA_SET] = bcDataSetNew.GetId()
+                g_thdListener.UpdateTagConsumer(tag.GetNodeData(), tag)
 
         # Update respective library group
         self.UpdateLayoutGroupDataSet(local)
@@ -1792,6 +1884,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
         for filename in filenamesDelete:
             if DO_FILE_ACTION:
                 os.remove(filename)
+                RemoveClipCache(filename)
 
 
     # User pressed "+" button on "Tags" tab (create scene or create characters and such).
@@ -1968,6 +2061,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
             #tag[ID_TAG_ACTORS] = idxActor # TODO strange!!!
             tag.GetDataInstance().SetInt32(ID_TAG_ACTORS, idxActor)
             tag[ID_TAG_ACTOR_INDEX] = idxActor
+            g_thdListener.UpdateTagConsumer(tag.GetNodeData(), tag)
 
         # Props
         # For all props contained in referenced motion data
@@ -2186,6 +2280,10 @@ class DialogRokokoManager(c4d.gui.GeDialog):
         bcMenu = c4d.BaseContainer()
         bcMenu.InsData(ID_SUBMENU_TAG_PLAY, 'Play' + disableItem)
         bcMenu.InsData(ID_SUBMENU_TAG_TPOSE, 'Go to T-Pose' + disableItem)
+        disableItemRig = disableItem
+        if not (self._tags[idxTag][ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR):
+            disableItemRig = '&d&'
+        bcMenu.InsData(ID_SUBMENU_TAG_APPLY_RIG, 'Apply Mapping to Identical Rigs' + disableItemRig)
         bcMenu.InsData(0, '')
         bcMenu.InsData(ID_SUBMENU_TAG_SHOW_TAG, 'Show Tag in Attribute Manager')
         bcMenu.InsData(ID_SUBMENU_TAG_SHOW_OBJECT, 'Show Object in Attribute Manager')
@@ -2208,6 +2306,11 @@ class DialogRokokoManager(c4d.gui.GeDialog):
         elif result == ID_SUBMENU_TAG_TPOSE:
             c4d.CallButton(self._tags[idxTag], ID_TAG_BUTTON_GO_TO_TPOSE)
             c4d.EventAdd()
+        elif result == ID_SUBMENU_TAG_APPLY_RIG:
+            tag = self._tags[idxTag]
+            numTags = tag.GetNodeData().CommandApplyRigToIdenticalRigs(tag)
+            c4d.EventAdd()
+            c4d.gui.MessageDialog('Mapping applied to {0} identical rigs.'.format(numTags))
         elif result == 0:
             pass # menu canceled
         else:
@@ -2573,6 +2676,7 @@ class DialogRokokoManager(c4d.gui.GeDialog):
         doc.StartUndo()
         doc.AddUndo(c4d.UNDOTYPE_CHANGE, tag)
         tag[ID_TAG_DATA_SET] = self.GetInt32(id)
+        g_thdListener.UpdateTagConsumer(tag.GetNodeData(), tag)
         doc.EndUndo()
 
         # Let C4D know, we have changed the scene (e.g. tag in Attribute Manager)
@@ -3,15 +3,15 @@
 # tag. Besides hiding some options in the latter case, the dialog is also owned differently. In the
 # first case the Manager dialog owns this dialog, in the later case the tag owns the dialog.
 #
-# Currently all baking logic (creation of curves, keyframes, Takes and overrides) is within this
-# dialog. Which was a very questionable decision, most likely this code will be merged into the
-# tag in future.
+# Baking logic (creation of curves, keyframes, Takes and overrides) lives in rokoko_bake (see BakeTags()),
+# this dialog only collects the bake parameters from its widgets.
 import os
 import c4d
 from rokoko_ids import *
 from rokoko_utils import *
 from rokoko_listener import *
 from rokoko_dialog_utils import *
+from rokoko_bake import *
 
 g_thdListener = GetListenerThread() # owned by rokoko_listener
 g_studioTPose = {} # created and owned by rokoko_plugin_registration
@@ -162,6 +162,11 @@ class DialogSaveRecording(c4d.gui.GeDialog):
                     self.AddStaticText(0, c4d.BFH_SCALEFIT, name='') # Dummy
 
                 # Row 6
+                self.AddCheckbox(ID_DLGSAVE_REDUCE_KEYFRAMES, c4d.BFH_SCALEFIT, name='Reduce Keyframes', initw=0, inith=0)
+                self.AddStaticText(0, c4d.BFH_SCALEFIT, name='Tolerance (Degree, Units, %)')
+                self.AddEditNumberArrows(ID_DLGSAVE_REDUCE_TOLERANCE, c4d.BFH_SCALEFIT)
+
+                # Row 7
                 self.AddButton(ID_DLGSAVE_SET_KEYFRAMES_AT_0, c4d.BFH_SCALEFIT, name='Bake Keyframes at 0')
                 self.AddButton(ID_DLGSAVE_SET_KEYFRAMES_AT_CURRENT, c4d.BFH_SCALEFIT, name='Bake Keyframes at Current')
                 self.AddStaticText(0, c4d.BFH_SCALEFIT, name='') # Dummy
@@ -291,6 +296,9 @@ class DialogSaveRecording(c4d.gui.GeDialog):
         self.SetInt32(ID_DLGSAVE_FRAME_SKIP, GetPref(ID_DLGSAVE_FRAME_SKIP))
         self.SetInt32(ID_DLGSAVE_LENGTH, GetPref(ID_DLGSAVE_LENGTH))
         self.SetBool(ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS, GetPref(ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS))
+        self.SetBool(ID_DLGSAVE_REDUCE_KEYFRAMES, GetPref(ID_DLGSAVE_REDUCE_KEYFRAMES))
+        self.SetFloat(ID_DLGSAVE_REDUCE_TOLERANCE, GetPref(ID_DLGSAVE_REDUCE_TOLERANCE), min=0.001, max=100.0, step=0.01)
+        self.Enable(ID_DLGSAVE_REDUCE_TOLERANCE, self.GetBool(ID_DLGSAVE_REDUCE_KEYFRAMES))
         self.SetBool(ID_DLGSAVE_SET_KEYFRAMES_AUTOFORWARD, GetPref(ID_DLGSAVE_SET_KEYFRAMES_AUTOFORWARD))
         self.SetBool(ID_DLGSAVE_USE_NEW_DATASET, GetPref(ID_DLGSAVE_USE_NEW_DATASET))
         return True
@@ -378,669 +386,50 @@ class DialogSaveRecording(c4d.gui.GeDialog):
         return c4d.gui.GeDialog.Message(self, msg, result) # pass message on to parenting classes
 
 
-    # Finds or creates animation curves for a given DescId referencing a Vector.
-    # This is used for rotational or position keyframes.
-    # And it's only used in the case of baking into a new Take.
-    #
-    # All components of the Vector are handled separately.
-    #
-    # There is a second version of this function below, which is used in the
-    # case of baking without a Take (which will result in baking into the current Take).
-    def PrepareCurvesInTake(self, takeData, take, obj, overrides, curves, descId, mgTPose):
-        # Depending on DescID either need to store the offset or
-        # its relative rotation as default value.
-        if mgTPose is not None:
-            if descId[0].id == c4d.ID_BASEOBJECT_REL_ROTATION:
-                vDefault = c4d.utils.MatrixToHPB(~obj.GetUpMg() * MR_Y180 * mgTPose)
-            else:
-                vDefault = (~obj.GetUpMg() * MR_Y180 * mgTPose).off
-        else:
-            vDefault = obj.GetMl().off
-
-        vectorComponents = [c4d.VECTOR_X, c4d.VECTOR_Y, c4d.VECTOR_Z]
-        descIdComponents = [None, None, None]
-        overrideComponents = [None, None, None]
-        curveComponents = [None, None, None]
-
-        # All components of a Vector are handled separately.
-        for idxComponent in range(3):
-            # DescID of vector component
-            descIdComponents[idxComponent] = c4d.DescID(descId[0], c4d.DescLevel(vectorComponents[idxComponent], c4d.DTYPE_REAL, 0))
-
-            # Find or create the override
-            overrideComponents[idxComponent] = take.FindOrAddOverrideParam(takeData, obj, descIdComponents[idxComponent], vDefault[idxComponent], None, False)
-            if overrideComponents[idxComponent] is None:
-                print('ERROR: Failed to override:', descId[0].id, idxComponent)
-                break
-            overrideComponents[idxComponent].UpdateSceneNode(takeData, descIdComponents[idxComponent])
-
-            # Try to find an existing CTrack
-            ctrack = overrideComponents[idxComponent].FindCTrack(descIdComponents[idxComponent])
-            if ctrack is None:
-                # Create and insert a new CTrack
-                ctrack = c4d.CTrack(obj, descIdComponents[idxComponent])
-                overrideComponents[idxComponent].InsertTrackSorted(ctrack)
-
-            # We are not actually interested in the track, but need the curve it contains
-            curveComponents[idxComponent] = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
-
-            # Optionally wipe all previous keyframes
-            if self.GetBool(ID_DLGSAVE_WIPE_EXISTING_ANIMATION):
-                curveComponents[idxComponent].FlushKeys()
-
-        # Store overrides and curves in dictionaries
-        nameObj = obj.GetName()
-        overrides[nameObj] = overrideComponents
-        curves[nameObj] = curveComponents
-
-
-    # Finds or creates animation curves for a given DescId referencing a Vector.
-    # This is used for rotational or position keyframes.
-    # And it's only used in the case of NOT baking into a Take.
-    #
-    # All components of the Vector are handled separately.
-    #
-    # There is a second version of this function above, which is used in the
-    # case of baking into a new Take.
-    def PrepareCurves(self, obj, curves, descId):
-        vectorComponents = [c4d.VECTOR_X, c4d.VECTOR_Y, c4d.VECTOR_Z]
-        descIdComponents = [None, None, None]
-        curveComponents = [None, None, None]
-
-        # All components of a Vector are handled separately.
-        for idxComponent in range(3):
-            # DescID of vector component
-            descIdComponents[idxComponent] = c4d.DescID(descId[0], c4d.DescLevel(vectorComponents[idxComponent], c4d.DTYPE_REAL, 0))
-
-            # Try to find an existing CTrack
-            ctrack = obj.FindCTrack(descIdComponents[idxComponent])
-            if ctrack is None:
-                # Create and insert a new CTrack
-                ctrack = c4d.CTrack(obj, descIdComponents[idxComponent])
-                obj.InsertTrackSorted(ctrack)
-
-            # We are not actually interested in the track, but need the curve it contains
-            curveComponents[idxComponent] = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
-
-            # Optionally wipe all previous keyframes
-            if self.GetBool(ID_DLGSAVE_WIPE_EXISTING_ANIMATION):
-                curveComponents[idxComponent].FlushKeys()
-
-        # Store curves in dictionary
-        nameObj = obj.GetName()
-        curves[nameObj] = curveComponents
-
-
-    # Finds or creates an animation curve for a given DescId referencing a numerical value.
-    # This is used for face morph keyframes, as these only have a single float value.
-    # And it's only used in the case of baking into a new Take.
-    #
-    # There is a second version of this function below, which is used in the
-    # case of baking without a Take (which will result in baking into the current Take).
-    def PrepareMorphCurvesInTake(self, takeData, take, tagPoseMorph, overrides, curves, descIdMorph, nameInStudio):
-        valDefault = 0.0
-
-        # Find or create the override
-        override = take.FindOrAddOverrideParam(takeData, tagPoseMorph, descIdMorph, valDefault, None, False)
-        if override is None:
-            print('ERROR: Failed to override pose:', descIdMorph[0].id)
-            return
-        override.UpdateSceneNode(takeData, descIdMorph)
-
-        # Try to find an existing CTrack
-        ctrack = override.FindCTrack(descIdMorph)
-        if ctrack is None:
-            # Create and insert a new CTrack
-            ctrack = c4d.CTrack(tagPoseMorph, descIdMorph)
-            override.InsertTrackSorted(ctrack)
-
-        # We are not actually interested in the track, but need the curve it contains
-        curve = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
-
-        # Optionally wipe all previous keyframes
-        if self.GetBool(ID_DLGSAVE_WIPE_EXISTING_ANIMATION):
-            curve.FlushKeys()
-
-        # Store override and curve in dictionaries
-        overrides[nameInStudio] = override
-        curves[nameInStudio] = curve
-
-
-    # Finds or creates an animation curve for a given DescId.
-    # This is used for face morph keyframes, as these only have a single float value.
-    # And it's only used in the case of NOT baking into a Take.
-    #
-    # There is a second version of this function above, which is used in the
-    # case of baking into a new Take.
-    def PrepareMorphCurves(self, tagPoseMorph, curves, descIdMorph, nameInStudio):
-        # Try to find an existing CTrack
-        ctrack = tagPoseMorph.FindCTrack(descIdMorph)
-        if ctrack is None:
-            # Create and insert a new CTrack
-            ctrack = c4d.CTrack(tagPoseMorph, descIdMorph)
-            tagPoseMorph.InsertTrackSorted(ctrack)
-
-        # We are not actually interested in the track, but need the curve it contains
-        curve = ctrack.GetCurve(type=c4d.CCURVE_CURVE, bCreate=True)
-
-        # Optionally wipe all previous keyframes
-        if self.GetBool(ID_DLGSAVE_WIPE_EXISTING_ANIMATION):
-            curve.FlushKeys()
-
-        # Store curve in dictionary
-        curves[nameInStudio] = curve
-
-
-    # Creates a "T-Pose dictionary".
-    # Same as in tag... :(
-    # For all joints set in tag's mapping table,
-    # store object reference, object name and T-Pose matrices (normal and pretransformed).
-    # Entries are referred to by their Studio names.
-    def PrepareTPosePerTag(self, tag):
-        tPoseTag = {}
-
-        for nameInStudio, (idx, _, _, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.items():
-            obj = tag[ID_TAG_BASE_RIG_LINKS + idx]
-
-            # Skip empty mapping table entries
-            if obj is None:
-                continue
-
-            # Store information in dictionary
-            nameObj = obj.GetName()
-            mgBodyPartTPose = tag[ID_TAG_BASE_RIG_MATRICES + idx]
-            mgBodyPartTPosePretransformed = tag[ID_TAG_BASE_RIG_MATRICES_PRETRANSFORMED + idx]
-            tPoseTag[nameInStudio] = (obj, mgBodyPartTPose, nameObj, mgBodyPartTPosePretransformed)
-        return tPoseTag
-
-
-    # Creates a "face morph dictionary".
-    # During baking morphs are addressed by their DescID.
-    # Only morphs in tag's mapping table are stored in the dictionary.
-    def PrepareFacePosesPerTag(self, tag):
-        facePoses = {}
-        obj = tag.GetObject()
-        tagPoseMorph = obj.GetTag(c4d.Tposemorph)
-
-        for nameInStudio, (idxPose, _, _, _, _, _) in FACE_POSE_NAMES.items():
-            namePoseC4D = tag[ID_TAG_BASE_FACE_POSES + idxPose]
-
-            # Skip empty mapping table entries
-            if namePoseC4D is None or len(namePoseC4D) <= 0:
-                continue
-
-            # Get DescID of this morph
-            idxMorph = tag[ID_TAG_BASE_MORPH_INDECES + idxPose]
-            descIdMorph = tagPoseMorph.GetMorphID(idxMorph)
-            # The returned DescID is not properly suited to set the morph strength...
-            descIdMorph = c4d.DescID(c4d.DescLevel(descIdMorph[0].id, c4d.DTYPE_SUBCONTAINER, 0), c4d.DescLevel(descIdMorph[1].id, c4d.DTYPE_REAL, 0))
-
-            # Store in dict
-            facePoses[nameInStudio] = descIdMorph
-        return facePoses
-
-
-    # As Takes seem to have an issue with applying keyframes for a Vector at once,
-    # this function adds the keyframes to the curves component wise.
-    def AddVectorKeyframesToCurve(self, nameInStudio, time, curveComponents, v):
-        for idxComponent in range(3):
-            resAddKey = curveComponents[idxComponent].AddKey(time)
-            if resAddKey is None:
-                print('ERROR: Failed to add keyframe', nameInStudio, idxComponent)
-                break
-            key = resAddKey['key']
-            key.SetValue(curveComponents[idxComponent], v[idxComponent])
-
-
-    # Create all keyframes for a single Rokoko tag of type "actor"
-    #
-    # Code to calculate offsets and rotations is based on Philipp's nice Blender implementation:
-    # https://github.com/Rokoko/rokoko-studio-live-blender/blob/85f0569cc08fdee405f6c17bcb4e9c52804e43fa/core/animations.py#L88-L216
-    #
-    # In order to make up for some performance issues in C4D, the actual implementation is a bit different.
-    # There are certain parts of the calculation independent of the actual motion of an actor.
-    # In this plugin, these parts are moved out of this function (more important for Execute() of the tag).
-    # Instead these calculations are done, when the T-Pose gets stored.
-    # See ID_TAG_BASE_RIG_MATRICES_PRETRANSFORMED in rokoko_tag.
-    def KeyframeActor(self, tag, tPose, data, curvesRot, curvesPos, time):
-        # Get actor data from motion data frame
-        idxActor = tag[ID_TAG_ACTOR_INDEX]
-        dataActors = data['actors']
-        if idxActor == -1 or idxActor >= len(dataActors): # bake only if data is valid
-            return
-        dataActor = dataActors[idxActor]
-        dataBody = dataActor['body']
-        objRoot = tag.GetObject()
-
-        # In case there is no dedicated root object (but Rokoko tag is assigned directly to hip joint),
-        # use identity matrix as root matrix
-        objHip = tag[ID_TAG_BASE_RIG_LINKS + 0]
-        if objHip != objRoot:
-            mgRoot = objRoot.GetMg()
-        else:
-            mgRoot = c4d.Matrix()
-
-        mgRootTPose = tag[ID_TAG_ROOT_MATRIX]
-
-        ### Rotation
-
-        # Iterate all objects of the rig (well, only those assigned in tag's mapping table)
-        for nameInStudio, (obj, _, nameInRig, mRotOffsetRef) in tPose.items():
-            # Get Studio rotation and convert into C4D transformation matrix
-            dataBodyPart = dataBody[nameInStudio]
-            mStudioNewPose = JSONQuaternionToMatrix(dataBodyPart['rotation'])
-
-            # Transform the current Studio rotation
-            # Apply pretransformed T-Pose matrix
-            mFinalRot = mStudioNewPose * mRotOffsetRef
-
-            # While sharing a similarly oriented coordinate system,
-            # in C4D characters face forward in the opposite direction.
-            # A character in T-Pose will usually look into -Z in T-Pose (while in Rokoko Studio it looks into +Z).
-
-            # Rotate Studio's rotation by 180 degree around Y
-            mFinalRot = MR_Y180 * mFinalRot # actually ~MR_Y180 * mFinalRot, but ~MR_Y180 == MR_Y180
-
-            # Reverse the rotation which may have been caused by a rotation of T-Pose's root object
-            mFinalRot = ~mgRootTPose * mFinalRot
-
-            # Finally rotate by rigs current root rotation
-            mFinalRot = mgRoot * mFinalRot
-
-            # Preserve global position of the joint
-            mFinalRot.off = obj.GetMg().off
-
-            obj.SetMg(mFinalRot)
-
-            # Keyframes are always relative rotations
-            vRot = obj.GetRelRot()
-
-            # Add keyframe for every component of the rotation to the curve
-            curveComponents = curvesRot[nameInRig]
-            self.AddVectorKeyframesToCurve(nameInStudio, time, curveComponents, vRot)
-
-        ### Hip Position
-        if 'hip' in tPose:
-            # Get hip parameters
-            (_, _, nameInRig, _) = tPose['hip']
-            hipHeightStudio = dataActor['dimensions']['hipHeight'] # hip height of current actor in Studio
-            hipHeightStudioC4D = hipHeightStudio * 100.0
-            posStudio = dataBody['hip']['position'] # current position of hip in Studio
-            yTPoseHip = tag[ID_TAG_ACTOR_HIP_HEIGHT]
-
-            # Scale hip height by ratio of current actor's hip height and Studio's T-Pose base hip height
-            scale = yTPoseHip / hipHeightStudio
-
-            # Calculate hip's y position in C4D
-            y = yTPoseHip * (1 + (posStudio['y'] - hipHeightStudio))
-
-            # Merge into relative offset in C4D
-            # -x/z due to different orientation of character in C4D
-            off = c4d.Vector(-posStudio['x'] * scale,
-                             y,
-                             -posStudio['z'] * scale)
-
-            # Reverse offset and rotation which may have been caused by T-Pose's root object
-            off = ~mgRootTPose * off
-
-            # Scale position with "Project Scale" parameter
-            off *= GetProjectScale() # position relative to root object
-
-            # Add keyframe for every component of the offset to the curve
-            curveComponents = curvesPos[nameInRig]
-            self.AddVectorKeyframesToCurve('hip', time, curveComponents, off)
-
-
-    # Create all keyframes for a single Rokoko tag of type "face"
-    def KeyframeFace(self, tag, facePoses, data, _, curves, time):
-        # Get face data from motion data frame
-        idxActor = tag[ID_TAG_ACTOR_INDEX]
-        dataActors = data['actors']
-        if idxActor == -1 or idxActor >= len(dataActors): # bake only if data is valid
-            return
-        dataFace = dataActors[idxActor]['face']
-        obj = tag.GetObject()
-        tagPoseMorph = obj.GetTag(c4d.Tposemorph)
-
-        # Add keyframe for every morph to the curve
-        for nameInStudio, descIdMorph in facePoses.items():
-            curve = curves[nameInStudio]
-            resAddKey = curve.AddKey(time)
-            if resAddKey is None:
-                print('ERROR: Failed to add posemorph keyframe', nameInStudio)
-                break
-            key = resAddKey['key']
-            strength = float(dataFace[nameInStudio]) / 100.0
-            key.SetValue(curve, strength)
-
-
-    # Create all keyframes for a single Rokoko tag of type "prop"
-    def KeyframeProp(self, tag, data, curvesRot, curvesPos, time):
-        # Get prop data from motion data frame
-        idxProp = tag[ID_TAG_ACTOR_INDEX]
-        dataProps = data['props']
-        if idxProp == -1 or idxProp >= len(dataProps): # bake only if data is valid
-            return
-        dataProp = dataProps[idxProp]
-        objProp = tag.GetObject()
-        nameObjProp = objProp.GetName()
-
-        ### Rotation
-
-        # Convert Studio rotation into a C4D transformation matrix
-        mPropStudio = JSONQuaternionToMatrix(dataProp['rotation'])
-
-        # While sharing a similarly oriented coordinate system,
-        # in C4D characters (and thus also props) face forward in the opposite direction.
-        # A character in T-Pose will usually look into -Z in T-Pose (while in Rokoko Studio it looks into +Z).
-
-        # Rotate Studio data by 180 degree around Y
-        mFinalRot = MR_Y180 * mPropStudio # absolute rotation of prop object in C4D
-
-        # Preserve global position of the object (for the moment)
-        mFinalRot.off = objProp.GetMg().off
-
-        objProp.SetMg(mFinalRot)
-
-        # Keyframes are always relative rotations
-        vRot = objProp.GetRelRot()
-
-        # Add keyframe for every component of the rotation to the curve
-        curveComponents = curvesRot[nameObjProp]
-        self.AddVectorKeyframesToCurve(nameObjProp, time, curveComponents, vRot)
-
-        ### Position
-
-        # Convert absolute global position in Studio into a C4D offset vector
-        posStudio = dataProp['position']
-        off = c4d.Vector(-posStudio['x'] * 100.0,
-                         posStudio['y'] * 100.0,
-                         -posStudio['z'] * 100.0)
-
-        # Scale position with "Project Scale" parameter
-        off *= GetProjectScale()
-
-        # Add keyframe for every component of the offset to the curve
-        curveComponents = curvesPos[nameObjProp]
-        self.AddVectorKeyframesToCurve(nameObjProp, time, curveComponents, off)
-
-
-    # Create all keyframes for a single Rokoko tag
-    def KeyframeTags(self, dataQueue, idxFirstFrame, idxLastFrame, tag, tPose, curvesRot, curvesPos, time, timeStart, timeMax, idxLastKey):
-        # Get all needed parameters from dialog
-        behaviorAtEnd = self.GetInt32(ID_DLGSAVE_LENGTH)
-        timing = self.GetInt32(ID_DLGSAVE_TIMING)
-        skipFrames = self.GetInt32(ID_DLGSAVE_FRAME_SKIP)
-
-        # Frame reduction parameters allow to specify in two ways:
-        # Parameter (combo box) value < 10: Only bake every nth frame
-        # Parameter (combo box) value >= 10: Basically specifying keyframes per second (C4D's document time)
-        skipByIndex = skipFrames < 10
-        skipByTime = skipFrames >= 10
-        if skipFrames == 500:
-            doc = tag.GetDocument()
-            skipFrames = doc.GetFps()
-        if skipByTime:
-            skipFrames = 1.0 / float(skipFrames)
-
-        # Number of motion data frames to bake (including frames to be skipped)
-        numFrames = idxLastFrame - idxFirstFrame + 1
-
-        # Determine first and last frame index
-        if tag[ID_TAG_DATA_SET] != GetConnectedDataSetId():
-            idxFirstFrameTag = tag[ID_TAG_DATA_SET_FIRST_FRAME]
-            idxLastFrameTag = tag[ID_TAG_DATA_SET_LAST_FRAME]
-        else:
-            idxFirstFrameTag = 0
-            idxLastFrameTag = len(dataQueue) - 1
-
-        lenTagClip = idxLastFrameTag - idxFirstFrameTag + 1
-        idxFirstFrameEffective = idxFirstFrameTag + idxFirstFrame % lenTagClip
-        tsLast = dataQueue[idxFirstFrameEffective]['scene']['timestamp']
-        timeLast = timeStart
-        for idxFrame in range(numFrames):
-            # Calculate the effective frame index and get the motion data frame
-            idxFrameEffective = idxFirstFrameEffective + idxFrame % lenTagClip
-            data = dataQueue[idxFrameEffective]
-
-            c4d.StatusSetBar(int(100.0 * float(idxFrame) / float(numFrames)))
-
-            # Calculate time of new keyframe in C4D
-            if timing == 0: # Studio time
-                ts = dataQueue[idxFrameEffective]['scene']['timestamp']
-                tsDiff = ts - tsLast # Studio time since last motion data frame
-
-                # Care for timestamp wrap around.
-                # Happens, when Rokoko Studio is playing back a scene in a loop.
-                if tsDiff < 0.0:
-                    tsDiff = 1.0 / float(dataQueue[idxFrameEffective]['fps'])
-
-                # Optionally reduce keyframes by skipping motion data frames (here "keyframes per second")
-                if skipByTime and tsDiff < skipFrames and idxFrame != 0:
-                    continue
-
-                # C4D time for keyframe(s)
-                time = timeLast + c4d.BaseTime(tsDiff)
-
-                tsLast = ts
-                timeLast = time
-            else: # Timing "by frame"
-                # No clculations, keyframe time simply results from index
-                time = timeStart + c4d.BaseTime(idxFrame, fps)
-
-            # Optionally stop baking at the end of C4D's current project
-            if behaviorAtEnd == 1 and time > timeMax:
-                break
-
-            # Optionally reduce keyframes by skipping motion data frames (here "every nth frame")
-            if skipByIndex and (idxFrame % skipFrames) != 0:
-                continue
-
-            # Create keyframes depending on type of tag (roughly the equivalent to Execute() in tag)
-            if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
-                self.KeyframeActor(tag, tPose, data['scene'], curvesRot, curvesPos, time)
-            elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
-                self.KeyframeFace(tag, tPose, data['scene'], curvesRot, curvesPos, time)
-            elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_PROP:
-                self.KeyframeProp(tag, data['scene'], curvesRot, curvesPos, time)
-            else:
-                print('KEYFRAMES RIG TYPE MISSING', tag[ID_TAG_RIG_TYPE])
-
-            idxLastKey[0] = max(idxLastKey[0], idxFrame)
-
-
     # User pressed "Bake" button.
     # All involved tags will bake their assigned motion data into their host object(s).
+    # The actual baking is done in rokoko_bake (see BakeTags()), here only the parameters get collected.
     def CommandSetKeyframes(self, atCurrent=False, everyNth=1):
         # Get all needed parameters from the dialog
-        idConnected = GetConnectedDataSetId()
-        idxFirstFrame = self.GetInt32(ID_DLGSAVE_FIRST_FRAME)
-        idxLastFrame = self.GetInt32(ID_DLGSAVE_LAST_FRAME)
         createTake = self.GetBool(ID_DLGSAVE_CREATE_IN_TAKE)
         if not self._bakingOnly:
             nameDataSet = self.GetString(ID_DLGSAVE_NAME_DATASET)
         else:
             nameDataSet = GetDataSetFromId(self._tags[0][ID_TAG_DATA_SET])[ID_BC_DATASET_NAME]
-        behaviorAtEnd = self.GetInt32(ID_DLGSAVE_LENGTH)
-        autoForward = self.GetBool(ID_DLGSAVE_SET_KEYFRAMES_AUTOFORWARD)
-        includeDataSets = self.GetBool(ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS)
-
-        # Determine C4D document time of first frame to be baked.
-        doc = c4d.documents.GetActiveDocument()
-        fps = doc.GetFps()
-        if atCurrent:
-            timeStart = doc.GetTime()
-        else:
-            timeStart = c4d.BaseTime(0.0)
-
-        # Number of motion data frames to be baked
-        numDataFrames = idxLastFrame - idxFirstFrame + 1
-
-        # Determine time of last frame to be baked and optionally extend the project end time in C4D
-        timeMax = doc.GetMaxTime()
-        timeStudioMax = c4d.BaseTime(0.016667 * numDataFrames)
-        if behaviorAtEnd == 0 and (timeStart + timeStudioMax) > timeMax:
-            doc.SetMaxTime(timeStart + timeStudioMax)
-
-        # Prepare descIds for positions and rotations.
-        # Unfortunately the Takes system does seem to have issues with more complex data types,
-        # thus the vectors are handled component-wise.
-        descIdRot = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0))
-        descIdRotComponents = [None, None, None]
-        descIdRotComponents[0] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_X, c4d.DTYPE_REAL, 0))
-        descIdRotComponents[1] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Y, c4d.DTYPE_REAL, 0))
-        descIdRotComponents[2] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_ROTATION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Z, c4d.DTYPE_REAL, 0))
-        descIdPos = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0))
-        descIdPosComponents = [None, None, None]
-        descIdPosComponents[0] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_X, c4d.DTYPE_REAL, 0))
-        descIdPosComponents[1] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Y, c4d.DTYPE_REAL, 0))
-        descIdPosComponents[2] = c4d.DescID(c4d.DescLevel(c4d.ID_BASEOBJECT_REL_POSITION, c4d.DTYPE_VECTOR, 0), c4d.DescLevel(c4d.VECTOR_Z, c4d.DTYPE_REAL, 0))
-
-        # Try to display the progress in C4D's status bar.
-        # This currently works very unreliably (most times not at all).
-        # See: https://plugincafe.maxon.net/topic/12726/how-to-enforce-statusbar-redraws
-        c4d.StatusClear()
-        c4d.StatusSetText('Baking Rokoko Motion to Keyframes...')
-        c4d.StatusSetBar(0)
-
-        doc.StartUndo()
-
-        # Optionally create a new Take for the keyframes to be baked into
-        if createTake:
-            takeData = doc.GetTakeData()
-            if takeData is None:
-                print('ERROR: Failed to retrieve the take data.')
-                return
-            take = takeData.AddTake(nameDataSet, None, None)
-            if take is None:
-                print('ERROR: Failed to add a new take.')
-                return
-
-            doc.AddUndo(c4d.UNDOTYPE_NEW, take)
-
-            # Have Main Take active during baking (store current selection to be able to restore it later on)
-            takeOld = takeData.GetCurrentTake()
-            takeData.SetCurrentTake(takeData.GetMainTake())
-
-        # Have all actors in their original position (before any playback started)
-        g_thdListener.RestoreCurrentPositions()
-
-        # Iterate all tags in order to bake their motion data
-        idxLastKey = [0] # stores the time of the last created keyframe for auto forwarding afterwards
-        for tag in self._tags:
-            idDataSet = tag[ID_TAG_DATA_SET]
-            # Skip tags with invalid data or depending on user's options
-            if (not self._bakingOnly and not includeDataSets and idDataSet != idConnected) or not tag[ID_TAG_VALID_DATA]:
-                continue
-
-            # Motion data used by the tag
-            dataQueue = g_thdListener._dataQueues[idDataSet]
-
-            # Prepare T-Pose dictionaries
-            if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
-                tPose = self.PrepareTPosePerTag(tag)
-            elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
-                tPose = self.PrepareFacePosesPerTag(tag)
-            else:
-                tPose = None
-
-            if createTake:
-                # All curves and overrides needed during baking will be stored in these dictionaries
-                overridesRot = {}
-                curvesRot = {}
-                overridesPos = {}
-                curvesPos = {}
-
-                # Depending on type of tag prepare curves and overrides
-                if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
-                    for nameInStudio, (obj, mgTPose, nameObj, _) in tPose.items():
-                        self.PrepareCurvesInTake(takeData, take, obj, overridesRot, curvesRot, descIdRot, mgTPose)
-                        if nameInStudio == 'hip':
-                            self.PrepareCurvesInTake(takeData, take, obj, overridesPos, curvesPos, descIdPos, mgTPose)
-                elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
-                    obj = tag.GetObject()
-                    tagPoseMorph = obj.GetTag(c4d.Tposemorph)
-                    for nameInStudio, descIdMorph in tPose.items():
-                        self.PrepareMorphCurvesInTake(takeData, take, tagPoseMorph, overridesPos, curvesPos, descIdMorph, nameInStudio)
-                else:
-                    obj = tag.GetObject()
-                    self.PrepareCurvesInTake(takeData, take, obj, overridesRot, curvesRot, descIdRot, None)
-                    self.PrepareCurvesInTake(takeData, take, obj, overridesPos, curvesPos, descIdPos, None)
-
-                # Create actual keyframes
-                self.KeyframeTags(dataQueue, idxFirstFrame, idxLastFrame, tag, tPose, curvesRot, curvesPos, time, timeStart, timeMax, idxLastKey)
-
-                # Take overrides need to be updated (again depending on type of tag)
-                if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
-                    for nameInStudio, (obj, _, nameObj, _) in tPose.items():
-                        for idxComponent in range(3):
-                            overridesRot[nameObj][idxComponent].UpdateSceneNode(takeData, descIdRotComponents[idxComponent])
-                            if nameInStudio == 'hip':
-                                overridesPos[nameObj][idxComponent].UpdateSceneNode(takeData, descIdPosComponents[idxComponent])
-                elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
-                    for nameInStudio, descIdMorph in tPose.items():
-                        overridesPos[nameInStudio].UpdateSceneNode(takeData, descIdMorph)
-                else:
-                    obj = tag.GetObject()
-                    nameObj = obj.GetName()
-                    for idxComponent in range(3):
-                        overridesRot[nameObj][idxComponent].UpdateSceneNode(takeData, descIdRotComponents[idxComponent])
-                        overridesPos[nameObj][idxComponent].UpdateSceneNode(takeData, descIdPosComponents[idxComponent])
-            else:
-                # Create an undo for the host object (this includes all children in case of actor rigs)
-                # In the Take branch the Take system manages undo for us.
-                root = tag.GetObject()
-                doc.AddUndo(c4d.UNDOTYPE_CHANGE, root)
-
-                # All curves and overrides needed during baking will be stored in these dictionaries
-                curvesRot = {}
-                curvesPos = {}
-
-                # Depending on type of tag prepare curves and overrides
-                if tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR:
-                    for nameInStudio, (obj, _, nameObj, _) in tPose.items():
-                        self.PrepareCurves(obj, curvesRot, descIdRot)
-                        if nameInStudio == 'hip':
-                            self.PrepareCurves(obj, curvesPos, descIdPos)
-                elif tag[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR_FACE:
-                    tagPoseMorph = root.GetTag(c4d.Tposemorph)
-                    for nameInStudio, descIdMorph in tPose.items():
-                        self.PrepareMorphCurves(tagPoseMorph, curvesPos, descIdMorph, nameInStudio)
-                else:
-                    self.PrepareCurves(root, curvesRot, descIdRot)
-                    self.PrepareCurves(root, curvesPos, descIdPos)
-
-                # Create actual keyframes
-                self.KeyframeTags(dataQueue, idxFirstFrame, idxLastFrame, tag, tPose, curvesRot, curvesPos, time, timeStart, timeMax, idxLastKey)
-
-        # If a new Take was created, optionally select the new one
-        if createTake:
-            if self.GetBool(ID_DLGSAVE_ACTIVATE_NEW_TAKE):
-                takeData.SetCurrentTake(take)
-            else:
-                takeData.SetCurrentTake(takeOld) # restore previous Take selection
-
-        # Optionally forward document time ("one motion data frame" after the last created keyframe)
-        if autoForward:
-            doc.SetTime(timeStart + c4d.BaseTime(0.016667 * (idxLastKey[0] + 1)))
-
-        doc.EndUndo()
-
-        # Restore states of all involved objects
-        g_thdListener.RestoreCurrentPositions()
-        c4d.EventAdd()
-
-        # Reset C4D's status bar
-        c4d.StatusClear()
+        reduceKeyframes = self.GetBool(ID_DLGSAVE_REDUCE_KEYFRAMES)
+        tolerance = 0.0
+        if reduceKeyframes:
+            tolerance = self.GetFloat(ID_DLGSAVE_REDUCE_TOLERANCE)
+
+        stats = BakeTags(self._tags,
+                         idxFirstFrame=self.GetInt32(ID_DLGSAVE_FIRST_FRAME),
+                         idxLastFrame=self.GetInt32(ID_DLGSAVE_LAST_FRAME),
+                         timing=self.GetInt32(ID_DLGSAVE_TIMING),
+                         skipFrames=self.GetInt32(ID_DLGSAVE_FRAME_SKIP),
+                         length=self.GetInt32(ID_DLGSAVE_LENGTH),
+                         createTake=createTake,
+                         nameTake=nameDataSet,
+                         activateTake=self.GetBool(ID_DLGSAVE_ACTIVATE_NEW_TAKE),
+                         wipe=self.GetBool(ID_DLGSAVE_WIPE_EXISTING_ANIMATION),
+                         includeDataSets=self._bakingOnly or self.GetBool(ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS),
+                         atCurrent=atCurrent,
+                         autoForward=self.GetBool(ID_DLGSAVE_SET_KEYFRAMES_AUTOFORWARD),
+                         tolerance=tolerance)
+        if stats is None:
+            return
 
         # Do no longer show a warning, if dialog gets closed and thus recording gets discarded
         self._clipStored = True
 
         # Success requester
+        reportKeys = ''
+        if reduceKeyframes and stats['keysTotal'] > 0:
+            numKeysSaved = stats['keysTotal'] - stats['keysWritten']
+            reportKeys = '\n{0} of {1} keyframes written, {2} ({3:.1f}%) saved by reduction.'.format(stats['keysWritten'], stats['keysTotal'], numKeysSaved, 100.0 * numKeysSaved / stats['keysTotal'])
         if createTake:
-            c4d.gui.MessageDialog('Successfully baked keyframes in Take "{0}".'.format(nameDataSet))
+            c4d.gui.MessageDialog('Successfully baked keyframes in Take "{0}".{1}'.format(nameDataSet, reportKeys))
         else:
-            c4d.gui.MessageDialog('Successfully baked keyframes in current Take.')
+            c4d.gui.MessageDialog('Successfully baked keyframes in current Take.{0}'.format(reportKeys))
 
 
     # User pressed "Store Clip" button.
@@ -1102,6 +491,7 @@ class DialogSaveRecording(c4d.gui.GeDialog):
             # Optionally assign the new clip to the tag
             if self.GetBool(ID_DLGSAVE_USE_NEW_DATASET) and tag[ID_TAG_DATA_SET] == idConnected:
                 tag[ID_TAG_DATA_SET] = idDataSetNew
+                g_thdListener.UpdateTagConsumer(tag.GetNodeData(), tag)
 
         c4d.EventAdd()
 
@@ -1147,6 +537,11 @@ class DialogSaveRecording(c4d.gui.GeDialog):
         elif id == ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS:
             SetPref(id, self.GetBool(id))
             self.UpdateSliders()
+        elif id == ID_DLGSAVE_REDUCE_KEYFRAMES:
+            SetPref(id, self.GetBool(id))
+            self.Enable(ID_DLGSAVE_REDUCE_TOLERANCE, self.GetBool(ID_DLGSAVE_REDUCE_KEYFRAMES))
+        elif id == ID_DLGSAVE_REDUCE_TOLERANCE:
+            SetPref(id, self.GetFloat(id))
 
         # Bake buttons
         elif id == ID_DLGSAVE_SET_KEYFRAMES_AT_CURRENT:
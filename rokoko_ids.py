@@ -28,6 +28,8 @@ CM_SUBID_MANAGER_UPDATE_TAG_PARAMS                 = 2
 CM_SUBID_MANAGER_OPEN_PLAYER                       = 3
 CM_SUBID_MANAGER_PLAYBACK_STATUS_CHANGE            = 4
 CM_SUBID_MANAGER_BUFFER_PULSE                      = 5
+CM_SUBID_MANAGER_CLIP_IMPORT_PROGRESS              = 6
+CM_SUBID_MANAGER_TELEMETRY_UPDATE                  = 7
 PLUGIN_ID_COREMESSAGE_MANAGER_CURRENT_FRAME_NUMBER = 1056101
 PLUGIN_ID_COREMESSAGE_CONNECTION                   = 1056102
 CM_SUBID_CONNECTION_CONNECT                        = 1
@@ -64,6 +66,12 @@ RIG_TYPE_PROP             = 0x0010
 
 ID_PREF_PLUGIN_ENABLED = 1
 ID_PREF_UDP_SIZE_NO_WARNING = 2
+ID_PREF_LIVE_BUFFER_SIZE = 3 # number of live frames kept in RAM
+ID_PREF_LIVE_BUFFER_SPILL = 4 # older live frames get spilled to disk instead of being dropped
+
+LIVE_QUEUE_CAPACITY_DEFAULT = 36000 # ten minutes at 60 fps
+
+PLAYBACK_RATE_AUTO = 0 # value of ID_DLGMNGR_PLAYER_PLAYBACK_SPEED: every frame gets dispatched, viewport draws are paced
 
 ID_PROJECT_SCALE = 900000
 ID_BC_CONNECTIONS = 1000000
@@ -100,7 +108,7 @@ ID_TAG_ACTOR_MAP_BODY = 2033
 ID_TAG_ACTOR_MAP_HAND_LEFT = 2034
 ID_TAG_ACTOR_MAP_HAND_RIGHT = 2035
 ID_TAG_ACTOR_TPOSE_STORED = 2036
-ID_TAG_IDX_READ_FRAME = 2037
+ID_TAG_IDX_READ_FRAME = 2037 # no longer used (frames are handed to tags via rokoko_tag_queue.FrameSnapshot)
 ID_TAG_OPEN_MANAGER_ON_PLAY = 2038
 ID_TAG_BUTTON_GUESS_FACE_POSES = 2039
 ID_TAG_ACTOR_RIG_DETECTED = 2040
@@ -187,6 +195,7 @@ ID_DLGMNGR_CONNECTION_NAMES_PROPS = 2055
 ID_DLGMNGR_CONNECTIONS_IN_MENU = 2019
 ID_DLGMNGR_CONNECTION_STATUS_IN_MENU = 2020
 ID_DLGMNGR_CONNECTION_FPS = 2057
+ID_DLGMNGR_CONNECTION_TELEMETRY = 2058
 
 ID_DLGMNGR_PLAYER_START_STOP = 2001
 ID_DLGMNGR_PLAYER_TAG_SELECTION = 2023
@@ -244,6 +253,8 @@ ID_DLGSAVE_ACTIVATE_NEW_TAKE = 6015
 ID_DLGSAVE_SET_KEYFRAMES_AUTOFORWARD = 6016
 ID_DLGSAVE_WIPE_EXISTING_ANIMATION = 6017
 ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS = 6018
+ID_DLGSAVE_REDUCE_KEYFRAMES = 6019
+ID_DLGSAVE_REDUCE_TOLERANCE = 6020
 
 
 ID_DLGEDITCONN_NAME = 7000
@@ -290,6 +301,7 @@ ID_SUBMENU_TAG_SHOW_TAG = c4d.FIRST_POPUP_ID + 1
 ID_SUBMENU_TAG_SHOW_OBJECT = c4d.FIRST_POPUP_ID + 2
 ID_SUBMENU_TAG_DELETE = c4d.FIRST_POPUP_ID + 3
 ID_SUBMENU_TAG_TPOSE = c4d.FIRST_POPUP_ID + 4
+ID_SUBMENU_TAG_APPLY_RIG = c4d.FIRST_POPUP_ID + 5
 
 
 MR_Y180 = c4d.Matrix(c4d.Vector(0.0), c4d.Vector(-1.0, 0.0, 0.0), c4d.Vector(0.0, 1.0, 0.0), c4d.Vector(0.0, 0.0, -1.0))
@@ -317,6 +329,7 @@ ID_BC_DATASET_NUM_LIGHTS = 33
 ID_BC_DATASET_NUM_CAMERAS = 34
 ID_BC_DATASET_NUM_PROPS = 35
 ID_BC_DATASET_NUM_ACTORS = 36
+ID_BC_DATASET_NUM_FRAMES = 37
 
 ID_BC_DATASET_ACTORS = 40
 ID_BC_DATASET_LIGHTS = 42
@@ -12,7 +12,7 @@
 # If no connection to Rokoko Studio exists, a slightly simpler thread is used, which provides
 # the "clock" for playback (instead of the Studio stream being used for this purpose) and
 # dispatches the frames from the Clip queues to all involved tags.
-import os, socket, json, time
+import os, re, math, socket, json, time
 from threading import Condition
 import c4d
 # Import lz4 module for the correct platform
@@ -29,10 +29,24 @@ from rokoko_ids import *
 from rokoko_rig_tables import *
 from rokoko_utils import *
 from rokoko_tag_queue import *
+from rokoko_clip import *
+from rokoko_live_queue import *
+from rokoko_receiver import *
+from rokoko_telemetry import *
+from rokoko_player_clock import *
+from rokoko_live_draw import *
 
 # There is one single global listener thread in Rokoko Studio Live.
 g_thdListener = None
 
+# Matches all values relevant for data change detection (see DetectDataChange()) in a JSON encoded frame:
+# names, colors and meta data of actors and props.
+REGEX_SCENE_SIGNATURE = re.compile(r'"(?:name|color|meta)"\s*:\s*(?:"(?:[^"\\]|\\.)*"|\[[^\]]*\]|\{[^}]*\})')
+
+# Returns the scene signature of a JSON encoded frame (see GetSceneSignature()).
+def GetTextSignature(text):
+    return ''.join(REGEX_SCENE_SIGNATURE.findall(text))
+
 # Other modules may gain access to the global listener thread.
 def GetListenerThread():
     return g_thdListener
@@ -49,6 +63,11 @@ def DestroyListenerThread():
 
 class ThreadListener(c4d.threading.C4DThread):
     _sock = None # socket used for connection to Rokoko Studio
+    _receiver = None # receive and decode stages of a live connection (see rokoko_receiver)
+    _telemetry = None # statistics of the live connection (see rokoko_telemetry)
+    _timeRecvDraw = None # time of reception of the frame, whose live draw event is pending (for latency measurement)
+    _playerClock = None # time base of the offline player (see rokoko_player_clock)
+    _liveDraw = LiveDrawScheduler() # coalesces and paces viewport draw requests (see rokoko_live_draw)
 
     # Connection states
     _statusConnection = 0 # 0: Not connected, 1: Connected Ok, 2: Connected No Data
@@ -74,6 +93,9 @@ class ThreadListener(c4d.threading.C4DThread):
 
     # Tag consumers
     _tags = [] # list of tags involved in playback (tags that "want" to receive data)
+    _consumers = ({}, frozenset()) # tuple (group per TagData of all tags in _tags, set of all groups), see rokoko_tag_queue
+                                    # replaced as a whole, whenever _tags or a group of a tag changes
+    _frameSnapshot = None # frame published to the tags by the last dispatch (see rokoko_tag_queue)
     _lockTagQueues = Condition() # serializes access to the list of tag consumers
     # _lockTagQueues really only protects the integrity of the list, _not_ its content (referenced tags).
     # We have to live with the fact, tags may "die" or get lost anytime. There is nothing
@@ -82,6 +104,8 @@ class ThreadListener(c4d.threading.C4DThread):
 
     # Data detection
     _dataExample = None
+    _signatureExample = None # scene signature of the frame last fully decoded (see GetSceneSignature())
+    _layoutLive = None # layout of the live frames of the current scene (see LiveFrameLayout in rokoko_clip)
 
     # Backup/restore state
     _timeStored = None
@@ -255,6 +279,7 @@ class ThreadListener(c4d.threading.C4DThread):
     def AddTagConsumer(self, tagData, tag):
         self._lockTagQueues.acquire()
         self._tags.append((tagData, tag))
+        self.UpdateConsumers()
         self._lockTagQueues.release()
 
 
@@ -266,6 +291,7 @@ class ThreadListener(c4d.threading.C4DThread):
             self._lockTagQueues.release()
             return
         self._tags.remove((tagData, tag))
+        self.UpdateConsumers()
         self._lockTagQueues.release()
 
 
@@ -273,6 +299,42 @@ class ThreadListener(c4d.threading.C4DThread):
     def RemoveAllTagConsumers(self):
         self._lockTagQueues.acquire()
         self._tags.clear()
+        self.UpdateConsumers()
+        self._lockTagQueues.release()
+
+
+    # Returns the group a consumer tag gets dispatched frames for: (data set ID, first frame, last frame).
+    # Returns None, if the tag has no valid data.
+    def GetConsumerGroup(self, tag):
+        if not tag.IsAlive() or not tag[ID_TAG_VALID_DATA]:
+            return None
+        idDataSet = tag[ID_TAG_DATA_SET]
+        if idDataSet == 0:
+            return None
+        return (idDataSet, tag[ID_TAG_DATA_SET_FIRST_FRAME], tag[ID_TAG_DATA_SET_LAST_FRAME])
+
+
+    # Publishes the groups of consumers referenced by frame snapshots (_lockTagQueues needs to be held).
+    def PublishConsumers(self, groupsByConsumer):
+        groups = frozenset(group for group in groupsByConsumer.values() if group is not None)
+        self._consumers = (groupsByConsumer, groups)
+
+
+    # Rebuilds the groups of all consumers (_lockTagQueues needs to be held).
+    def UpdateConsumers(self):
+        self.PublishConsumers({ tagData : self.GetConsumerGroup(tag) for tagData, tag in self._tags })
+
+
+    # Re-reads the group of a single consumer tag.
+    # To be called, whenever data set, clip range or validity of data of a tag changed.
+    # Tags, which are no consumers, are ignored.
+    def UpdateTagConsumer(self, tagData, tag):
+        self._lockTagQueues.acquire()
+        groupsByConsumer = self._consumers[0]
+        if tagData in groupsByConsumer:
+            groupsByConsumer = groupsByConsumer.copy() # published dictionary is never changed
+            groupsByConsumer[tagData] = self.GetConsumerGroup(tag)
+            self.PublishConsumers(groupsByConsumer)
         self._lockTagQueues.release()
 
 
@@ -288,20 +350,17 @@ class ThreadListener(c4d.threading.C4DThread):
         return tagConsumers
 
 
-    # Flushes the inbound tag queues of each registered consumer tag.
+    # Flushes the frame dispatched to the consumer tags.
     # Since there are no real inbound queues in the tags anymore,
-    # this will only remove the last dispatched frame index from the tag.
+    # this will only withdraw the last published frame snapshot.
     def FlushTagConsumers(self):
-        queuesToFlush = []
+        self._frameSnapshot = None
 
-        self._lockTagQueues.acquire()
-        queuesToFlush = self._tags.copy()
-        self._lockTagQueues.release()
 
-        for tagData, tag in queuesToFlush:
-            if not tag.IsAlive():
-                continue
-            tagData._queueReceive.Flush(tag)
+    # Returns the frame snapshot published by the last dispatch (see rokoko_tag_queue) or None.
+    # Called by tags during execution, no locking involved.
+    def GetFrameSnapshot(self):
+        return self._frameSnapshot
 
 
     # In order to resume live playback after user had paused the Player,
@@ -319,6 +378,7 @@ class ThreadListener(c4d.threading.C4DThread):
         self._frameNumberReceive = 0
         self._frameNumberDispatch = 0
         self._lockFrameCounter.release()
+        self._liveDraw.Reset()
 
 
     # Connect to the currently selected live connection
@@ -346,9 +406,19 @@ class ThreadListener(c4d.threading.C4DThread):
         # Initialize frame counters
         self.ResetFrameCounters()
 
-        # Create a data queue for this live connection
+        # Start new statistics for this connection
+        self._telemetry = LiveTelemetry()
+        self._timeRecvDraw = None
+
+        # Create a data queue for this live connection (bounded according to preferences, see rokoko_live_queue)
+        capacity = GetPref(ID_PREF_LIVE_BUFFER_SIZE)
+        if capacity is None:
+            capacity = LIVE_QUEUE_CAPACITY_DEFAULT
+        spill = GetPref(ID_PREF_LIVE_BUFFER_SPILL)
+        if spill is None:
+            spill = True
         self._lockDataQueues.acquire()
-        self._dataQueues[idConnected] = []
+        self._dataQueues[idConnected] = LiveQueue(capacity, spill)
         self._liveQueue = self._dataQueues[idConnected]
         self._lockDataQueues.release()
 
@@ -364,7 +434,7 @@ class ThreadListener(c4d.threading.C4DThread):
         data = None
         self._lockDataQueues.acquire()
         if len(self._liveQueue) > 0:
-            data = self._liveQueue.pop(-1)
+            data = self._liveQueue[-1]
         self._liveQueue.clear() # throw test frame away
         self._lockDataQueues.release()
 
@@ -374,16 +444,22 @@ class ThreadListener(c4d.threading.C4DThread):
         # Store as example frame for data change detection (if any)
         self._dataExample = None
         if data is not None:
-            self._dataExample = data['scene']
-            StoreAvailableEntitiesInConnectedDataSet(self._dataExample, float(data['fps']))
+            self._dataExample = data.GetData()['scene']
+            StoreAvailableEntitiesInConnectedDataSet(self._dataExample, data.GetFps())
 
         # Announce connection status and live data change
         c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_STATUS_CHANGE)
         c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_LIVE_DATA_CHANGE)
 
-        self._sock.settimeout(1.0) # set the timeout used during this connection
+        # Receive stage only uses the timeout to check for being stopped,
+        # stream timeouts are detected by the dispatch stage (see MainConnected())
+        self._sock.settimeout(0.2)
 
-        # Use the correct main function and start the listener thread
+        # Start receive and decode stages
+        self._receiver = LiveReceiver(self._sock, self.DecodeStage)
+        self._receiver.Start()
+
+        # Use the correct main function and start the listener thread (dispatch stage)
         self._funcMain = self.MainConnected
         self.Start()
 
@@ -399,6 +475,7 @@ class ThreadListener(c4d.threading.C4DThread):
 
         # Initialize frame counters
         self.ResetFrameCounters()
+        self._playerClock = PlayerClock()
 
         self._dataExample = None # there is no data change detection without live connection
 
@@ -433,6 +510,8 @@ class ThreadListener(c4d.threading.C4DThread):
         self._lockDataQueues.acquire()
         if idConnected in self._dataQueues:
             self._dataQueues.pop(idConnected)
+        if self._liveQueue is not None:
+            self._liveQueue.Close()
         self._liveQueue = None
         self._lockDataQueues.release()
 
@@ -446,6 +525,11 @@ class ThreadListener(c4d.threading.C4DThread):
             self._sock = None
         self._lockConnect.release()
 
+        # Stop receive and decode stages (the closed socket wakes the receive stage)
+        if self._receiver is not None:
+            self._receiver.Stop()
+            self._receiver = None
+
         self._dataExample = None
 
         # Wait for the listener thread to exit (but allow C4D events to wake us)
@@ -483,7 +567,7 @@ class ThreadListener(c4d.threading.C4DThread):
                     continue
 
                 # Queue is in use, queue contributes to maximum queue length
-                self._maxFramesInDataSets = max(self._maxFramesInDataSets, len(self._dataQueues[idInQueue]))
+                self._maxFramesInDataSets = max(self._maxFramesInDataSets, self.GetQueueLengthInPlayerFrames(self._dataQueues[idInQueue]))
                 found = True
                 break
 
@@ -502,13 +586,15 @@ class ThreadListener(c4d.threading.C4DThread):
     def DiscardDataQueues(self):
         self._lockDataQueues.acquire()
         self._dataQueues.clear()
+        if self._liveQueue is not None:
+            self._liveQueue.Close()
         self._liveQueue = None
         self._lockDataQueues.release()
 
 
     # Register a data set (clip).
     # Done by tags to "connect" to motion data from a file source.
-    # The file is read and stored in a data queue.
+    # The file is read and stored in a data queue (in columnar form, see rokoko_clip).
     # If the same file has already been registered before by another tag,
     # simply nothing happes. There is always only one data queue per file,
     # which is then used for an arbitrary number of consumer tags.
@@ -535,8 +621,8 @@ class ThreadListener(c4d.threading.C4DThread):
             filename = filename.replace('\\', os.sep)
             filename = os.path.join(pathDoc, filename)
 
-        # Read the motion data from file
-        data = ReadDataSet(filename)
+        # Read the motion data from file (or its binary cache, see rokoko_clip)
+        data = ReadClip(filename)
         if data is None:
             print('ERROR: Clip file not found {0}.'.format(filename))
             return
@@ -625,6 +711,8 @@ class ThreadListener(c4d.threading.C4DThread):
         self.FlushBuffers()
         self.FlushTagConsumers()
         self.ResetFrameCounters()
+        if self._telemetry is not None:
+            self._telemetry.Reset()
         self._receive = True
 
 
@@ -653,7 +741,11 @@ class ThreadListener(c4d.threading.C4DThread):
 
 
     # Decode a received UDP frame
-    def DecodeReceivedFrame(self, udpData):
+    # Returned is a tuple (LiveFrame, scene signature of the frame), (None, None) on errors.
+    # The frame gets decoded completely (and gets a new LiveFrameLayout), if there is no layout or
+    # its scene signature differs from signatureKnown. Otherwise it decodes its subtrees only when
+    # accessed (see LiveFrame in rokoko_clip).
+    def DecodeReceivedFrame(self, udpData, layout=None, signatureKnown=None):
         global g_streamWarnOnce
 
         # Decompress the frame
@@ -667,13 +759,19 @@ class ThreadListener(c4d.threading.C4DThread):
 
                 # Ask listener thread to disconnect
                 c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_DISCONNECT)
-                return None
+                return None, None
         else:
-            studioData = udpData
+            studioData = bytes(udpData)
 
-        # Decode JSON data
+        # Decode JSON data (completely only on scene changes, otherwise on access)
         try:
-            data = json.loads(studioData)
+            text = studioData.decode('utf-8')
+            signature = GetTextSignature(text)
+            data = None
+            if layout is None or signature != signatureKnown:
+                data = json.loads(text)
+                layout = LiveFrameLayout(data)
+            frame = LiveFrame(text, layout, data)
         except:
             message = 'It looks like, we are receiving a compressed stream from Rokoko Studio,\n'
             message += 'which is currently not supported on your system.\n'
@@ -682,13 +780,47 @@ class ThreadListener(c4d.threading.C4DThread):
 
             # Ask listener thread to disconnect
             c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_DISCONNECT)
-            return None
+            return None, None
 
-        return data
+        return frame, signature
 
 
-    # Wait for and receive a motion data frame from the live connection.
+    # Announces the loss of the live stream (once per loss).
     _flagTimeOut = False # True if timeout has occurred.
+    def StreamTimeout(self):
+        if self._flagTimeOut:
+            return
+        ConnectedDataSetStreamLost()
+        self._dataExample = None
+        self._layoutLive = None
+        c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_LIVE_DATA_CHANGE)
+        self._flagTimeOut = True
+
+
+    # Buffer a decoded frame (append to end of live data queue).
+    def BufferFrame(self, data):
+        self._lockDataQueues.acquire()
+        if self._liveQueue is None:
+            self._lockDataQueues.release()
+            return # live data queue got destroyed by Disconnect() in the meantime
+        self._liveQueue.append(data)
+        self._lockDataQueues.release()
+
+        # Increment receive counter
+        self._lockFrameCounter.acquire()
+        self._frameNumberReceive += 1
+        self._lockFrameCounter.release()
+
+        # Every once in a while emit a buffer pulse
+        # Just so the user sees some movement in the "buffering" sliders, even if user paused playback.
+        self._cntBufferPulse = (self._cntBufferPulse + 1) % 15
+        if self._cntBufferPulse == 0:
+            c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_BUFFER_PULSE)
+
+
+    # Wait for and receive a motion data frame from the live connection.
+    # Only used to test a new connection, during the connection frames get received by
+    # the live receiver (see rokoko_receiver).
     def ReceiveFrame(self, force=False):
         if self._sock is None:
             return False, False # error
@@ -699,59 +831,172 @@ class ThreadListener(c4d.threading.C4DThread):
             self._flagTimeOut = False
         except socket.timeout:
             # In case of timeout announce change of live data, once
-            if not self._flagTimeOut:
-                ConnectedDataSetStreamLost()
-                self._dataExample = None
-                c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_LIVE_DATA_CHANGE)
-                self._flagTimeOut = True
+            self.StreamTimeout()
             return True, False # success, no new data
         except:
             return False, False # error
 
+        result, data = self.DecodeStage(udpData, force)
+        if not result:
+            return False, False # success, no new data
+        if data is not None:
+            self.BufferFrame(data)
+        return True, True  # success, new data
+
+
+    # Decode stage of the live receiver (see rokoko_receiver), called for every received datagram.
+    # Returns a tuple (success, frame) with frame being None, if the datagram does not need to be buffered.
+    # Received frames are not decoded as a whole, tags decode the subtrees they consume (see LiveFrame in rokoko_clip).
+    # Only if the scene signature changes, a frame gets decoded completely, in order to detect the
+    # data change and to derive the layout of the scene's frames.
+    def DecodeStage(self, udpData, force=False):
         # If reception is enabled (player started)...
         if force or self._receive:
-            data = self.DecodeReceivedFrame(udpData)
-            if data is None:
-                return False, False # success, no new data
+            timeStart = time.perf_counter()
+            signatureKnown = self._signatureExample if self._dataExample is not None else None
+            frame, signature = self.DecodeReceivedFrame(udpData, self._layoutLive, signatureKnown)
+            if frame is None:
+                return False, None
+            if frame.GetLayout() is not self._layoutLive:
+                # Scene changed (or no example, yet), check if data has changed
+                self._layoutLive = frame.GetLayout()
+                self._signatureExample = signature
+                self.DetectDataChange(frame.GetData()['scene'], frame.GetFps())
+            self._telemetry.AddDecodeTime(time.perf_counter() - timeStart)
+            self._telemetry.AddTimestamp(frame.GetTimestamp(), frame.GetFps())
+            return True, frame
+
+        # In case reception is disabled (player not started),
+        # we check every 60th frame for data changes.
+        # Frame gets only decoded, if its scene signature differs from the last one.
+        self._cntDetect = (self._cntDetect + 1) % 60
+        if self._cntDetect == 0:
+            signature = self.GetSceneSignature(udpData)
+            if signature is not None and signature == self._signatureExample and self._dataExample is not None:
+                return True, None # no change
+            frame, signature = self.DecodeReceivedFrame(udpData)
+            if frame is None:
+                return False, None
+            self.DetectDataChange(frame.GetData()['scene'], frame.GetFps())
+            self._signatureExample = signature
+        return True, None
+
+
+    # Returns the scene signature of a received datagram.
+    # The signature consists of all names, colors and meta data contained in the frame, extracted
+    # from the JSON text without decoding it. Thus it changes with every change DetectDataChange()
+    # would detect, but is much cheaper to get.
+    # Returns None, if the datagram could not be decompressed.
+    def GetSceneSignature(self, udpData):
+        if __USE_LZ4__:
+            try:
+                studioData = lz4f.decompress(udpData, return_bytearray=True, return_bytes_read=False)
+            except:
+                return None
+        else:
+            studioData = bytes(udpData)
+        return GetTextSignature(studioData.decode('utf-8', errors='replace'))
 
-            # Check if data has changed
-            self.DetectDataChange(data['scene'], float(data['fps']))
 
-            # Buffer the data (append to end of live data queue)
-            self._lockDataQueues.acquire()
-            self._liveQueue.append(data)
-            self._lockDataQueues.release()
+    # Returns statistics of the live connection (see rokoko_telemetry),
+    # including drop and backlog counters of the live receiver (see LiveReceiver.GetStats()).
+    # Returns None, if there has been no live connection.
+    def GetTelemetry(self):
+        telemetry = self._telemetry
+        if telemetry is None:
+            return None
+        stats = telemetry.GetStats()
+        statsReceiver = self.GetReceiverStats()
+        if statsReceiver is not None:
+            stats.update(statsReceiver)
+        return stats
+
+
+    # Called by the main thread before a live draw event gets handled (see rokoko_message_data).
+    def LiveDrawStarted(self):
+        self._liveDraw.DrawStarted()
+
+
+    # Called by the main thread after a live draw event got handled (see rokoko_message_data),
+    # in order to measure the duration of the draw and
+    # the latency between reception of a frame and the viewport update.
+    def LiveDrawHandled(self):
+        durationDraw = self._liveDraw.DrawFinished()
+        if self._telemetry is not None:
+            self._telemetry.AddDrawTime(durationDraw)
+        timeRecv = self._timeRecvDraw
+        telemetry = self._telemetry
+        if timeRecv is None or telemetry is None:
+            return
+        self._timeRecvDraw = None # several dispatches may share a single draw, count only once
+        telemetry.AddLatency(time.perf_counter() - timeRecv)
+
+
+    # Returns the playback rate set by the user (the player dispatches only every nth frame).
+    # With playback rate "Auto" every frame gets dispatched, viewport draws get paced instead (see rokoko_live_draw).
+    def GetPlaybackRate(self):
+        playbackRate = GetPref(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED)
+        if playbackRate is None:
+            return 2
+        if playbackRate == PLAYBACK_RATE_AUTO:
+            return 1
+        return playbackRate
+
+
+    # Returns statistics of the offline player's clock (see rokoko_player_clock).
+    # Returns None, if there is a live connection.
+    def GetPlayerClockStats(self):
+        playerClock = self._playerClock
+        if playerClock is None or self._funcMain != self.MainNotConnected:
+            return None
+        return playerClock.GetStats()
 
-            # Increment receive counter
-            self._lockFrameCounter.acquire()
-            self._frameNumberReceive += 1
-            self._lockFrameCounter.release()
 
-            # Every once in a while emit a buffer pulse
-            # Just so the user sees some movement in the "buffering" sliders, even if user paused playback.
-            self._cntBufferPulse = (self._cntBufferPulse + 1) % 15
-            if self._cntBufferPulse == 0:
-                c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_BUFFER_PULSE)
-        else:
-            # In case reception is disabled (player not started),
-            # we decode every 60th frame to check for data changes
-            self._cntDetect = (self._cntDetect + 1) % 60
-            if self._cntDetect == 0:
-                data = self.DecodeReceivedFrame(udpData)
-                if data is None:
-                    return False, False # success, no new data
-                self.DetectDataChange(data['scene'], float(data['fps']))
-        return True, True  # success, new data
+    # Returns the frame rate of a data queue.
+    # Returns None for the live queue, live frames are dispatched as they are received.
+    def GetQueueFps(self, queue):
+        if not isinstance(queue, ClipData) or len(queue) <= 0:
+            return None
+        fps = queue.GetFps(0)
+        if fps <= 0.0:
+            return None
+        return fps
+
+
+    # Converts a player frame (dispatch counter) into a frame number of a data queue.
+    # Clips with a frame rate other than the player's time base (PLAYER_FPS) advance at their own pace.
+    def PlayerFrameToQueueFrame(self, queue, frame):
+        fps = self.GetQueueFps(queue)
+        if fps is None:
+            return frame
+        return int(frame * fps / PLAYER_FPS)
+
+
+    # Returns the length of a data queue in player frames (e.g. for the scrub bar).
+    def GetQueueLengthInPlayerFrames(self, queue):
+        fps = self.GetQueueFps(queue)
+        if fps is None:
+            return len(queue)
+        return int(math.ceil(len(queue) * PLAYER_FPS / fps))
+
+
+    # Returns drop and backlog counters of the live receiver (see LiveReceiver.GetStats()).
+    # Returns None, if there is no live connection.
+    def GetReceiverStats(self):
+        receiver = self._receiver
+        if receiver is None:
+            return None
+        return receiver.GetStats()
 
 
     # Get a frame from a data queue by index.
-    # Tags read the motion data frame during Execute() with
-    # the index they received during dispatch.
+    # Tags do not use this during Execute(), they read their frame from the published frame snapshot.
+    # Returned is a frame object (ClipFrame, LiveFrame or DictFrame, see rokoko_clip).
     def GetFrame(self, idDataSet, idxFrame):
         frame = None
         self._lockDataQueues.acquire()
         if idDataSet in self._dataQueues:
-            frame = self._dataQueues[idDataSet][idxFrame]['scene']
+            frame = GetFrameFromQueue(self._dataQueues[idDataSet], idxFrame)
         self._lockDataQueues.release()
         return frame
 
@@ -765,46 +1010,46 @@ class ThreadListener(c4d.threading.C4DThread):
             self._frameNumberDispatch = idx
             self._lockFrameCounter.release()
 
-        # Determine frame index to dispatch per data queue.
-        # Queues wrap around if playing past their end.
-        frameIndeces = {} # Dictionary stores data queue specific frame indeces
-        self._lockDataQueues.acquire()
-        for idDataSet, queue in self._dataQueues.items():
-            if len(queue) <= 0:
-                continue
-            idxQueue = self._frameNumberDispatch % len(queue)
-            frameIndeces[idDataSet] = idxQueue
-        self._lockDataQueues.release()
-
-        # Get a list of all involved tags (tags to dispatch frames to)
-        self._lockTagQueues.acquire()
-        queuesToAdd = self._tags.copy()
-        self._lockTagQueues.release()
-
-        # Dispatch frames to tags
+        # Determine frame index to dispatch per group of consumer tags (see rokoko_tag_queue).
+        # Clips advance according to their frame rate, queues wrap around if playing past their end.
+        # With clips the user may have further reduced the size of the clip in the tag.
+        # The copy of the dictionary is atomic, so no lock is needed, queues only ever grow.
+        groupsByConsumer, groups = self._consumers
+        frameNumberDispatch = self._frameNumberDispatch
         idConnected = GetConnectedDataSetId()
-        for tagData, tag in queuesToAdd:
-            if not tag.IsAlive() or not tag[ID_TAG_VALID_DATA]:
+        dataQueues = dict(self._dataQueues)
+        frameNumbers = {} # Dictionary stores data queue specific frame numbers
+        frameIndeces = {} # Dictionary stores group specific frame indeces
+        queues = {}
+        for group in groups:
+            idDataSet, idxFirstFrame, idxLastFrame = group
+            queue = dataQueues.get(idDataSet)
+            if queue is None or len(queue) <= 0: # only dispatch from valid data queues
                 continue
+            frameNumber = frameNumbers.get(idDataSet)
+            if frameNumber is None:
+                frameNumber = self.PlayerFrameToQueueFrame(queue, frameNumberDispatch)
+                frameNumbers[idDataSet] = frameNumber
+                queues[idDataSet] = queue
+            if idDataSet == idConnected: # live data is never trimmed
+                frameIndeces[group] = frameNumber % len(queue)
+            else:
+                frameIndeces[group] = idxFirstFrame + frameNumber % (idxLastFrame - idxFirstFrame)
 
-            idDataSet = tag[ID_TAG_DATA_SET]
-            if idDataSet == 0: # only dispatch from valid data queues
-                continue
+        # Dispatch the frame to all consumer tags at once (simply replacing the published snapshot)
+        self._frameSnapshot = FrameSnapshot(frameIndeces, queues, groupsByConsumer)
 
-            # Determine frame index to dispatch
-            idxFrame = frameIndeces[idDataSet]
-            if tag[ID_TAG_DATA_SET] != idConnected:
-                # With clips the user may have set further reduced the size of the clip in the tag
-                idxFirstFrame = tag[ID_TAG_DATA_SET_FIRST_FRAME]
-                idxLastFrame = tag[ID_TAG_DATA_SET_LAST_FRAME]
-                idxFrame = idxFirstFrame + self._frameNumberDispatch % (idxLastFrame - idxFirstFrame)
+        # If events are not disabled, request a scene execution and viewport redraw
+        # (events off happens for example, if dispatch is called during the user dragging the scrub bar).
+        # Requests are coalesced (and optionally paced) by the draw scheduler.
+        paced = self._play and GetPref(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED) == PLAYBACK_RATE_AUTO
+        if event and self._liveDraw.Request(paced):
+            c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_LIVE_DRAW, p1=int(self._play))
 
-            # Dispatch the frame (simply writing the index into the tag)
-            tagData._queueReceive.AddFrame(tag, idxFrame)
 
-        # If events are not disabled, request a scene execution and viewport redraw
-        # (events off happens for example, if dispatch is called during the user dragging the scrub bar)
-        if event:
+    # Sends a draw request refused by pacing, once it is due (see RequestTrailing() in rokoko_live_draw).
+    def RequestTrailingLiveDraw(self):
+        if self._liveDraw.RequestTrailing():
             c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_LIVE_DRAW, p1=int(self._play))
 
 
@@ -817,20 +1062,31 @@ class ThreadListener(c4d.threading.C4DThread):
     # Thread function used, when there is a live connection.
     # In contrast to the "offline player" below, no time base needs to generated.
     # Instead the frame reception is used as a "clock".
+    # The thread is the dispatch stage of the live receiver (see rokoko_receiver),
+    # it buffers decoded frames and dispatches them to the tags.
     def MainConnected(self):
-        while self._statusConnection != 0:
-            # Wait for a frame from Rokoko Studio
-            result, newData = self.ReceiveFrame()
-            if not result:
-                break # an error occurred
+        receiver = self._receiver # Disconnect() drops the reference, while this thread may still be running
+        while self._statusConnection != 0 and receiver is not None:
+            self.RequestTrailingLiveDraw()
+
+            # Wait for a decoded frame from Rokoko Studio
+            data, timeRecv = receiver.Get(timeout=1.0)
+            if self._statusConnection == 0:
+                break # disconnected while waiting
 
             # If no new data received (timeout), announce the change in connection status
-            if not newData:
+            if timeRecv is None:
+                if self._telemetry.Tick():
+                    c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_TELEMETRY_UPDATE)
+                self.StreamTimeout()
                 self._statusConnection = 2
                 if self._statusConnection != self._statusConnectionLast: # only one event per change
                     c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_STATUS_CHANGE)
                     self._statusConnectionLast = self._statusConnection
                 continue
+            self._flagTimeOut = False
+            if self._telemetry.AddReceived():
+                c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_TELEMETRY_UPDATE)
 
             self._statusConnection = 1 # online and data incoming
 
@@ -839,17 +1095,22 @@ class ThreadListener(c4d.threading.C4DThread):
                 c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_CONNECTION, CM_SUBID_CONNECTION_STATUS_CHANGE)
                 self._statusConnectionLast = self._statusConnection
 
+            # If reception is enabled (player started), buffer the frame
+            if data is not None and self._receive:
+                self.BufferFrame(data)
+
             # If player is paused, we are done
             if not self._play:
                 continue
 
             # Depending on playback rate set by the user, dispatch or skip this frame
-            playbackRate = GetPref(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED)
-            if playbackRate is None:
-                playbackRate = 2
+            playbackRate = self.GetPlaybackRate()
             self._cntPlaybackRate = (self._cntPlaybackRate + 1) % playbackRate
             if self._cntPlaybackRate == 0:
+                timeStart = time.perf_counter()
+                self._timeRecvDraw = timeRecv
                 self.DispatchFrame()
+                self._telemetry.AddDispatchTime(time.perf_counter() - timeStart)
 
             # Increase dispatch counter after the fact
             self._lockFrameCounter.acquire()
@@ -860,21 +1121,44 @@ class ThreadListener(c4d.threading.C4DThread):
 
     # Thread function used, when there is no live connection ("offline player").
     # The main difference besides the absence of a live data queue is,
-    # it needs to generate its own time base.
+    # it needs to generate its own time base (see rokoko_player_clock).
     def MainNotConnected(self):
+        playerClock = self._playerClock
         while self._statusConnection != 0:
-            # Get playback rate set by user (may change during playback)
-            playbackRate = GetPref(ID_DLGMNGR_PLAYER_PLAYBACK_SPEED)
+            self.RequestTrailingLiveDraw()
+            if playerClock.UpdateWindow():
+                c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_TELEMETRY_UPDATE)
 
-            # Simply sleep according to playback rate (this is probably highly inaccurate)
-            time.sleep(0.01667 * playbackRate) # TODO should actual FPS of data set be taken into account? If so, which data set, if there are multiple?
+            # If player is paused (user clicked pause or used scrub bar, etc.), only stop the clock
+            if not self._play:
+                playerClock.Stop()
+                time.sleep(1.0 / PLAYER_FPS)
+                continue
 
-            # Increase dispatch counter and dispatch frame(s),
-            # if player is not paused (user clicked pause or used scrub bar, etc.)
-            if self._play:
-                self._lockFrameCounter.acquire()
-                self._frameNumberDispatch += playbackRate
-                self._lockFrameCounter.release()
+            # Get playback rate set by user (may change during playback),
+            # the player dispatches only every nth frame
+            playbackRate = self.GetPlaybackRate()
+
+            # (Re)start the clock, if playback just started or the dispatch counter got changed
+            # from the outside (e.g. by the scrub bar)
+            frameNumber = self.GetDispatchCount()
+            if not playerClock.IsRunning() or frameNumber != playerClock.GetFrame():
+                playerClock.Start(frameNumber)
+
+            # Sleep until next frame is due, then either dispatch it or hold the current one
+            time.sleep(playerClock.GetWaitTime(playbackRate))
+            frameNumberNext = playerClock.Tick(playbackRate)
+            if frameNumberNext is None:
+                continue
+
+            # Set dispatch counter and dispatch frame(s),
+            # unless player got paused or dispatch counter got changed in the meantime
+            self._lockFrameCounter.acquire()
+            dispatch = self._play and self._frameNumberDispatch == frameNumber
+            if dispatch:
+                self._frameNumberDispatch = frameNumberNext
+            self._lockFrameCounter.release()
+            if dispatch:
                 self.DispatchFrame()
 
 
@@ -885,24 +1169,42 @@ class ThreadListener(c4d.threading.C4DThread):
 
 
     # Save current live data queue to a file.
+    # Frames get encoded and compressed one by one, so the live data never needs to be held
+    # in memory as a whole (parts of it may only exist in the spill file, see rokoko_live_queue).
     def SaveLiveData(self, filename, idxFrameFirst=0, idxFrameLast=-1):
-        # Encode live data as JSON
-        self._lockDataQueues.acquire()
-        if idxFrameLast == -1:
-            idxFrameLast = len(self._liveQueue)
-        dataJSON = json.dumps(self._liveQueue[idxFrameFirst:idxFrameLast])
-        self._lockDataQueues.release()
-
-        # Compress JSON data
+        compressor = None
         if __USE_LZ4__:
-            dataLZ4 = lz4f.compress(dataJSON.encode('utf-8'))
-        else:
-            dataLZ4 = dataJSON
+            compressor = lz4f.LZ4FrameCompressor()
 
-        # Write compressed data to file
         with open(filename, mode='wb') as f:
-            f.write(dataLZ4)
-            f.close()
+            if compressor is not None:
+                f.write(compressor.begin())
+
+            # Capture the range of frames to be saved (the live data queue is locked only meanwhile,
+            # so receiving and dispatching continue, while frames get written)
+            self._lockDataQueues.acquire()
+            frames = []
+            if self._liveQueue is not None:
+                frames = self._liveQueue.IterFrames(idxFrameFirst, idxFrameLast)
+            self._lockDataQueues.release()
+
+            # Encode live data as JSON array, frame by frame
+            separator = '['
+            for frame in frames:
+                dataJSON = (separator + frame.GetText()).encode('utf-8')
+                separator = ', '
+                if compressor is not None:
+                    dataJSON = compressor.compress(dataJSON)
+                f.write(dataJSON)
+
+            # Close JSON array and compressed stream
+            if separator == '[':
+                dataJSON = b'[]' # no frames at all
+            else:
+                dataJSON = b']'
+            if compressor is not None:
+                dataJSON = compressor.compress(dataJSON) + compressor.flush()
+            f.write(dataJSON)
 
 
 # Create a global instance of the listener thread (during startup)
@@ -0,0 +1,90 @@
+# Scheduling of viewport draws during playback.
+#
+# Originally every dispatched frame requested a viewport draw (SpecialEventAdd() with
+# PLUGIN_ID_COREMESSAGE_LIVE_DRAW), which the main thread handles by drawing synchronously
+# (see CoreMessageLiveDraw() in rokoko_message_data). If drawing took longer than the time between
+# two frames, these events piled up in C4D's event queue and the latency between reception and
+# display of a frame grew steadily.
+#
+# Now draw requests are coalesced: While a request is pending (not yet handled by the main thread),
+# no further request gets sent. Tags always execute the frame dispatched last, so a pending draw
+# automatically skips to the newest frame.
+# Additionally the duration of draws gets measured. With playback rate "Auto" requests are paced, so
+# drawing occupies at most LIVE_DRAW_MAX_LOAD of the main thread's time, keeping C4D responsive.
+# This replaces the fixed divisor of the other playback rates with a policy bounded by the actual draw time.
+# A request refused by pacing is owed as a trailing draw (see RequestTrailing()), so the frame
+# dispatched last gets drawn, even if no further frame gets dispatched (e.g. playback got paused).
+import time
+from threading import Lock
+
+# Maximum share of the main thread's time spent in viewport draws with playback rate "Auto"
+LIVE_DRAW_MAX_LOAD = 0.75
+
+# A request not handled within this time (in seconds) is considered lost and gets sent again
+LIVE_DRAW_TIMEOUT = 0.5
+
+# Weight of the latest draw duration in the smoothed draw duration
+LIVE_DRAW_SMOOTHING = 0.2
+
+class LiveDrawScheduler():
+    _lock = None
+    _pending = False # a draw request has been sent, but not yet been handled
+    _timeRequest = 0.0 # time the pending request got sent
+    _timeDrawStart = 0.0 # time the last draw started
+    _durationDraw = 0.0 # smoothed duration of a draw
+    _refused = False # a request got refused by pacing and no draw happened since
+
+    def __init__(self):
+        self._lock = Lock()
+
+
+    # Forgets about pending and refused requests and draw durations.
+    def Reset(self):
+        with self._lock:
+            self._pending = False
+            self._refused = False
+            self._durationDraw = 0.0
+
+
+    # Called by the listener thread after dispatching a frame.
+    # paced: requests should be paced according to draw duration (playback rate "Auto")
+    # Returns True, if a draw request is to be sent.
+    def Request(self, paced):
+        now = time.perf_counter()
+        with self._lock:
+            if self._pending and now - self._timeRequest < LIVE_DRAW_TIMEOUT:
+                self._refused = False # pending draw shows this frame
+                return False # coalesced with pending request
+            if paced and now - self._timeDrawStart < self._durationDraw / LIVE_DRAW_MAX_LOAD:
+                self._refused = True
+                return False # too early, main thread needs to breathe
+            self._pending = True
+            self._refused = False
+            self._timeRequest = now
+            return True
+
+
+    # Called by the listener thread regularly, also if no frame got dispatched.
+    # Returns True, if a request refused by pacing is due now (a draw request is to be sent).
+    def RequestTrailing(self):
+        with self._lock:
+            if not self._refused:
+                return False
+        return self.Request(True)
+
+
+    # Called by the main thread before drawing.
+    # From now on a new request may be sent for frames dispatched during this draw.
+    def DrawStarted(self):
+        with self._lock:
+            self._pending = False
+            self._timeDrawStart = time.perf_counter()
+
+
+    # Called by the main thread after drawing.
+    # Returns the duration of the draw.
+    def DrawFinished(self):
+        with self._lock:
+            duration = time.perf_counter() - self._timeDrawStart
+            self._durationDraw += LIVE_DRAW_SMOOTHING * (duration - self._durationDraw)
+            return duration
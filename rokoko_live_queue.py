@@ -0,0 +1,167 @@
+# The live queue buffers motion data frames received from Rokoko Studio during a live session.
+#
+# Originally the live queue was a plain list, growing with every received frame. During long sessions
+# this grew memory without limit. Now the live queue keeps only the most recent frames (capacity) in a
+# ring buffer in RAM. Older frames are either dropped or, if spilling is enabled, written to a segment
+# file on disk (one LZ4 compressed JSON record per frame, plus an in-memory offset table).
+# Frames are LiveFrames (see rokoko_clip), their JSON text gets spilled as received, without encoding.
+#
+# Frames keep their index from the start of the session regardless of where they are stored,
+# so the live queue can still be used like the list it replaced (len(), indexing), by the player
+# (dispatch, scrub bar), the bake and SaveLiveData().
+# If frames got dropped, accessing them returns the oldest frame still available.
+import array, tempfile
+from threading import Lock
+import c4d
+# Import lz4 module for the correct platform
+__USE_LZ4__ = True
+try:
+    currentOS = c4d.GeGetCurrentOS()
+    if currentOS == c4d.OPERATINGSYSTEM_WIN:
+        import packages.win.lz4.frame as lz4f
+    elif currentOS == c4d.OPERATINGSYSTEM_OSX:
+        import lz4.frame as lz4f
+except:
+    __USE_LZ4__ = False
+from rokoko_ids import *
+from rokoko_clip import *
+
+class LiveQueue():
+    _capacity = 0 # maximum number of frames in RAM
+    _spill = True # older frames are written to segment file (True) or dropped (False)
+    _ring = None # ring buffer with most recent frames
+    _numFrames = 0 # number of frames appended since start (or last clear())
+    _idxFirst = 0 # index of oldest frame still available (only frames dropped without spilling are gone)
+    _idxFirstInRing = 0 # index of oldest frame in RAM, published before its ring slot gets overwritten
+
+    # Segment file
+    _fileSegment = None # temporary file, created on first spill
+    _offsets = None # offset of every spilled frame in segment file, plus end offset of last one
+    _lockSegment = None # serializes access to segment file (e.g. listener thread spilling, bake workers reading)
+
+    def __init__(self, capacity=LIVE_QUEUE_CAPACITY_DEFAULT, spill=True):
+        self._capacity = max(1, capacity)
+        self._spill = spill
+        self._ring = [None] * self._capacity
+        self._offsets = array.array('Q', [0])
+        self._lockSegment = Lock()
+
+
+    def __len__(self):
+        return self._numFrames
+
+
+    # Returns a frame (as decoded from JSON) by its index.
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._numFrames
+        if idx < 0 or idx >= self._numFrames:
+            raise IndexError('live queue index out of range')
+
+        # Frame got dropped, use oldest available frame instead
+        if idx < self._idxFirst:
+            idx = self._idxFirst
+
+        # Frame is still in RAM
+        # The listener thread may append frames concurrently (e.g. while a bake worker reads),
+        # so the frame is only valid, if its slot did not get overwritten while reading it.
+        if idx >= self._idxFirstInRing:
+            frame = self._ring[idx % self._capacity]
+            if idx >= self._idxFirstInRing:
+                return frame
+            if idx < self._idxFirst:
+                return self[self._idxFirst] # got dropped in the meantime
+
+        # Frame got spilled to segment file
+        return self.ReadSpilledFrame(idx)
+
+
+    # Appends a frame at the end of the queue.
+    # If the queue is full, the oldest frame in RAM gets spilled or dropped.
+    def append(self, frame):
+        idxRing = self._numFrames % self._capacity
+        if self._numFrames >= self._capacity:
+            if self._spill:
+                self.SpillFrame(self._ring[idxRing])
+            else:
+                self._idxFirst = self._numFrames - self._capacity + 1
+            self._idxFirstInRing = self._numFrames - self._capacity + 1 # before the slot gets overwritten
+        self._ring[idxRing] = frame
+        self._numFrames += 1
+
+
+    # Removes all frames.
+    def clear(self):
+        self._ring = [None] * self._capacity
+        self._numFrames = 0
+        self._idxFirst = 0
+        self._idxFirstInRing = 0
+        self._offsets = array.array('Q', [0])
+        if self._fileSegment is not None:
+            with self._lockSegment:
+                self._fileSegment.seek(0)
+                self._fileSegment.truncate()
+
+
+    # Closes (and thereby deletes) the segment file.
+    def Close(self):
+        self.clear()
+        if self._fileSegment is not None:
+            self._fileSegment.close()
+            self._fileSegment = None
+
+
+    # Returns the index of the oldest frame still available.
+    def GetFirstIndex(self):
+        return self._idxFirst
+
+
+    # Returns the number of frames currently stored in the segment file.
+    def GetNumSpilledFrames(self):
+        return len(self._offsets) - 1
+
+
+    # Writes a frame to the end of the segment file.
+    def SpillFrame(self, frame):
+        if self._fileSegment is None:
+            self._fileSegment = tempfile.TemporaryFile(prefix='rokoko_live_', suffix='.seg')
+        data = frame.GetText().encode('utf-8')
+        if __USE_LZ4__:
+            data = lz4f.compress(data)
+        with self._lockSegment:
+            self._fileSegment.seek(self._offsets[-1])
+            self._fileSegment.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+
+
+    # Reads a frame from the segment file.
+    # Frames are spilled in order, so the frame index is also the record index in segment file.
+    def ReadSpilledFrame(self, idx):
+        with self._lockSegment:
+            offset = self._offsets[idx]
+            self._fileSegment.seek(offset)
+            data = self._fileSegment.read(self._offsets[idx + 1] - offset)
+        if __USE_LZ4__:
+            data = lz4f.decompress(data)
+        return LiveFrame(data.decode('utf-8'))
+
+
+    # Returns an iterator over the frames with indeces idxFirst to idxLast (excluding), e.g. for saving them.
+    # Frames dropped without spilling are skipped.
+    # The range gets captured right away (frames in RAM by reference), so only this call needs to be
+    # protected against concurrent appends. Spilled frames get read while iterating, which is safe
+    # without any lock, as the segment file is append only.
+    def IterFrames(self, idxFirst=0, idxLast=-1):
+        if idxLast == -1 or idxLast > self._numFrames:
+            idxLast = self._numFrames
+        idxFirst = max(idxFirst, self._idxFirst)
+        idxFirstInRing = min(max(idxFirst, self._idxFirstInRing), idxLast)
+        framesRing = [self._ring[idx % self._capacity] for idx in range(idxFirstInRing, idxLast)]
+        return self.IterCapturedFrames(range(idxFirst, idxFirstInRing), framesRing)
+
+
+    def IterCapturedFrames(self, rangeSpilled, framesRing):
+        for idx in rangeSpilled:
+            yield self.ReadSpilledFrame(idx)
+        for frame in framesRing:
+            yield frame
@@ -90,7 +90,10 @@ class MessageDataRokoko(c4d.plugins.MessageData):
             doc.SetTime(t)
 
         # Trigger scene execution and draw viewport
+        # (tags execute the frame dispatched last, so draws coalesced in the meantime are skipped, see rokoko_live_draw)
+        g_thdListener.LiveDrawStarted()
         c4d.DrawViews(c4d.DRAWFLAGS_ONLY_ACTIVE_VIEW | c4d.DRAWFLAGS_NO_THREAD)
+        g_thdListener.LiveDrawHandled() # draw time and latency statistics (see rokoko_telemetry)
 
 
     # React to "connect request" message from Manager dialog.
@@ -0,0 +1,133 @@
+# Clock of the offline player (playback of clips without a live connection).
+#
+# Originally the offline player slept a fixed 16.67 ms (times the playback rate) between two
+# dispatches. Sleep overshoot and the time needed for dispatching accumulated, so playback drifted
+# away from wall time (most notably under viewport load).
+#
+# Now the player frame to be dispatched is calculated from the time elapsed on a monotonic clock
+# (time.perf_counter()) since playback got (re)started, the player only sleeps until the next frame is due:
+#   - If the player fell behind (e.g. a viewport redraw took longer than a frame), frames get dropped
+#     in order to catch up with wall time.
+#   - If the player woke up early, the current frame is held (not dispatched again).
+# Player frames are counted in the player's time base (PLAYER_FPS). See DispatchFrame() in rokoko_listener
+# for how these get mapped onto the frames of clips with different frame rates.
+#
+# Measured drift (how late frames got dispatched after they were due) and dropped and held frames
+# are accumulated over windows of one second. A snapshot of the last window can be retrieved via GetStats():
+#   - drift: avg/max in ms
+#   - dropped: number of frames dropped to catch up
+#   - held: number of wake ups without a new frame being due
+import time
+from threading import Lock
+
+# Time base of the player in frames per second (Rokoko Studio's default frame rate)
+PLAYER_FPS = 60.0
+
+# Length of a statistics window in seconds
+PLAYER_CLOCK_WINDOW = 1.0
+
+class PlayerClock():
+    _lock = None
+    _running = False
+    _timeStart = 0.0 # time of (re)start of playback
+    _frameStart = 0 # player frame at (re)start of playback
+    _frameLast = 0 # player frame last returned by Tick()
+
+    # Statistics
+    _timeWindowStart = 0.0
+    _stats = None # statistics of last completed window
+    _drifts = None
+    _numDropped = 0
+    _numHeld = 0
+
+    def __init__(self):
+        self._lock = Lock()
+        self._timeWindowStart = time.perf_counter()
+        self._stats = self.CreateStats()
+        self.ResetWindow()
+
+
+    # (Re)starts the clock at a given player frame, e.g. when playback starts or the user scrubbed.
+    def Start(self, frame):
+        self._timeStart = time.perf_counter()
+        self._frameStart = frame
+        self._frameLast = frame
+        self._running = True
+
+
+    def Stop(self):
+        self._running = False
+
+
+    def IsRunning(self):
+        return self._running
+
+
+    # Returns the player frame last returned by Tick().
+    def GetFrame(self):
+        return self._frameLast
+
+
+    # Returns the time at which a player frame is due.
+    def GetTimeDue(self, frame):
+        return self._timeStart + (frame - self._frameStart) / PLAYER_FPS
+
+
+    # Returns the time in seconds until the next frame is due.
+    # step: the player dispatches only every nth frame (playback rate set by the user)
+    def GetWaitTime(self, step):
+        return max(0.0, self.GetTimeDue(self._frameLast + step) - time.perf_counter())
+
+
+    # Returns the player frame to be dispatched now or None, if the current frame is to be held.
+    # Only multiples of step (relative to the start frame) get dispatched, frames behind are dropped.
+    def Tick(self, step):
+        now = time.perf_counter()
+        frameTarget = self._frameStart + int((now - self._timeStart) * PLAYER_FPS)
+        numSteps = (frameTarget - self._frameLast) // step
+        with self._lock:
+            if numSteps <= 0:
+                self._numHeld += 1
+                return None
+            self._numDropped += (numSteps - 1) * step
+            self._drifts.append(now - self.GetTimeDue(self._frameLast + step))
+        self._frameLast += numSteps * step
+        return self._frameLast
+
+
+    # Resets accumulators of current window (lock needs to be held).
+    def ResetWindow(self):
+        self._drifts = []
+        self._numDropped = 0
+        self._numHeld = 0
+
+
+    # Returns a statistics dictionary for the current window (lock needs to be held).
+    def CreateStats(self):
+        if self._drifts is None or len(self._drifts) == 0:
+            drift = (0.0, 0.0)
+        else:
+            drift = (1000.0 * sum(self._drifts) / len(self._drifts), 1000.0 * max(self._drifts))
+        return { 'drift' : drift,
+                 'dropped' : self._numDropped,
+                 'held' : self._numHeld,
+               }
+
+
+    # Completes the current window, if it is over.
+    # Returns True, if a new snapshot of the statistics is available.
+    def UpdateWindow(self):
+        with self._lock:
+            now = time.perf_counter()
+            if now - self._timeWindowStart < PLAYER_CLOCK_WINDOW:
+                return False
+            self._stats = self.CreateStats()
+            self._timeWindowStart = now
+            self.ResetWindow()
+            return True
+
+
+    # Returns the statistics of the last completed window.
+    def GetStats(self):
+        with self._lock:
+            return self._stats.copy()
@@ -2,7 +2,8 @@
 # own preferences page.
 #
 # The Rokoko Studio Live plugin has almost no parameters, that need to be handled via a PreferenceData.
-# Actually only one: The option to enable and disable the Rokoko Studio Live plugin.
+# Actually only the option to enable and disable the Rokoko Studio Live plugin and
+# the size and spill behavior of the live buffer (see rokoko_live_queue).
 #
 # This PreferenceData is also the only plugin, Rokoko Studio Live registers,
 # even if the user decided to disable the plugin. For obvious reasons,
@@ -36,6 +37,8 @@ class PreferenceDataRokoko(c4d.plugins.PreferenceData):
         def Init(self, node, description=None):
             bcWorldPrefs = GetWorldPrefs()
             self.InitPrefValue(description, ID_PREF_PLUGIN_ENABLED, c4d.DTYPE_BOOL, bcWorldPrefs)
+            self.InitPrefValue(description, ID_PREF_LIVE_BUFFER_SIZE, c4d.DTYPE_LONG, bcWorldPrefs)
+            self.InitPrefValue(description, ID_PREF_LIVE_BUFFER_SPILL, c4d.DTYPE_BOOL, bcWorldPrefs)
             return True
 
 
@@ -59,6 +62,17 @@ class PreferenceDataRokoko(c4d.plugins.PreferenceData):
                                              'Enable Rokoko Studio Live Plugin (change needs C4D restart to take effect)', \
                                              ROKOKOPREFERENCES_MAIN_GROUP, anim=False, valDefault=True):
                 return False
+
+            # Create live buffer parameters (see rokoko_live_queue)
+            if not GetDDescriptionCreateLong(node, description, singleId, ID_PREF_LIVE_BUFFER_SIZE, \
+                                             'Live Buffer Size (frames kept in memory)', \
+                                             ROKOKOPREFERENCES_MAIN_GROUP, anim=False, valDefault=LIVE_QUEUE_CAPACITY_DEFAULT, \
+                                             valMin=600, valMax=10000000, step=600, slider=False):
+                return False
+            if not GetDDescriptionCreateBool(node, description, singleId, ID_PREF_LIVE_BUFFER_SPILL, \
+                                             'Spill Older Live Frames to Disk (instead of dropping them)', \
+                                             ROKOKOPREFERENCES_MAIN_GROUP, anim=False, valDefault=True):
+                return False
             return True, flags | c4d.DESCFLAGS_DESC_LOADED
 
 
@@ -66,8 +80,10 @@ class PreferenceDataRokoko(c4d.plugins.PreferenceData):
         def SetDParameter(self, node, id, data, flags):
             bc = GetWorldPrefs()
             paramID = id[0].id
-            if paramID == ID_PREF_PLUGIN_ENABLED:
+            if paramID == ID_PREF_PLUGIN_ENABLED or paramID == ID_PREF_LIVE_BUFFER_SPILL:
                 bc.SetBool(paramID, data)
+            elif paramID == ID_PREF_LIVE_BUFFER_SIZE:
+                bc.SetInt32(paramID, data)
             return True, flags | c4d.DESCFLAGS_SET_PARAM_SET
 
 
@@ -75,5 +91,7 @@ class PreferenceDataRokoko(c4d.plugins.PreferenceData):
         def GetDParameter(self, node, id, flags):
             bc = GetWorldPrefs()
             paramID = id[0].id
-            if paramID == ID_PREF_PLUGIN_ENABLED:
+            if paramID == ID_PREF_PLUGIN_ENABLED or paramID == ID_PREF_LIVE_BUFFER_SPILL:
                 return True, bc.GetBool(paramID), flags | c4d.DESCFLAGS_GET_PARAM_GET
+            elif paramID == ID_PREF_LIVE_BUFFER_SIZE:
+                return True, bc.GetInt32(paramID), flags | c4d.DESCFLAGS_GET_PARAM_GET
@@ -0,0 +1,158 @@
+# The live receiver decouples reception of motion data from Rokoko Studio from decoding and dispatching it.
+#
+# Originally the listener thread received a datagram, decompressed and decoded it, buffered it and
+# dispatched it to the tags, all inline. If decoding took longer than the time between two datagrams
+# (60-100 Hz with multiple actors), datagrams piled up in the socket and got dropped by the OS.
+#
+# Now reception is a pipeline of three stages, connected by bounded queues:
+#   - receive stage (own thread): a tight loop only copying datagrams into buffers taken from
+#     a preallocated buffer pool
+#   - decode stage (own thread): decompresses and decodes datagrams via a function provided by
+#     the listener thread, returns the buffers to the pool
+#   - dispatch stage (the listener thread): fetches decoded frames via Get() for buffering and dispatch
+# If a stage can not keep up, datagrams (or decoded frames) get dropped in the receiver
+# (instead of the OS) and get counted, so the drops become visible (see GetStats()).
+import socket, time
+from threading import Thread, Lock
+from queue import Queue, Empty, Full
+
+# Size of a receive buffer (maximum UDP datagram size)
+SIZE_RECEIVE_BUFFER = 64 * 1024
+
+# Number of preallocated receive buffers
+NUM_RECEIVE_BUFFERS = 32
+
+# Maximum number of decoded frames waiting for dispatch
+SIZE_DISPATCH_QUEUE = 16
+
+class LiveReceiver():
+    _sock = None # socket (bound and owned by listener thread)
+    _funcDecode = None # function decoding a datagram, returns the object to be handed to dispatch stage
+    _running = False
+    _threadReceive = None
+    _threadDecode = None
+
+    # Buffer pool and queues between the stages
+    _buffersFree = None # pool of unused receive buffers
+    _queueDecode = None # (buffer, number of bytes, time of reception)
+    _queueDispatch = None # (decoded frame, time of reception)
+
+    # Counters
+    _lockStats = None
+    _numReceived = 0 # datagrams received
+    _numDroppedReceive = 0 # datagrams dropped, because decode stage was not able to keep up
+    _numDroppedDecode = 0 # decoded frames dropped, because dispatch stage was not able to keep up
+    _numDecodeErrors = 0 # datagrams failed to decode
+
+    def __init__(self, sock, funcDecode):
+        self._sock = sock
+        self._funcDecode = funcDecode
+        self._lockStats = Lock()
+        self._buffersFree = Queue()
+        for idxBuffer in range(NUM_RECEIVE_BUFFERS):
+            self._buffersFree.put(bytearray(SIZE_RECEIVE_BUFFER))
+        self._queueDecode = Queue(maxsize=NUM_RECEIVE_BUFFERS)
+        self._queueDispatch = Queue(maxsize=SIZE_DISPATCH_QUEUE)
+
+
+    # Starts receive and decode stage threads.
+    def Start(self):
+        self._running = True
+        self._threadReceive = Thread(target=self.MainReceive, name='Rokoko Receive', daemon=True)
+        self._threadDecode = Thread(target=self.MainDecode, name='Rokoko Decode', daemon=True)
+        self._threadReceive.start()
+        self._threadDecode.start()
+
+
+    # Stops receive and decode stage threads.
+    # Socket needs to be closed by the caller.
+    def Stop(self):
+        self._running = False
+        for thread in (self._threadReceive, self._threadDecode):
+            if thread is not None:
+                thread.join(2.0)
+        self._threadReceive = None
+        self._threadDecode = None
+
+
+    # Returns the next decoded frame and its time of reception (time.perf_counter()).
+    # Returns None, None if no frame got decoded within timeout.
+    def Get(self, timeout):
+        try:
+            return self._queueDispatch.get(timeout=timeout)
+        except Empty:
+            return None, None
+
+
+    # Returns a dictionary with drop and backlog counters.
+    def GetStats(self):
+        with self._lockStats:
+            stats = { 'received' : self._numReceived,
+                      'droppedReceive' : self._numDroppedReceive,
+                      'droppedDecode' : self._numDroppedDecode,
+                      'decodeErrors' : self._numDecodeErrors,
+                    }
+        stats['backlogDecode'] = self._queueDecode.qsize()
+        stats['backlogDispatch'] = self._queueDispatch.qsize()
+        return stats
+
+
+    # Receive stage.
+    # Only copies datagrams into free buffers and hands them to decode stage.
+    def MainReceive(self):
+        bufferDrop = bytearray(SIZE_RECEIVE_BUFFER) # used to drain the socket, if no buffer is available
+        while self._running:
+            try:
+                buffer = self._buffersFree.get_nowait()
+            except Empty:
+                buffer = None
+
+            try:
+                numBytes = self._sock.recv_into(buffer if buffer is not None else bufferDrop)
+            except socket.timeout:
+                if buffer is not None:
+                    self._buffersFree.put(buffer)
+                continue
+            except OSError:
+                break # socket got closed
+            timeRecv = time.perf_counter()
+
+            with self._lockStats:
+                self._numReceived += 1
+                if buffer is None:
+                    self._numDroppedReceive += 1
+            if buffer is None:
+                continue
+
+            try:
+                self._queueDecode.put_nowait((buffer, numBytes, timeRecv))
+            except Full:
+                self._buffersFree.put(buffer)
+                with self._lockStats:
+                    self._numDroppedReceive += 1
+
+
+    # Decode stage.
+    def MainDecode(self):
+        while self._running:
+            try:
+                buffer, numBytes, timeRecv = self._queueDecode.get(timeout=0.2)
+            except Empty:
+                continue
+
+            try:
+                result, data = self._funcDecode(memoryview(buffer)[:numBytes])
+            except Exception:
+                result, data = False, None # a single broken datagram must not stop the live pipeline
+            finally:
+                self._buffersFree.put(buffer)
+            if not result:
+                with self._lockStats:
+                    self._numDecodeErrors += 1
+                continue
+
+            try:
+                self._queueDispatch.put_nowait((data, timeRecv))
+            except Full:
+                with self._lockStats:
+                    self._numDroppedDecode += 1
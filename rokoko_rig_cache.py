@@ -0,0 +1,119 @@
+# The rig cache persistently stores the joint mapping of all character rigs ever mapped.
+#
+# Originally every new Actor tag auto detected its rig mapping (see DetectRig() in rokoko_tag) and
+# stored its T-Pose from scratch, walking the entire hierarchy of the rig. Using the same character
+# in dozens of scenes (or dropping it multiple times into one scene), repeated this every time.
+# Worse, corrections of the mapping done by the user were lost for every new instance of the character.
+#
+# Now rigs are identified by a fingerprint of their hierarchy (names and depth of all objects below
+# the rig root, see GetRigFingerprint()). Identical rigs get their mapping from the cache
+# instead of being detected again. The cache is stored in C4D's preferences folder (like the clip
+# index, see rokoko_clip_index), so it survives a restart of C4D.
+#
+# A cache entry is a dictionary:
+#   'links': index of body part (as string) : index of mapped object in hierarchy (pre-order, see GetRigFingerprint())
+# Hip height and T-Pose are not cached. Rigs with identical hierarchies (e.g. different characters
+# exported from the same tool) may still differ in their proportions, so these get determined from
+# the joints of each rig (which is cheap, as only mapped joints are involved).
+import os, json, hashlib
+from threading import Lock
+import c4d
+from rokoko_utils import *
+
+RIG_CACHE_FILENAME = 'rokoko_rig_cache.json'
+RIG_CACHE_VERSION = 2
+
+# Maximum number of rigs in the cache (least recently used rigs get dropped first)
+RIG_CACHE_MAX_ENTRIES = 256
+
+
+# Returns the fingerprint of a rig's hierarchy and a list of all its objects (pre-order, see IterObjects() in rokoko_utils).
+# Objects of identical rigs are listed in the same order, so cached mappings can refer to list indeces.
+def GetRigFingerprint(objRoot):
+    sha = hashlib.sha1()
+    objs = []
+    for obj, depth in IterObjectsDepth(objRoot):
+        objs.append(obj)
+        sha.update('{0}\t{1}\n'.format(depth, obj.GetName()).encode('utf-8'))
+    return sha.hexdigest(), objs
+
+
+class RigCache():
+    _filename = None # cache file
+    _lock = None
+    _rigs = None # fingerprint -> cache entry (in order of last use)
+    _dirty = False # cache changed since last save
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._lock = Lock()
+        self._rigs = {}
+        self.Load()
+
+
+    # Reads the cache file (if any).
+    def Load(self):
+        if not os.path.exists(self._filename):
+            return
+        try:
+            with open(self._filename, mode='r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print('ERROR: Failed to read rig cache {0}.'.format(self._filename))
+            return
+        if data.get('version') != RIG_CACHE_VERSION:
+            return
+        self._rigs = data['rigs']
+
+
+    # Writes the cache file, if there were any changes.
+    def Save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({ 'version' : RIG_CACHE_VERSION, 'rigs' : self._rigs })
+            self._dirty = False
+        filenameTemp = self._filename + '.tmp'
+        try:
+            with open(filenameTemp, mode='w') as f:
+                f.write(data)
+            os.replace(filenameTemp, self._filename)
+        except OSError:
+            print('ERROR: Failed to write rig cache {0}.'.format(self._filename))
+
+
+    # Returns the cache entry of a rig or None, if the rig is not in the cache.
+    def Lookup(self, fingerprint):
+        with self._lock:
+            entry = self._rigs.pop(fingerprint, None)
+            if entry is not None:
+                self._rigs[fingerprint] = entry # most recently used
+            return entry
+
+
+    # Stores the cache entry of a rig.
+    def Store(self, fingerprint, entry):
+        with self._lock:
+            self._rigs.pop(fingerprint, None)
+            self._rigs[fingerprint] = entry
+            while len(self._rigs) > RIG_CACHE_MAX_ENTRIES:
+                del self._rigs[next(iter(self._rigs))] # least recently used
+            self._dirty = True
+
+
+g_rigCache = None
+g_lockRigCache = Lock()
+
+# Returns the rig cache (loaded on first use).
+def GetRigCache():
+    global g_rigCache
+    with g_lockRigCache:
+        if g_rigCache is None:
+            g_rigCache = RigCache(os.path.join(c4d.storage.GeGetC4DPath(c4d.C4D_PATH_PREFS), RIG_CACHE_FILENAME))
+        return g_rigCache
+
+
+# Writes pending changes of the rig cache to disk.
+def SaveRigCache():
+    if g_rigCache is not None:
+        g_rigCache.Save()
@@ -0,0 +1,98 @@
+# Matching of object and pose names against the string tables for automatic rig and face morph detection.
+#
+# Originally DetectRig() and DetectFacePoses() (see rokoko_tag) looped over all entries of a string
+# table (see rokoko_rig_tables) for every single object below the rig root (or every pose of the
+# PoseMorph tag), testing all string lists of each entry with nested substring tests. Rigs with
+# thousands of helper objects or hundreds of blendshapes took long to detect.
+#
+# Now a NameMatcher is built once per string table:
+#   - All distinct strings of the table get collected, a name is tested once against each of these,
+#     resulting in the set of strings contained in the name.
+#   - Whether an entry matches depends only on this set, so entries are indexed by the strings of
+#     their "main" lists. Only entries with at least one of their strings contained in the name
+#     need to be checked (with set operations instead of substring tests).
+#   - Helper objects often share the same set of contained strings (e.g. "twist_01", "twist_02"),
+#     so the matching entries get cached per set.
+# Entries are returned in table order, so detection results are identical to the nested scans.
+from rokoko_rig_tables import *
+
+class NameMatcher():
+    _strings = None # tuple with all distinct strings in the table
+    _entries = None # list of (key, [set per main list], set include, set exclude, set side include, set side exclude) in table order
+    _entriesByString = None # string : list of indeces into _entries, whose main lists contain the string
+    _entriesAlways = None # indeces of entries with an empty main list (matching any name)
+    _cache = None # frozenset of contained strings : tuple of keys of matching entries
+
+    # conditions: list of (key, namesMain, namesInclude, namesExclude, namesSideInclude, namesSideExclude) in table order
+    def __init__(self, conditions):
+        self._entries = []
+        self._entriesByString = {}
+        self._entriesAlways = []
+        self._cache = {}
+        strings = set()
+        for key, namesMain, namesInclude, namesExclude, namesSideInclude, namesSideExclude in conditions:
+            idxEntry = len(self._entries)
+            setsMain = [frozenset(namesNeeded) for namesNeeded in namesMain]
+            self._entries.append((key, setsMain, frozenset(namesInclude), frozenset(namesExclude),
+                                  frozenset(namesSideInclude), frozenset(namesSideExclude)))
+            for setMain in setsMain:
+                if len(setMain) <= 0:
+                    self._entriesAlways.append(idxEntry)
+                for name in setMain:
+                    self._entriesByString.setdefault(name, []).append(idxEntry)
+            strings.update(*setsMain)
+            strings.update(namesInclude, namesExclude, namesSideInclude, namesSideExclude)
+        self._strings = tuple(strings)
+
+
+    # Returns a tuple with the keys of all entries matching a name (in table order).
+    # name is expected to be lower case already.
+    def Match(self, name):
+        found = frozenset(s for s in self._strings if s in name)
+        keys = self._cache.get(found)
+        if keys is None:
+            keys = self.MatchStrings(found)
+            self._cache[found] = keys
+        return keys
+
+
+    # Returns a tuple with the keys of all entries matching a set of contained strings (in table order).
+    def MatchStrings(self, found):
+        candidates = set(self._entriesAlways)
+        for name in found:
+            candidates.update(self._entriesByString.get(name, ()))
+
+        keys = []
+        for idxEntry in sorted(candidates):
+            key, setsMain, setInclude, setExclude, setSideInclude, setSideExclude = self._entries[idxEntry]
+            # At least one main list needs to be matched completely
+            if not any(setMain <= found for setMain in setsMain):
+                continue
+            # At least one include string needs to match (if there are any)
+            if len(setInclude) > 0 and setInclude.isdisjoint(found):
+                continue
+            # No exclude string may match
+            if not setExclude.isdisjoint(found):
+                continue
+            # Side is decided by any side include string, otherwise no side exclude string may match
+            if setSideInclude.isdisjoint(found) and not setSideExclude.isdisjoint(found):
+                continue
+            keys.append(key)
+        return tuple(keys)
+
+
+# Returns a NameMatcher for a body part table (see STUDIO_NAMES_TO_GUESS in rokoko_rig_tables).
+def CreateRigMatcher(tableBodyParts):
+    return NameMatcher([(nameStudio, namesMain, namesInclude, namesExclude, namesSideInclude, namesSideExclude)
+                        for nameStudio, (_, _, _, namesMain, namesInclude, namesExclude, namesSideInclude, namesSideExclude) in tableBodyParts.items()])
+
+
+# Returns a NameMatcher for a face pose table (see FACE_POSE_NAMES in rokoko_rig_tables).
+def CreateFaceMatcher(tablePoseNames):
+    return NameMatcher([(nameStudio, namesMain, [], namesExclude, namesSideInclude, namesSideExclude)
+                        for nameStudio, (_, _, namesMain, namesExclude, namesSideInclude, namesSideExclude) in tablePoseNames.items()])
+
+
+# Matchers for the default string tables
+RIG_MATCHER = CreateRigMatcher(STUDIO_NAMES_TO_GUESS)
+FACE_MATCHER = CreateFaceMatcher(FACE_POSE_NAMES)
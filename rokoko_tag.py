@@ -23,6 +23,8 @@
 import c4d
 from rokoko_ids import *
 from rokoko_rig_tables import *
+from rokoko_rig_matcher import *
+from rokoko_rig_cache import *
 from rokoko_utils import *
 from rokoko_tag_queue import *
 from rokoko_description_utils import *
@@ -52,10 +54,19 @@ class TagDataRokoko(c4d.plugins.TagData):
     _bmpIcon64 = None
     _lastObj = None
     _lastRigType = RIG_TYPE_UNKNOWN
-    _queueReceive = TagQueue()
     _funcExecute = None
     _tPoseTag = {}
     _facePoses = {}
+
+    # Execution plan of an actor tag, compiled in PrepareTPoseDict()
+    _planJoints = [] # (joint index, object, pretransformed T-Pose matrix) of all mapped joints
+    _planJointIndices = [] # joint indeces of above entries
+    _planTPoseNumPy = None # axes of above T-Pose matrices stacked for NumPy (None without NumPy)
+    _planHip = None # hip object (None if not mapped)
+    _mgRootTPoseInv = None # ~mgRootTPose
+    _mRootTPosePre = None # ~mgRootTPose * MR_Y180
+    _mgRootLast = None # root matrix _mRootPlan got calculated for
+    _mRootPlan = None # mgRoot * ~mgRootTPose * MR_Y180
     _dataSets = {} # only temporarily valid (set during SetDataSetMenuContainer() to be used in SetActorMenuContainer())
 
     # Most relevant entry points:
@@ -86,6 +97,13 @@ class TagDataRokoko(c4d.plugins.TagData):
         self._lastRigType = RIG_TYPE_UNKNOWN
         self._lastDataSet = -1
         self._tPoseTag = {}
+        self._planJoints = []
+        self._planJointIndices = []
+        self._planTPoseNumPy = None
+        self._planHip = None
+        self._mgRootTPoseInv = c4d.Matrix() # an empty plan is safe to execute (e.g. Studio T-Pose not loaded)
+        self._mRootTPosePre = c4d.Matrix()
+        self._mgRootLast = None
 
         # Initialize description parameters
         self.InitAttr(node, int, ID_TAG_RIG_TYPE)
@@ -159,9 +177,17 @@ class TagDataRokoko(c4d.plugins.TagData):
         bcTag.SetContainer(ID_TAG_BC_RIG_TYPES, c4d.BaseContainer())
         bcTag.SetContainer(ID_TAG_BC_DATASETS, c4d.BaseContainer())
         bcTag.SetContainer(ID_TAG_BC_ACTORS, c4d.BaseContainer())
+
+        # Register tag, so GetTagList() does not need to walk the scene (see rokoko_utils)
+        RegisterTag(node)
         return True
 
 
+    # Called by C4D, when a tag instance gets destroyed.
+    def Free(self, node):
+        UnregisterTag(node)
+
+
     # Adds an entry to the "Data" combo box BaseContainer,
     # addition depends on tag type and data provided by data set.
     def DataSetMenuContainerAdd(self, rigType, bcDataSet, bcMenu):
@@ -384,6 +410,7 @@ class TagDataRokoko(c4d.plugins.TagData):
         # TODO: STRANGE!
         tag.GetDataInstance()[ID_TAG_VALID_DATA] = validData
         tag.SetParameter(ID_TAG_VALID_DATA, validData, c4d.DESCFLAGS_SET_FORCESET)
+        g_thdListener.UpdateTagConsumer(self, tag)
 
 
     # Returns the prepared BaseContainer with content for the "Entity" combo box
@@ -765,13 +792,13 @@ class TagDataRokoko(c4d.plugins.TagData):
         if self._funcExecute is None:
             return c4d.EXECUTIONRESULT_OK # do nothing, tag is passive
 
-        # Get dispatched frame index, otherwise leave
-        idxFrame = self._queueReceive.GetFrameIdx(tag)
-        if idxFrame is None:
+        # Get the frame snapshot published by the last dispatch, otherwise leave
+        snapshot = g_thdListener.GetFrameSnapshot()
+        if snapshot is None:
             return c4d.EXECUTIONRESULT_OK # do nothing, tag is passive
 
-        # Get actual motion data frame from data queue in listener thread
-        data = g_thdListener.GetFrame(tag[ID_TAG_DATA_SET], idxFrame)
+        # Get actual motion data frame (frame object, see rokoko_clip) dispatched to this tag
+        data = snapshot.GetFrame(self)
         if data is None:
             return c4d.EXECUTIONRESULT_OK # do nothing, tag is passive
 
@@ -802,70 +829,20 @@ class TagDataRokoko(c4d.plugins.TagData):
         for (idxBodyPart, _, _, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.values():
             tag[ID_TAG_BASE_RIG_LINKS + idxBodyPart] = None
 
+        # Matcher for the string table (see rokoko_rig_matcher)
+        if tableBodyParts is STUDIO_NAMES_TO_GUESS:
+            matcher = RIG_MATCHER
+        else:
+            matcher = CreateRigMatcher(tableBodyParts)
+
         # Iterate all objects of the rig (yes, all, not only joints)
-        for obj in iter_objs(objRoot):
+        for obj in IterObjects(objRoot):
             objName = obj.GetName()
             objName = objName.lower()
 
-            # Loop table with body part strings and see if joint object name matches
-            for nameStudio, (idxBodyPart, nameDisplay, device, namesMain, namesInclude, namesExclude, namesSideInclude, namesSideExclude) in tableBodyParts.items():
-                # namesMain contains multiple lists of strings
-                # At least one list needs to be matched completely.
-                hitMain = False
-                for namesNeeded in namesMain:
-                    hitMain = True
-                    for name in namesNeeded:
-                        if name not in objName:
-                            hitMain = False
-                            break
-                    if hitMain:
-                        break
-                # If no list of strings matched completely, check next entry
-                if not hitMain:
-                    continue
-
-                # nameInclude is a list of string from which at least needs to match
-                hitInclude = False
-                for nameInclude in namesInclude:
-                    if nameInclude in objName:
-                        hitInclude = True
-                        break
-                # If no string matched, check next entry
-                if not hitInclude and len(namesInclude) > 0:
-                    continue
-
-                # namesExclude is a list of strings, which must not appear in pose name
-                hitExclude = False
-                for nameExclude in namesExclude:
-                    if nameExclude in objName:
-                        hitExclude = True
-                        break
-                # If any string matched, check next entry
-                if hitExclude:
-                    continue
-
-                # For side detection, it's supposed to be enough to only mark
-                # joints of one side with a label (e.g. "left", but right side has no side label at all).
-
-                # namesSideInclude is a list of strings, which, if matched, would assign the object to a side.
-                # One match from the list is enough to decide the side.
-                hitSideInclude = False
-                hitSideExclude = False
-                for nameSideInclude in namesSideInclude:
-                    if nameSideInclude in objName:
-                        hitSideInclude = True
-                        break
-                # If no match in side include list
-                if not hitSideInclude:
-                    # Side not decided yet, check absence of strings in exclude list
-                    # namesSideExclude is a list of strings, which may not appear in pose name.
-                    for nameSideExclude in namesSideExclude:
-                        if nameSideExclude in objName:
-                            hitSideExclude = True
-                            break
-                    # If any string matched, side of object is undecided, while string table expects a side
-                    if hitSideExclude:
-                        continue
+            # Loop all body part entries matched by joint object name (in order of the string table)
+            for nameStudio in matcher.Match(objName):
+                idxBodyPart, _, device, _, _, _, _, _ = tableBodyParts[nameStudio]
 
                 # Joint match
 
@@ -890,18 +867,28 @@ class TagDataRokoko(c4d.plugins.TagData):
         # If a hip joint was found
         if 'hip' in detectedRig:
             hasHip = True
+            self.DetectHipHeight(tag, detectedRig['hip'][1])
+
+        self.SetRigDetected(tag, hasBody, hasHip, hasHandLeft, hasHandRight)
+        return detectedRig
 
-            # Get local matrix (relative to parent) of hip joint
-            mlHip = detectedRig['hip'][1].GetMl()
 
-            axis = 1
-            if round(mlHip.off.y, 0) == round(mlHip.off.z, 0) == 0:
-                axis = 0
-            elif round(mlHip.off.x, 0) == round(mlHip.off.y, 0) == 0:
-                axis = 2
-            hipHeight = detectedRig['hip'][1].GetMl().off[axis]
-            tag[ID_TAG_ACTOR_HIP_HEIGHT] = abs(hipHeight)
+    # Stores the hip height of the rig, derived from the local matrix (relative to parent) of its hip joint.
+    def DetectHipHeight(self, tag, objHip):
+        mlHip = objHip.GetMl()
 
+        axis = 1
+        if round(mlHip.off.y, 0) == round(mlHip.off.z, 0) == 0:
+            axis = 0
+        elif round(mlHip.off.x, 0) == round(mlHip.off.y, 0) == 0:
+            axis = 2
+        hipHeight = mlHip.off[axis]
+        tag[ID_TAG_ACTOR_HIP_HEIGHT] = abs(hipHeight)
+
+
+    # Stores meta information about body parts after the mapping table got filled and
+    # locks against further auto detection.
+    def SetRigDetected(self, tag, hasBody, hasHip, hasHandLeft, hasHandRight):
         # Store meta information about body parts
         # Currently it may seem as if body and hands are duplicate.
         # This is in anticipation of an user option to manually disable
@@ -920,7 +907,93 @@ class TagDataRokoko(c4d.plugins.TagData):
         # Mark tag's Description dirty, the result may influence on
         # availability of certain parameters.
         tag.SetDirty(c4d.DIRTYFLAGS_DESCRIPTION)
-        return detectedRig
+
+
+    # Initializes mapping table and T-Pose of a new Actor tag (if not done so yet).
+    # Identical rigs mapped before get their mapping table from the rig cache (see rokoko_rig_cache),
+    # otherwise the rig gets auto detected and the result is stored in the cache.
+    def PrepareRig(self, tag):
+        if not tag[ID_TAG_ACTOR_RIG_DETECTED] and not tag[ID_TAG_ACTOR_TPOSE_STORED]:
+            objRoot = tag.GetObject()
+            if objRoot is not None:
+                rig = GetRigFingerprint(objRoot)
+                entry = GetRigCache().Lookup(rig[0])
+                if entry is not None:
+                    self.ApplyRigCacheEntry(tag, entry, rig[1])
+                else:
+                    self.DetectRig(tag)
+                    self.StoreCachedRig(tag, rig)
+
+        # If not done so yet, auto detect rig mapping
+        if not tag[ID_TAG_ACTOR_RIG_DETECTED]:
+            self.DetectRig(tag)
+
+        # If not done so yet, store T-Pose
+        if not tag[ID_TAG_ACTOR_TPOSE_STORED]:
+            self.SetTPose(tag)
+
+
+    # Stores mapping table of the tag in the rig cache (see rokoko_rig_cache).
+    # rig: fingerprint and objects of the rig as returned by GetRigFingerprint(), determined if None.
+    def StoreCachedRig(self, tag, rig=None):
+        objRoot = tag.GetObject()
+        if objRoot is None:
+            return
+        if rig is None:
+            rig = GetRigFingerprint(objRoot)
+        fingerprint, objs = rig
+
+        links = {}
+        for (idxBodyPart, _, _, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.values():
+            obj = tag[ID_TAG_BASE_RIG_LINKS + idxBodyPart]
+            if obj is None:
+                continue
+            try:
+                idxObj = objs.index(obj)
+            except ValueError:
+                continue # joint is not part of the rig's hierarchy, can not be cached
+            links[str(idxBodyPart)] = idxObj
+
+        GetRigCache().Store(fingerprint, { 'links' : links })
+
+
+    # Fills mapping table of the tag from a rig cache entry (see rokoko_rig_cache).
+    # Identical rigs may still differ in their proportions, so hip height and T-Pose
+    # are taken from the rig's own joints.
+    # objs: objects of the rig as returned by GetRigFingerprint()
+    def ApplyRigCacheEntry(self, tag, entry, objs):
+        hasBody = False
+        hasHandLeft = False
+        hasHandRight = False
+
+        # Flush mapping table
+        for (idxBodyPart, _, _, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.values():
+            tag[ID_TAG_BASE_RIG_LINKS + idxBodyPart] = None
+
+        # Store joint object links in tag's parameters
+        links = entry['links']
+        for (idxBodyPart, _, device, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.values():
+            idxObj = links.get(str(idxBodyPart))
+            if idxObj is None or idxObj >= len(objs):
+                continue
+            tag[ID_TAG_BASE_RIG_LINKS + idxBodyPart] = objs[idxObj]
+
+            # Depending on device (suit, glove,...) note existence of certain body parts.
+            if device == 1:
+                hasBody = True
+            elif device == 6:
+                hasHandLeft = True
+            elif device == 10:
+                hasHandRight = True
+
+        objHip = tag[ID_TAG_BASE_RIG_LINKS + STUDIO_NAMES_TO_GUESS['hip'][0]]
+        hasHip = objHip is not None
+        if hasHip:
+            self.DetectHipHeight(tag, objHip)
+        self.SetRigDetected(tag, hasBody, hasHip, hasHandLeft, hasHandRight)
+
+        # Store T-Pose of the mapped joints
+        self.SetTPose(tag)
 
 
     # Calculates the T-Pose matrices for all joints in tag's mapping table.
@@ -985,10 +1058,15 @@ class TagDataRokoko(c4d.plugins.TagData):
     #
     # This dictionary serves only a single purpose:
     # Make the code in Execute() simple and a bit faster.
+    #
+    # Additionally the execution plan for ExecuteActor() gets compiled:
+    # Mapped joints as a list addressed by joint index (instead of by name) and the parts of the
+    # transformation, which do not change during playback, multiplied in advance.
     def PrepareTPoseDict(self, tag):
         if len(g_studioTPose) <= 0:
             return
         self._tPoseTag = {}
+        self._planJoints = []
 
         for nameInStudio, (idx, _, _, _, _, _, _, _) in STUDIO_NAMES_TO_GUESS.items():
             obj = tag[ID_TAG_BASE_RIG_LINKS + idx]
@@ -1002,6 +1080,18 @@ class TagDataRokoko(c4d.plugins.TagData):
             mgBodyPartTPose = tag[ID_TAG_BASE_RIG_MATRICES + idx]
             mgBodyPartTPosePretransformed = tag[ID_TAG_BASE_RIG_MATRICES_PRETRANSFORMED + idx]
             self._tPoseTag[nameInStudio] = (obj, mgBodyPartTPose, nameObj, mgBodyPartTPosePretransformed)
+            self._planJoints.append((idx, obj, mgBodyPartTPosePretransformed))
+
+        # Execution plan
+        self._planJoints.sort(key=lambda entry: entry[0])
+        self._planJointIndices = [idx for idx, _, _ in self._planJoints]
+        self._planTPoseNumPy = MatricesToAxesNumPy([mRotOffsetRef for _, _, mRotOffsetRef in self._planJoints])
+        self._planHip = None
+        if 'hip' in self._tPoseTag:
+            self._planHip = self._tPoseTag['hip'][0]
+        self._mgRootTPoseInv = ~tag[ID_TAG_ROOT_MATRIX]
+        self._mRootTPosePre = self._mgRootTPoseInv * MR_Y180 # actually ~mgRootTPose * ~MR_Y180, but ~MR_Y180 == MR_Y180
+        self._mgRootLast = None
 
 
     # Execute() function for Actors
@@ -1025,10 +1115,8 @@ class TagDataRokoko(c4d.plugins.TagData):
     # TODO: Quaternions probably had the potential to increase performance a bit, so it's definitely worth a try one day.
     #@timing
     def ExecuteActor(self, tag, data):
-        # Get actor data from motion data frame
+        # Actor data is addressed by index in motion data frame
         idxActor = tag[ID_TAG_ACTOR_INDEX]
-        dataActor = data['actors'][idxActor]
-        dataBody = dataActor['body']
         objRoot = tag.GetObject()
         objHip = tag[ID_TAG_BASE_RIG_LINKS + 0]
 
@@ -1039,67 +1127,75 @@ class TagDataRokoko(c4d.plugins.TagData):
         else:
             mgRoot = c4d.Matrix()
 
-        mgRootTPose = tag[ID_TAG_ROOT_MATRIX]
-
-        ### Rotation
-
-        # Iterate all objects of the rig (well, only those assigned in tag's mapping table)
-        for nameInStudio, (obj, _, nameInRig, mRotOffsetRef) in self._tPoseTag.items():
-            # Get Studio rotation and convert into C4D transformation matrix
-            dataBodyPart = dataBody[nameInStudio]
-            mStudioNewPose = JSONQuaternionToMatrix(dataBodyPart['rotation'])
-
-            # Transform the current Studio rotation
-            # Apply pretransformed T-Pose matrix
-            mFinalRot = mStudioNewPose * mRotOffsetRef
-
+        # The transformation of the root (combined with the constant parts prepared in PrepareTPoseDict())
+        # is the same for all joints and only needs to be recalculated, if the root moved.
+        # Root's global matrix gets compared (instead of its dirty count), as it also changes,
+        # if only a parent of the root gets moved.
+        if self._mgRootLast is None or mgRoot != self._mgRootLast:
+            self._mgRootLast = mgRoot
+            # Finally rotate by rigs current root rotation
+            # after reversing the rotation which may have been caused by a rotation of T-Pose's root object
+            # and rotating Studio's rotation by 180 degree around Y.
             # While sharing a similarly oriented coordinate system,
             # in C4D characters face forward in the opposite direction.
             # A character in T-Pose will usually look into -Z in T-Pose (while in Rokoko Studio it looks into +Z).
+            self._mRootPlan = mgRoot * self._mRootTPosePre
+        mRoot = self._mRootPlan
+
+        ### Rotation
 
-            # Rotate Studio's rotation by 180 degree around Y
-            mFinalRot = MR_Y180 * mFinalRot # actually ~MR_Y180 * mFinalRot, but ~MR_Y180 == MR_Y180
+        # Iterate all objects of the rig (well, only those assigned in tag's mapping table)
+        if self._planTPoseNumPy is not None:
+            # Convert Studio rotations of all mapped joints into C4D transformation matrices and
+            # apply pretransformed T-Pose matrices in one go
+            matricesStudio = QuaternionsTimesMatricesNumPy(data.GetJointRotations(idxActor), self._planJointIndices, self._planTPoseNumPy)
+            for (_, obj, _), axes in zip(self._planJoints, matricesStudio):
+                mFinalRot = mRoot * MatrixFromAxes(axes)
 
-            # Reverse the rotation which may have been caused by a rotation of T-Pose's root object
-            mFinalRot = ~mgRootTPose * mFinalRot
+                # Preserve global position of the joint
+                mFinalRot.off = obj.GetMg().off
 
-            # Finally rotate by rigs current root rotation
-            mFinalRot = mgRoot * mFinalRot
+                obj.SetMg(mFinalRot)
+        else:
+            # Without NumPy: Convert Studio rotations of all joints into C4D transformation matrices at once
+            matricesStudio = data.GetJointRotationMatrices(idxActor)
+            for idxJoint, obj, mRotOffsetRef in self._planJoints:
+                # Transform the current Studio rotation
+                # Apply pretransformed T-Pose matrix
+                mFinalRot = mRoot * (MatrixFromAxes(matricesStudio[idxJoint]) * mRotOffsetRef)
 
-            # Preserve global position of the joint
-            mFinalRot.off = obj.GetMg().off
+                # Preserve global position of the joint
+                mFinalRot.off = obj.GetMg().off
 
-            obj.SetMg(mFinalRot)
+                obj.SetMg(mFinalRot)
 
         ### Hip Position
-        if 'hip' in self._tPoseTag:
+        posStudio = data.GetJointPosition(idxActor, 0) if self._planHip is not None else None # hip
+        if posStudio is not None: # frames without hip position leave the hip untouched
             # Get hip parameters
-            objHip, _, nameInRigHip, _ = self._tPoseTag['hip']
-            dataBodyPart = dataBody['hip']
-            hipHeightStudio = dataActor['dimensions']['hipHeight']
-            hipHeightStudioC4D = hipHeightStudio * 100.0
-            posStudio = dataBodyPart['position']
+            hipHeightStudio = data.GetHipHeight(idxActor)
+            xStudio, yStudio, zStudio = posStudio
             yTPoseHip = tag[ID_TAG_ACTOR_HIP_HEIGHT]
 
             # Scale hip height by ratio of current actor's hip height and Studio's T-Pose base hip height
             scale = yTPoseHip / hipHeightStudio
 
             # Calculate hip's y position in C4D
-            y = yTPoseHip * (1 + (posStudio['y'] - hipHeightStudio))
+            y = yTPoseHip * (1 + (yStudio - hipHeightStudio))
 
             # Merge into relative offset in C4D
             # -x/z due to different orientation of character in C4D
-            off = c4d.Vector(-posStudio['x'] * scale,
+            off = c4d.Vector(-xStudio * scale,
                              y,
-                             -posStudio['z'] * scale)
+                             -zStudio * scale)
 
             # Reverse offset and rotation which may have been caused by T-Pose's root object
-            off = ~mgRootTPose * off
+            off = self._mgRootTPoseInv * off
 
             # Scale position with "Project Scale" parameter
             off *= GetProjectScale()
 
-            objHip.SetRelPos(off)
+            self._planHip.SetRelPos(off)
         return c4d.EXECUTIONRESULT_OK
 
 
@@ -1125,60 +1221,21 @@ class TagDataRokoko(c4d.plugins.TagData):
         for (idxInStudio, _, _, _, _, _) in FACE_POSE_NAMES.values():
             tag[ID_TAG_BASE_FACE_POSES + idxInStudio] = ''
 
+        # Matcher for the string table (see rokoko_rig_matcher)
+        if tablePoseNames is FACE_POSE_NAMES:
+            matcher = FACE_MATCHER
+        else:
+            matcher = CreateFaceMatcher(tablePoseNames)
+
         # Iterate all poses of the PoseMorph tag
         for idxMorph in range(1, tagPoseMorph.GetMorphCount()):
             morph = tagPoseMorph.GetMorph(idxMorph)
             nameMorphC4D = morph.GetName()
             nameMorphC4DLower = nameMorphC4D.lower()
 
-            # Loop table with pose name strings and see if pose name matches
-            for nameStudio, (idxInStudio, nameDisplay, namesMain, namesExclude, namesSideInclude, namesSideExclude) in tablePoseNames.items():
-                # namesMain contains multiple lists of strings
-                # At least one list needs to be matched completely.
-                hitMain = False
-                for namesNeeded in namesMain:
-                    hitMain = True
-                    for name in namesNeeded:
-                        if name not in nameMorphC4DLower:
-                            hitMain = False
-                            break
-                    if hitMain:
-                        break
-                # If no list of strings matched completely, check next entry
-                if not hitMain:
-                    continue
-
-                # namesExclude is a list of strings, which must not appear in pose name
-                hitExclude = False
-                for nameExclude in namesExclude:
-                    if nameExclude in nameMorphC4DLower:
-                        hitExclude = True
-                        break
-                # If any string matched, check next entry
-                if hitExclude:
-                    continue
-
-                # For side detection, it's supposed to be enough to only mark
-                # poses of one side with a label (e.g. "left", but right side has no side label at all).
-                hitSideInclude = False
-                hitSideExclude = False
-                # namesSideInclude is a list of strings, which, if matched, would assign the object to a side.
-                # One match from the list is enough to decide the side.
-                for nameSideInclude in namesSideInclude:
-                    if nameSideInclude in nameMorphC4DLower:
-                        hitSideInclude = True
-                        break
-                # If no match in side include list
-                if not hitSideInclude:
-                    # Side not decided yet, check absence of strings in exclude list
-                    # namesSideExclude is a list of strings, which may not appear in pose name.
-                    for nameSideExclude in namesSideExclude:
-                        if nameSideExclude in nameMorphC4DLower:
-                            hitSideExclude = True
-                            break
-                    # If any string matched, side of pose is undecided, while string table expects a side
-                    if hitSideExclude:
-                        continue
+            # Loop all pose entries matched by pose name (in order of the string table)
+            for nameStudio in matcher.Match(nameMorphC4DLower):
+                idxInStudio = tablePoseNames[nameStudio][0]
 
                 # Pose match
 
@@ -1227,30 +1284,30 @@ class TagDataRokoko(c4d.plugins.TagData):
 
     # Execute() function for Faces
     def ExecuteFace(self, tag, data):
-        # Get face data from motion data frame
+        # Face data is addressed by actor index in motion data frame
         idxActor = tag[ID_TAG_ACTOR_INDEX]
-        dataFace = data['actors'][idxActor]['face']
         obj = tag.GetObject()
         tagPoseMorph = obj.GetTag(c4d.Tposemorph)
 
         # Set PoseMorph strength parameters with values received from Studio
         # TODO: Could it be helpful to have some kind of range mapping here?
         for nameInStudio, descIdMorph in self._facePoses.items():
-            tagPoseMorph.SetParameter(descIdMorph, float(dataFace[nameInStudio]) / 100.0, c4d.DESCFLAGS_SET_NONE) # in C4D strength is 0.0 to 1.0
+            idxPose = FACE_POSE_NAMES[nameInStudio][0]
+            tagPoseMorph.SetParameter(descIdMorph, data.GetFacePose(idxActor, idxPose) / 100.0, c4d.DESCFLAGS_SET_NONE) # in C4D strength is 0.0 to 1.0
         return c4d.EXECUTIONRESULT_OK
 
 
     # Execute() function for Props
     def ExecuteProp(self, tag, data):
-        # Get prop data from motion data frame
+        # Prop data is addressed by index in motion data frame
         objProp = tag.GetObject()
         idxProp = tag[ID_TAG_ACTOR_INDEX]
-        dataProp = data['props'][idxProp]
 
         ### Rotation
 
         # Convert Studio rotation into a C4D transformation matrix
-        mPropStudio = JSONQuaternionToMatrix(dataProp['rotation'])
+        x, y, z, w = data.GetPropRotation(idxProp)
+        mPropStudio = QuaternionToMatrix(x, y, z, w)
 
         # While sharing a similarly oriented coordinate system,
         # in C4D characters (and thus also props) face forward in the opposite direction.
@@ -1267,10 +1324,10 @@ class TagDataRokoko(c4d.plugins.TagData):
         ### Position
 
         # Convert absolute global position in Studio into a C4D offset vector
-        posStudio = dataProp['position']
-        off = c4d.Vector(-posStudio['x'] * 100.0,
-                         posStudio['y'] * 100.0,
-                         -posStudio['z'] * 100.0)
+        xStudio, yStudio, zStudio = data.GetPropPosition(idxProp)
+        off = c4d.Vector(-xStudio * 100.0,
+                         yStudio * 100.0,
+                         -zStudio * 100.0)
 
         # Scale position with "Project Scale" parameter
         off *= GetProjectScale() # Position of prop object relative to parent
@@ -1285,6 +1342,9 @@ class TagDataRokoko(c4d.plugins.TagData):
     #
     # Time for some initialization...
     def MessageMenuPrepare(self, tag):
+        # Make sure, the inserted tag is registered (see GetTagList() in rokoko_utils)
+        RegisterTag(tag)
+
         # Auto detect type of tag based on host object
         rigType = DetermineRigType(tag.GetObject())
         tag.SetParameter(ID_TAG_RIG_TYPE, rigType, c4d.DESCFLAGS_SET_NONE)
@@ -1296,13 +1356,8 @@ class TagDataRokoko(c4d.plugins.TagData):
 
         # Type dependend initialization
         if rigType & RIG_TYPE_ACTOR:
-            # If not done so yet, auto detect rig mapping
-            if not tag[ID_TAG_ACTOR_RIG_DETECTED]:
-                self.DetectRig(tag)
-
-            # If not done so yet, store T-Pose
-            if not tag[ID_TAG_ACTOR_TPOSE_STORED]:
-                self.SetTPose(tag)
+            # If not done so yet, auto detect rig mapping and store T-Pose
+            self.PrepareRig(tag)
 
             # Update T-Pose dictionary
             self.PrepareTPoseDict(tag)
@@ -1364,6 +1419,7 @@ class TagDataRokoko(c4d.plugins.TagData):
             # Store T-Pose matrices and update T-Pose dictionary
             self.SetTPose(tag)
             self.PrepareTPoseDict(tag)
+            self.StoreCachedRig(tag)
 
         elif id >= ID_TAG_BASE_FACE_POSES and id < ID_TAG_BASE_FACE_POSES + len(FACE_POSE_NAMES):
             # Mapping table of a Face was changed
@@ -1409,6 +1465,11 @@ class TagDataRokoko(c4d.plugins.TagData):
                 # Update T-Pose dictionary
                 self.PrepareTPoseDict(tag)
 
+        # Data set, clip range or validity changed, listener needs to re-read the tag's consumer group
+        if id == ID_TAG_DATA_SET or id == ID_TAG_DATA_SET_FIRST_FRAME or \
+           id == ID_TAG_DATA_SET_LAST_FRAME or id == ID_TAG_VALID_DATA:
+            g_thdListener.UpdateTagConsumer(self, tag)
+
         # Now, that all parameter dependencies got resolved,
         # check if any parameter changed, which may have an effect on data validity or changes in meta data
         if id == ID_TAG_RIG_TYPE or id == ID_TAG_DATA_SET or \
@@ -1506,6 +1567,7 @@ class TagDataRokoko(c4d.plugins.TagData):
 
         # Change the tag to use the freshly created clip
         tag.GetDataInstance()[ID_TAG_DATA_SET] = bcDataSet.GetId()
+        g_thdListener.UpdateTagConsumer(self, tag)
 
         # Announce change to Manager dialog
         c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_UPDATE_TAGS) # TODO: actually CM_SUBID_MANAGER_UPDATE_TAG_PARAMS should suffice
@@ -1578,13 +1640,8 @@ class TagDataRokoko(c4d.plugins.TagData):
             self.ConnectDataSet(tag, tag[ID_TAG_DATA_SET])
 
             if rigType & RIG_TYPE_ACTOR:
-                # If not done so yet, auto detect rig mapping
-                if not tag[ID_TAG_ACTOR_RIG_DETECTED]:
-                    self.DetectRig(tag)
-
-                # If not done so yet, store T-Pose
-                if not tag[ID_TAG_ACTOR_TPOSE_STORED]:
-                    self.SetTPose(tag)
+                # If not done so yet, auto detect rig mapping and store T-Pose
+                self.PrepareRig(tag)
 
                 # Update T-Pose dictionary
                 self.PrepareTPoseDict(tag)
@@ -1702,6 +1759,41 @@ class TagDataRokoko(c4d.plugins.TagData):
         self.DetectRig(tag)
         self.SetTPose(tag)
         self.PrepareTPoseDict(tag)
+        self.StoreCachedRig(tag)
+
+
+    # Applies mapping table of the tag to the Actor tags of all identical rigs
+    # (see rokoko_rig_cache) in the current document.
+    # Returns the number of tags changed.
+    # Note: Creates an undo.
+    def CommandApplyRigToIdenticalRigs(self, tag):
+        objRoot = tag.GetObject()
+        if objRoot is None:
+            return 0
+        rig = GetRigFingerprint(objRoot)
+        self.StoreCachedRig(tag, rig)
+        entry = GetRigCache().Lookup(rig[0])
+
+        doc = tag.GetDocument()
+        doc.StartUndo()
+        numTags = 0
+        for tagOther in GetTagList():
+            if tagOther == tag or not (tagOther[ID_TAG_RIG_TYPE] & RIG_TYPE_ACTOR):
+                continue
+            objRootOther = tagOther.GetObject()
+            if objRootOther is None:
+                continue
+            fingerprint, objs = GetRigFingerprint(objRootOther)
+            if fingerprint != rig[0]:
+                continue
+            doc.AddUndo(c4d.UNDOTYPE_CHANGE_SMALL, tagOther)
+            tagDataOther = tagOther.GetNodeData()
+            tagDataOther.ApplyRigCacheEntry(tagOther, entry, objs)
+            tagDataOther.PrepareTPoseDict(tagOther)
+            numTags += 1
+        doc.EndUndo()
+        SaveRigCache()
+        return numTags
 
 
     # Reaction to user pressing "Auto Detect Poses" button in a tag.
@@ -1804,6 +1896,7 @@ class TagDataRokoko(c4d.plugins.TagData):
         # After changes to the mapping table, the T-Pose matrices and dictionary need to be updated
         self.SetTPose(tag)
         self.PrepareTPoseDict(tag)
+        self.StoreCachedRig(tag)
 
 
     # Renames a preset
@@ -2060,6 +2153,15 @@ class TagDataRokoko(c4d.plugins.TagData):
         c4d.SpecialEventAdd(PLUGIN_ID_COREMESSAGE_MANAGER, CM_SUBID_MANAGER_UPDATE_TAGS)
 
         # Initialize member variables of destination TagData
-        dest._queueReceive = TagQueue()
         dest._tPoseTag = self._tPoseTag.copy()
+        dest._planJoints = list(self._planJoints)
+        dest._planJointIndices = list(self._planJointIndices)
+        dest._planTPoseNumPy = self._planTPoseNumPy
+        dest._planHip = self._planHip
+        dest._mgRootTPoseInv = self._mgRootTPoseInv
+        dest._mRootTPosePre = self._mRootTPosePre
+        dest._mgRootLast = None
+
+        # Register the copy (no matter, if it ends up in the scene, see GetTagList() in rokoko_utils)
+        RegisterTag(dnode)
         return True
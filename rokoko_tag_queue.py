@@ -1,41 +1,41 @@
-# A TagQueue is owned by a Rokoko tag and is the inbound "queue" for motion data dispatched by
-# the listener thread.
+# The hand-off of dispatched frames from the listener thread to the Rokoko tags.
 #
-# Originally it was designed as a real queue, thought to further decouple the listener thread
-# from tag's execution. But not only did this approach show no noticable advantages, it imposed quite
-# a bunch of issues (correct sync between tags,...). In the end the tag queue is nothing more than a
-# frame index inside the tag's BaseContainer (only with a synchronized access).
-from threading import Condition
+# Originally every tag owned a TagQueue, thought to further decouple the listener thread from tag's
+# execution. In the end it was nothing more than a frame index inside the tag's BaseContainer, written
+# by the listener thread for every tag on every dispatch and read by the tag in Execute(), both under
+# a lock per tag. Lock traffic and BaseContainer writes grew with the number of tags.
+#
+# Now the listener thread publishes a single FrameSnapshot per dispatch (see DispatchFrame() in
+# rokoko_listener). A snapshot is never changed after it got published, the listener simply replaces
+# its reference with a new one (which is atomic in Python). So tags read the current snapshot without
+# any locking.
+#
+# Consumer tags are grouped by data set and clip range (clips may be trimmed per tag). The group of
+# each tag is cached by the listener (see UpdateTagConsumer() in rokoko_listener) and only re-read,
+# when the data set, the clip range or the validity of the tag's data changes. The frame index is
+# calculated once per group during dispatch, a tag merely looks up the index of its group.
 from rokoko_ids import *
-
-class TagQueue():
-
-    def __init__(self):
-        self._lock = Condition() # serializes all access to the queue
-
-
-    # Removes any previously dispatched frames
-    def Flush(self, tag):
-        self._lock.acquire()
-        tag.GetDataInstance().RemoveData(ID_TAG_IDX_READ_FRAME)
-        self._lock.release()
-
-
-    # Called by listener thread to dispatch a frame to a tag.
-    def AddFrame(self, tag, idx):
-        self._lock.acquire()
-        tag.GetDataInstance().SetInt32(ID_TAG_IDX_READ_FRAME, idx)
-        self._lock.release()
-
-
-    # Called by tag to get the index of the dispatched frame.
-    # As queues are static (in the sense data doesn't change during playback),
-    # the tag will then directly access the assigned data queue and
-    # retrieve the frame via this index.
-    def GetFrameIdx(self, tag):
-        bcTag = tag.GetDataInstance()
-
-        self._lock.acquire()
-        idxFrame = bcTag.GetData(ID_TAG_IDX_READ_FRAME)
-        self._lock.release()
-        return idxFrame
+from rokoko_clip import *
+
+class FrameSnapshot():
+    _frameIndeces = None # frame index to be played per group (data set ID, first frame, last frame)
+    _queues = None # data queue per data set
+    _groupsByConsumer = None # group per TagData of all consumer tags (None if tag has no valid data)
+                             # (keyed by the object itself, an id() could get reused by a new tag, before the consumers got republished)
+
+    def __init__(self, frameIndeces, queues, groupsByConsumer):
+        self._frameIndeces = frameIndeces
+        self._queues = queues
+        self._groupsByConsumer = groupsByConsumer
+
+
+    # Returns the frame object (see rokoko_clip) dispatched to a tag.
+    # Returns None, if the tag is no consumer or there is no data for its data set.
+    def GetFrame(self, tagData):
+        group = self._groupsByConsumer.get(tagData)
+        if group is None:
+            return None
+        idxFrame = self._frameIndeces.get(group)
+        if idxFrame is None:
+            return None
+        return GetFrameFromQueue(self._queues[group[0]], idxFrame)
@@ -0,0 +1,146 @@
+# Telemetry of a live connection.
+#
+# The listener thread and its live receiver (see rokoko_receiver) report events and timings here.
+# These are accumulated over windows of one second. At the end of each window a snapshot of
+# the statistics gets stored, which can be retrieved via GetStats() (e.g. by the Manager dialog):
+#   - rate: received frames per second
+#   - gaps: number of gaps in the Studio timestamps (jumps larger than 1.5 frame durations),
+#           missing: estimated number of frames missing in these gaps
+#   - decode, dispatch: time needed to decode a frame, to dispatch a frame to the tags (avg/max in ms)
+#   - draw: time needed by the main thread to draw the viewport (avg/max in ms)
+#   - latency: time from reception of a frame to the handling of its live draw event in
+#              the main thread (avg/max in ms)
+import time
+from threading import Lock
+
+# Length of a statistics window in seconds
+TELEMETRY_WINDOW = 1.0
+
+class LiveTelemetry():
+    _lock = None
+    _timeWindowStart = 0.0
+    _stats = None # statistics of last completed window
+
+    # Accumulators of current window
+    _numReceived = 0
+    _numGaps = 0
+    _numMissing = 0
+    _timestampLast = None
+    _timesDecode = None
+    _timesDispatch = None
+    _timesDraw = None
+    _latencies = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self.Reset()
+
+
+    # Discards all statistics.
+    def Reset(self):
+        with self._lock:
+            self._timeWindowStart = time.perf_counter()
+            self._stats = self.CreateStats(0.0)
+            self._timestampLast = None
+            self.ResetWindow()
+
+
+    # Resets accumulators of current window (lock needs to be held).
+    def ResetWindow(self):
+        self._numReceived = 0
+        self._numGaps = 0
+        self._numMissing = 0
+        self._timesDecode = []
+        self._timesDispatch = []
+        self._timesDraw = []
+        self._latencies = []
+
+
+    # Returns a statistics dictionary for the current window (lock needs to be held).
+    def CreateStats(self, durationWindow):
+        rate = 0.0
+        if durationWindow > 0.0:
+            rate = self._numReceived / durationWindow
+        return { 'rate' : rate,
+                 'gaps' : self._numGaps,
+                 'missing' : self._numMissing,
+                 'decode' : self.AvgMaxMs(self._timesDecode),
+                 'dispatch' : self.AvgMaxMs(self._timesDispatch),
+                 'draw' : self.AvgMaxMs(self._timesDraw),
+                 'latency' : self.AvgMaxMs(self._latencies),
+               }
+
+
+    # Returns average and maximum of a list of durations (in seconds) as a tuple in milliseconds.
+    def AvgMaxMs(self, durations):
+        if durations is None or len(durations) == 0:
+            return (0.0, 0.0)
+        return (1000.0 * sum(durations) / len(durations), 1000.0 * max(durations))
+
+
+    # Completes current window, if it is over (lock needs to be held).
+    # Returns True, if a new snapshot of the statistics is available.
+    def UpdateWindow(self):
+        now = time.perf_counter()
+        durationWindow = now - self._timeWindowStart
+        if durationWindow < TELEMETRY_WINDOW:
+            return False
+        self._stats = self.CreateStats(durationWindow)
+        self._timeWindowStart = now
+        self.ResetWindow()
+        return True
+
+
+    # Completes the current window, if it is over, even if nothing happened.
+    # Returns True, if a new snapshot of the statistics is available.
+    def Tick(self):
+        with self._lock:
+            return self.UpdateWindow()
+
+
+    # A frame has been received.
+    # Returns True, if a new snapshot of the statistics is available.
+    def AddReceived(self):
+        with self._lock:
+            self._numReceived += 1
+            return self.UpdateWindow()
+
+
+    # A frame with given Studio timestamp has been decoded, checks for gaps in the stream.
+    def AddTimestamp(self, timestamp, fps):
+        with self._lock:
+            timestampLast = self._timestampLast
+            self._timestampLast = timestamp
+            if timestampLast is None or fps <= 0.0:
+                return
+            durationFrame = 1.0 / fps
+            diff = timestamp - timestampLast
+            if diff > 1.5 * durationFrame:
+                self._numGaps += 1
+                self._numMissing += int(round(diff / durationFrame)) - 1
+
+
+    def AddDecodeTime(self, duration):
+        with self._lock:
+            self._timesDecode.append(duration)
+
+
+    def AddDispatchTime(self, duration):
+        with self._lock:
+            self._timesDispatch.append(duration)
+
+
+    def AddDrawTime(self, duration):
+        with self._lock:
+            self._timesDraw.append(duration)
+
+
+    def AddLatency(self, duration):
+        with self._lock:
+            self._latencies.append(duration)
+
+
+    # Returns the statistics of the last completed window.
+    def GetStats(self):
+        with self._lock:
+            return self._stats.copy()
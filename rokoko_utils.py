@@ -1,6 +1,7 @@
 # Various utility functions.
-import time, math, hashlib, json, webbrowser
+import time, math, hashlib, json, re, codecs, webbrowser
 from ctypes import pythonapi, c_void_p, py_object
+from threading import Lock
 import c4d
 # Import lz4 module for the correct platform
 __USE_LZ4__ = True
@@ -12,6 +13,12 @@ try:
         import lz4.frame as lz4f
 except:
     __USE_LZ4__ = False
+# NumPy is optional, it is only used to speed up batch conversions
+__USE_NUMPY__ = True
+try:
+    import numpy as np
+except:
+    __USE_NUMPY__ = False
 from rokoko_ids import *
 from rokoko_rig_tables import *
 
@@ -68,61 +75,149 @@ else:
     GetCoreMessageParam = GetCoreMessageParamOld
 
 
-# An iterator for an object tree.
-def iter_objs(obj, root=True):
-    # If end of branch reached
+# Iteration of object trees.
+#
+# Originally iter_objs() and AddTags() recursed once per hierarchy level and once per sibling
+# (the former via nested generators, which get slower the deeper they are nested). Deep joint
+# chains or huge flat scene levels could even hit Python's recursion limit.
+#
+# Now a single generator traverses with an explicit stack. For every hierarchy level at most the
+# next sibling is kept on the stack, so memory grows with the depth of the tree only and time
+# linearly with the number of objects. Objects are returned in pre-order (an object, then its
+# children, then its next sibling). Optionally a filter function decides, which objects get returned
+# (the traversal continues below filtered objects anyway).
+
+# Returns objects of an object tree together with their depth (relative to obj).
+# siblings: if True, the siblings following obj (and their children) are iterated as well.
+# filterObj: optional function, only objects for which it returns True are returned.
+def IterObjectsDepth(obj, siblings=False, filterObj=None):
     if obj is None:
         return
+    stack = [(obj, 0, siblings)]
+    while len(stack) > 0:
+        obj, depth, withNext = stack.pop()
+        if filterObj is None or filterObj(obj):
+            yield obj, depth
+
+        # Next sibling gets pushed first, so children are popped first
+        if withNext:
+            objNext = obj.GetNext()
+            if objNext is not None:
+                stack.append((objNext, depth, True))
+        objDown = obj.GetDown()
+        if objDown is not None:
+            stack.append((objDown, depth + 1, True))
+
+
+# Returns objects of an object tree (see IterObjectsDepth()).
+def IterObjects(obj, siblings=False, filterObj=None):
+    for obj, _ in IterObjectsDepth(obj, siblings, filterObj):
+        yield obj
 
-    yield obj
 
-    # Iterate all children, if any
-    if obj.GetDown() is not None:
-        yield from iter_objs(obj.GetDown(), False)
+# Filter for IterObjects(): Only objects with a Rokoko tag.
+def FilterRokokoTag(obj):
+    return obj.GetTag(PLUGIN_ID_TAG) is not None
 
-    # If root, do not consider neighbors on same hierarchy level
-    if root:
-        return # call it done on this level
 
-    # Iterate neighbors
-    obj = obj.GetNext()
-    while obj is not None:
-        yield from iter_objs(obj, True) # handle child tree as new tree
-        obj = obj.GetNext()
+# Filter for IterObjects(): Only joints.
+def FilterJoint(obj):
+    return obj.CheckType(c4d.Ojoint)
 
 
-# TODO: While I always appreciate witing same stuff in multiple ways multiple times,
-#       I should really stop doing so...
+# An iterator for an object tree.
+# root: if False, the siblings following obj are iterated as well.
+def iter_objs(obj, root=True):
+    return IterObjects(obj, siblings=not root)
 
-# Append Rokoko tag, if found, to list
-def IfTagAdd(tags, obj):
-    tag = obj.GetTag(PLUGIN_ID_TAG)
-    if tag is not None:
-        tags.append(tag)
 
-# Recursively add tags to a list
+# Add all Rokoko tags in an object tree (including the siblings following obj) to a list
 def AddTags(tags, obj):
-    if obj is None:
-        return
-    while obj:
-        IfTagAdd(tags, obj)
-        AddTags(tags, obj.GetDown())
-        obj = obj.GetNext()
+    for objTag in IterObjects(obj, siblings=True, filterObj=FilterRokokoTag):
+        tags.append(objTag.GetTag(PLUGIN_ID_TAG))
+
 
-#  Iterate the scene and return a list of all Rokoko tags
+# Registry of Rokoko tags.
+#
+# Originally GetTagList() walked all objects of the active document on every call. It is called
+# from many event handlers (e.g. on every EVMSG_CHANGE), so large scenes paid for a full traversal
+# again and again.
+#
+# Now tags register themselves, when they get initialized, copied or inserted (Init(), CopyTo() and
+# MSG_MENUPREPARE in rokoko_tag) and unregister in Free(). The registry contains all tags alive,
+# including those in other documents or in undo buffers. GetTagList() only returns those, which are
+# still part of the active document (validated per tag via IsAlive() and GetDocument()).
+# Only when the active document changes (e.g. a document got loaded or after a reload of the
+# plugins) the document gets scanned once to pick up tags which did not register themselves.
+# Tags are listed in hierarchy order as of the last scan, tags registered afterwards are appended.
+g_tagRegistry = [] # all registered Rokoko tags (BaseTags)
+g_docTagRegistry = None # document last scanned for tags
+g_lockTagRegistry = Lock()
+
+# Adds a tag to the registry (if not registered already, lock needs to be held).
+def RegisterTagUnlocked(tag):
+    for tagRegistered in g_tagRegistry:
+        if tagRegistered == tag:
+            return
+    g_tagRegistry.append(tag)
+
+
+# Adds a tag to the tag registry.
+def RegisterTag(tag):
+    with g_lockTagRegistry:
+        RegisterTagUnlocked(tag)
+
+
+# Removes a tag (and any tags no longer alive) from the tag registry.
+def UnregisterTag(tag):
+    with g_lockTagRegistry:
+        g_tagRegistry[:] = [tagRegistered for tagRegistered in g_tagRegistry if tagRegistered.IsAlive() and tagRegistered != tag]
+
+
+# Scans a document for Rokoko tags and adds these to the registry in hierarchy order (lock needs to be held).
+def ScanTagRegistry(doc):
+    global g_tagRegistry
+    tagsScanned = []
+    AddTags(tagsScanned, doc.GetFirstObject())
+    tagsOther = g_tagRegistry
+    g_tagRegistry = []
+    for tag in tagsScanned + tagsOther:
+        if tag.IsAlive():
+            RegisterTagUnlocked(tag)
+
+
+#  Return a list of all Rokoko tags in the active document
 def GetTagList():
-    tags = []
+    global g_docTagRegistry
     doc = c4d.documents.GetActiveDocument()
-    AddTags(tags, doc.GetFirstObject())
+    if doc is None:
+        return []
+    with g_lockTagRegistry:
+        # Document switch, fall back to a full scan
+        if g_docTagRegistry is None or not g_docTagRegistry.IsAlive() or g_docTagRegistry != doc:
+            ScanTagRegistry(doc)
+            g_docTagRegistry = doc
+
+        tags = []
+        for tag in g_tagRegistry:
+            if not tag.IsAlive() or tag.GetDocument() != doc:
+                continue # deleted, in undo buffer or in another document
+            # Like the scan, only consider the first Rokoko tag on an object
+            obj = tag.GetObject()
+            if obj is None or obj.GetTag(PLUGIN_ID_TAG) != tag:
+                continue
+            tags.append(tag)
     return tags
 
 
 # Convert a quaternion from Studio's motion data into a C4D transformation matrix.
 def JSONQuaternionToMatrix(r):
-    x = r['x']
-    y = r['y']
-    z = r['z']
-    w = -r['w'] # Minus takes care of the different orientation of the character in Studio
+    return QuaternionToMatrix(r['x'], r['y'], r['z'], r['w'])
+
+
+# Convert a quaternion (components as stored in Studio's motion data) into a C4D transformation matrix.
+def QuaternionToMatrix(x, y, z, w):
+    w = -w # Minus takes care of the different orientation of the character in Studio
     xx = x * x
     xy = x * y
     xz = x * z
@@ -149,6 +244,117 @@ def JSONQuaternionToMatrix(r):
     return newMatrix.GetNormalized()
 
 
+# Batch conversion of quaternions into matrices.
+# Instead of building a C4D matrix per joint (see QuaternionToMatrix()), all joints of an actor
+# (or all frames of a clip) get converted in one go. Results are the axis vectors (v1, v2, v3)
+# of the normalized matrices, only building the actual C4D matrix is left to the caller
+# (see MatrixFromAxes()).
+
+# Convert an array of quaternions (shape (..., 4), components as stored in Studio's motion data)
+# with NumPy. E.g. all joints of an actor (joints, 4) or all frames of a clip (frames, joints, 4).
+# Returns a NumPy array of shape (..., 3, 3) with the axis vectors.
+def QuaternionsToMatrixAxesNumPy(quats):
+    q = np.asarray(quats, dtype=np.float64)
+    x = q[..., 0]
+    y = q[..., 1]
+    z = q[..., 2]
+    w = -q[..., 3] # Minus takes care of the different orientation of the character in Studio
+    xx = x * x
+    xy = x * y
+    xz = x * z
+    xw = x * w
+    yy = y * y
+    yz = y * z
+    yw = y * w
+    zz = z * z
+    zw = z * w
+    axes = np.empty(q.shape[:-1] + (3, 3), dtype=np.float64)
+    axes[..., 0, 0] = 1 - 2 * (yy + zz)
+    axes[..., 0, 1] =     2 * (xy - zw)
+    axes[..., 0, 2] =     2 * (xz + yw)
+    axes[..., 1, 0] =     2 * (xy + zw)
+    axes[..., 1, 1] = 1 - 2 * (xx + zz)
+    axes[..., 1, 2] =     2 * (yz - xw)
+    axes[..., 2, 0] =     2 * (xz - yw)
+    axes[..., 2, 1] =     2 * (yz + xw)
+    axes[..., 2, 2] = 1 - 2 * (xx + yy)
+
+    # Equivalent of GetNormalized()
+    lengths = np.sqrt(np.einsum('...ij,...ij->...i', axes, axes))[..., np.newaxis]
+    np.divide(axes, lengths, out=axes, where=lengths > 0.0)
+    return axes
+
+
+# Convert a flat sequence of quaternion components (x, y, z, w, x, y, z, w,...) without NumPy.
+# Returns a list with the axis vectors (three tuples) per quaternion.
+def QuaternionsToMatrixAxesPython(values):
+    result = []
+    for idxValue in range(0, len(values), 4):
+        x, y, z, w = values[idxValue:idxValue + 4]
+        w = -w
+        xx = x * x
+        xy = x * y
+        xz = x * z
+        xw = x * w
+        yy = y * y
+        yz = y * z
+        yw = y * w
+        zz = z * z
+        zw = z * w
+        axes = []
+        for ax, ay, az in ((1 - 2 * (yy + zz), 2 * (xy - zw), 2 * (xz + yw)),
+                           (2 * (xy + zw), 1 - 2 * (xx + zz), 2 * (yz - xw)),
+                           (2 * (xz - yw), 2 * (yz + xw), 1 - 2 * (xx + yy))):
+            length = math.sqrt(ax * ax + ay * ay + az * az)
+            if length > 0.0:
+                ax /= length
+                ay /= length
+                az /= length
+            axes.append((ax, ay, az))
+        result.append(axes)
+    return result
+
+
+# Convert the quaternions of e.g. all joints of an actor in a single frame.
+# values can be a NumPy array of shape (n, 4) or a flat sequence of quaternion components.
+# Uses NumPy if available.
+# Returns a list with the axis vectors per quaternion (to be used with MatrixFromAxes()).
+def QuaternionsToMatrixAxes(values):
+    if __USE_NUMPY__:
+        return QuaternionsToMatrixAxesNumPy(np.reshape(values, (-1, 4))).tolist()
+    return QuaternionsToMatrixAxesPython(values)
+
+
+# Returns the axis vectors of a C4D matrix (as used by above functions).
+def MatrixToAxes(m):
+    return ((m.v1.x, m.v1.y, m.v1.z), (m.v2.x, m.v2.y, m.v2.z), (m.v3.x, m.v3.y, m.v3.z))
+
+
+# Stacks the axis vectors of a list of C4D matrices into a NumPy array of shape (n, 3, 3).
+# Returns None without NumPy.
+def MatricesToAxesNumPy(matrices):
+    if not __USE_NUMPY__:
+        return None
+    return np.array([MatrixToAxes(m) for m in matrices], dtype=np.float64).reshape((-1, 3, 3))
+
+
+# Converts the quaternions (shape (n, 4) or flat) selected by a list of indeces and multiplies
+# each resulting matrix with a constant matrix (axis vectors as returned by MatricesToAxesNumPy(),
+# one per index) in one NumPy operation.
+# Per quaternion this is the equivalent of QuaternionToMatrix(x, y, z, w) * m (rotation only).
+# Returns a list with the axis vectors per index (to be used with MatrixFromAxes()).
+def QuaternionsTimesMatricesNumPy(quats, indices, axesRight):
+    axes = QuaternionsToMatrixAxesNumPy(np.reshape(quats, (-1, 4))[indices])
+    # With axis vectors stored as rows, C4D's m1 * m2 becomes axes2 @ axes1
+    return np.matmul(axesRight, axes).tolist()
+
+
+# Create a C4D transformation matrix (without offset) from axis vectors returned by above functions.
+def MatrixFromAxes(axes):
+    v1, v2, v3 = axes
+    return c4d.Matrix(c4d.Vector(), c4d.Vector(v1[0], v1[1], v1[2]), c4d.Vector(v2[0], v2[1], v2[2]), c4d.Vector(v3[0], v3[1], v3[2]))
+
+
 ### Preferences
 # Rokoko Studio Live plugin needs to store vaious data
 # (connection data, clip libraries, widget states and parameters,...).
@@ -278,6 +484,18 @@ def InitBaseContainer():
     value = GetPref(ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS)
     if value is None:
         SetPref(ID_DLGSAVE_BAKE_INCLUDE_DATA_SETS, False)
+    value = GetPref(ID_DLGSAVE_REDUCE_KEYFRAMES)
+    if value is None:
+        SetPref(ID_DLGSAVE_REDUCE_KEYFRAMES, False)
+    value = GetPref(ID_DLGSAVE_REDUCE_TOLERANCE)
+    if value is None:
+        SetPref(ID_DLGSAVE_REDUCE_TOLERANCE, 0.1)
+    value = GetPref(ID_PREF_LIVE_BUFFER_SIZE)
+    if value is None:
+        SetPref(ID_PREF_LIVE_BUFFER_SIZE, LIVE_QUEUE_CAPACITY_DEFAULT)
+    value = GetPref(ID_PREF_LIVE_BUFFER_SPILL)
+    if value is None:
+        SetPref(ID_PREF_LIVE_BUFFER_SPILL, True)
 
 
 # Return plugin's BaseContainer from document.
@@ -403,6 +621,7 @@ def BaseContainerConnection(name='Studio Connection', port='14043', autoConnect=
     bc[ID_BC_DATASET_NUM_LIGHTS] = 0
     bc[ID_BC_DATASET_NUM_CAMERAS] = 0
     bc[ID_BC_DATASET_NUM_PROPS] = 0
+    bc[ID_BC_DATASET_NUM_FRAMES] = 0
     bc.SetContainer(ID_BC_DATASET_ACTORS, c4d.BaseContainer()) # for Actor entity containers
     bc.SetContainer(ID_BC_DATASET_LIGHTS, c4d.BaseContainer()) # for Light entity containers (currently not in use)
     bc.SetContainer(ID_BC_DATASET_CAMERAS, c4d.BaseContainer()) # for Camera entity containers (currently not in use)
@@ -414,7 +633,7 @@ def BaseContainerConnection(name='Studio Connection', port='14043', autoConnect=
 
 
 # Create a clip data set BaseContainer.
-def BaseContainerDataSet(name, file, numActors=0, numBody=0, numHands=0, numFaces=0, numLights=0, numCameras=0, numProps=0, availableInDocument=True, isLocal=False):
+def BaseContainerDataSet(name, file, numActors=0, numBody=0, numHands=0, numFaces=0, numLights=0, numCameras=0, numProps=0, availableInDocument=True, isLocal=False, numFrames=0):
     bc = c4d.BaseContainer()
 
     # Set values relevant for file referencing data sets
@@ -437,6 +656,7 @@ def BaseContainerDataSet(name, file, numActors=0, numBody=0, numHands=0, numFace
     bc[ID_BC_DATASET_NUM_LIGHTS] = numLights
     bc[ID_BC_DATASET_NUM_CAMERAS] = numCameras
     bc[ID_BC_DATASET_NUM_PROPS] = numProps
+    bc[ID_BC_DATASET_NUM_FRAMES] = numFrames # number of frames in clip (0 for live connections)
     bc.SetContainer(ID_BC_DATASET_ACTORS, c4d.BaseContainer())
     bc.SetContainer(ID_BC_DATASET_LIGHTS, c4d.BaseContainer())
     bc.SetContainer(ID_BC_DATASET_CAMERAS, c4d.BaseContainer())
@@ -664,24 +884,121 @@ def RemoveConnectedDataSet():
     bcPrefs.RemoveData(ID_BC_CONNECTED_DATA_SET)
 
 
-# Reads motion data from a file
-def ReadDataSet(filename):
-    dataCompressed = None
+# Size of the (compressed) chunks read from a motion data file by the streaming reader
+SIZE_CHUNK_READ_DATA_SET = 256 * 1024
 
-    # Read data from file
-    with open(filename, mode='rb') as f:
-        dataCompressed = f.read()
-        f.close()
+# Matches JSON whitespace between the frames of a motion data file
+REGEX_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
 
-    # Decompress JSON data
+# Matches the key every motion data frame starts with.
+# "version" is exclusive to the top-level of a frame (actors and props do not use it),
+# so the number of its occurrences equals the number of frames.
+REGEX_FRAME_KEY = re.compile(rb'"version"\s*:')
+
+# Reads a motion data file in chunks and yields its decompressed data chunk by chunk.
+def IterDataSetChunks(filename, sizeChunk=SIZE_CHUNK_READ_DATA_SET):
+    decompressor = None
     if __USE_LZ4__:
-        dataJSON = lz4f.decompress(dataCompressed, return_bytearray=True, return_bytes_read=False)
-    else:
-        dataJSON = dataCompressed
+        decompressor = lz4f.LZ4FrameDecompressor()
 
-    # Decode data from JSON
-    data = json.loads(dataJSON)
-    return data
+    with open(filename, mode='rb') as f:
+        while True:
+            dataChunk = f.read(sizeChunk)
+            if len(dataChunk) == 0:
+                return
+            if decompressor is not None:
+                dataChunk = decompressor.decompress(dataChunk)
+            yield dataChunk
+
+
+# Reads motion data from a file frame by frame.
+# Motion data files (.rec) contain a single JSON array of frames (LZ4 compressed).
+# Instead of decompressing the entire file and decoding it with a single json.loads(),
+# the file is read in chunks, which are decompressed incrementally and
+# frames get decoded (and yielded) as soon as they are completely contained in the decoded text.
+# Thus memory usage is bounded by a small window of the file (plus whatever the caller keeps)
+# and callers may start working with the first frames before the file is fully read.
+def IterDataSetFrames(filename, sizeChunk=SIZE_CHUNK_READ_DATA_SET):
+    decoderJSON = json.JSONDecoder()
+    decoderUTF8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = IterDataSetChunks(filename, sizeChunk)
+    text = ''
+    pos = 0
+    inArray = False
+    endOfFile = False
+    while True:
+        # Decode as many frames as are completely contained in the current window
+        while True:
+            pos = REGEX_JSON_WHITESPACE.match(text, pos).end()
+            if pos >= len(text):
+                break
+            c = text[pos]
+            if not inArray:
+                if c != '[':
+                    raise ValueError('Motion data is not a JSON array: {0}'.format(filename))
+                inArray = True
+                pos += 1
+                continue
+            if c == ',':
+                pos += 1
+                continue
+            if c == ']':
+                return
+            try:
+                frame, pos = decoderJSON.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                if endOfFile:
+                    raise
+                break # frame not yet complete, more data needed
+            yield frame
+
+        if endOfFile:
+            raise ValueError('Motion data ended unexpectedly: {0}'.format(filename))
+
+        # Drop consumed text and move the window forward
+        text = text[pos:]
+        pos = 0
+        dataChunk = next(chunks, None)
+        if dataChunk is None:
+            endOfFile = True
+            text += decoderUTF8.decode(b'', final=True)
+            continue
+        text += decoderUTF8.decode(dataChunk)
+
+
+# Counts the frames in a motion data file without decoding them.
+# The decompressed data is only scanned for the key each frame starts with (see REGEX_FRAME_KEY).
+def CountDataSetFrames(filename, sizeChunk=SIZE_CHUNK_READ_DATA_SET):
+    numFrames = 0
+    tail = b''
+    for dataChunk in IterDataSetChunks(filename, sizeChunk):
+        data = tail + dataChunk
+        posEnd = 0
+        for match in REGEX_FRAME_KEY.finditer(data):
+            numFrames += 1
+            posEnd = match.end()
+        # Keep the end of the chunk, a key may be split between two chunks
+        tail = data[max(posEnd, len(data) - 64):]
+    return numFrames
+
+
+# Reads the first frame of a motion data file and counts the frames in the file.
+# Only the first frame gets decoded, the clip is never materialized.
+# Returns a tuple (first frame, number of frames) with first frame being None for an empty clip.
+def ReadDataSetSummary(filename):
+    frames = IterDataSetFrames(filename)
+    try:
+        frameFirst = next(frames, None)
+    finally:
+        frames.close()
+    if frameFirst is None:
+        return None, 0
+    return frameFirst, CountDataSetFrames(filename)
+
+
+# Reads motion data from a file
+def ReadDataSet(filename):
+    return list(IterDataSetFrames(filename))
 
 
 # Determine information about all entities (actors, faces, props,...)